@@ -1,35 +1,55 @@
 # ruff: noqa: E402
 
 import asyncio
+import logging
 
 from .config import Settings
 
 _config = Settings.get_config()
+_logger = logging.getLogger(_config.logging_default_logger_name)
 
+from fastapi import Depends
 from openg2p_fastapi_common.app import Initializer
+from openg2p_fastapi_common.context import app_registry, dbengine
 
+from .context import dbsession_maker
 from .controllers.auth_controller import AuthController
 from .controllers.discovery_controller import DiscoveryController
 from .controllers.document_file_controller import DocumentFileController
 from .controllers.form_controller import FormController
 from .controllers.oauth_controller import OAuthController
 from .controllers.program_controller import ProgramController
+from .dependencies import get_db_session
+from .models.orm.auth_oauth_provider import AuthOauthProviderORM
+from .models.orm.document_job_orm import DocumentJobORM
+from .models.orm.document_upload_session_orm import DocumentUploadSessionORM
 from .models.orm.program_registrant_info_orm import ProgramRegistrantInfoDraftORM
 from .services.document_file_service import DocumentFileService
+from .services.document_job_service import DocumentJobService
 from .services.form_service import FormService
+from .services.login_provider_catalog_service import LoginProviderCatalogService
 from .services.membership_service import MembershipService
 from .services.partner_service import PartnerService
+from .services.program_catalog_service import ProgramCatalogService
 from .services.program_service import ProgramService
+from .utils.db_utils import create_session_maker
+from .utils.s3_utils import shutdown_s3_executor
 
 
 class Initializer(Initializer):
     def initialize(self, **kwargs):
         super().initialize()
+        # One lazily opened db session per request, see get_db_session.
+        app_registry.get().router.dependencies.append(Depends(get_db_session))
+
         # Initialize all Services, Controllers, any utils here.
         PartnerService()
         MembershipService()
+        ProgramCatalogService()
+        LoginProviderCatalogService()
         ProgramService()
         FormService()
+        DocumentJobService()
         DocumentFileService()
 
         DiscoveryController().post_init()
@@ -39,10 +59,37 @@ class Initializer(Initializer):
         AuthController().post_init()
         OAuthController().post_init()
 
+    def init_db(self):
+        super().init_db()
+        if dbengine.get():
+            dbsession_maker.set(create_session_maker())
+
+    async def fastapi_app_startup(self, app):
+        await super().fastapi_app_startup(app)
+        try:
+            await AuthOauthProviderORM.refresh_issuer_registry(force=True)
+        except Exception:
+            _logger.exception("Failed to load auth issuer registry")
+        await ProgramCatalogService.get_component().start()
+        await LoginProviderCatalogService.get_component().start()
+        await DocumentJobService.get_component().start()
+        await DocumentFileService.get_component().start()
+
+    async def fastapi_app_shutdown(self, app):
+        await ProgramCatalogService.get_component().stop()
+        await LoginProviderCatalogService.get_component().stop()
+        await DocumentJobService.get_component().stop()
+        await DocumentFileService.get_component().stop()
+        shutdown_s3_executor()
+        await super().fastapi_app_shutdown(app)
+        dbsession_maker.set(None)
+
     def migrate_database(self, args):
         super().migrate_database(args)
 
         async def migrate():
             await ProgramRegistrantInfoDraftORM.create_migrate()
+            await DocumentUploadSessionORM.create_migrate()
+            await DocumentJobORM.create_migrate()
 
         asyncio.run(migrate())
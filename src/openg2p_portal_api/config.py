@@ -1,8 +1,9 @@
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
 from openg2p_fastapi_auth.config import ApiAuthSettings
 from openg2p_fastapi_auth.config import Settings as AuthSettings
 from openg2p_fastapi_common.config import Settings
+from pydantic import Field
 from pydantic_settings import SettingsConfigDict
 
 from . import __version__
@@ -25,6 +26,103 @@ class Settings(AuthSettings, Settings):
     openapi_version: str = __version__
     db_dbname: Optional[str] = "openg2pdb"
 
+    auth_id_type_config_cache_ttl: int = 300
+    auth_id_type_config_cache_size: int = 128
+    # Token issuers are resolved from the token endpoint and jwks uri of the
+    # auth providers. The registry is checked for provider changes at most
+    # every check interval seconds.
+    auth_issuer_registry_check_interval: int = 30
+    # Issuer -> auth_oauth_provider id, for issuers not derived from the endpoints.
+    auth_issuer_overrides: Dict[str, int] = {}
+    # Verified bearer tokens -> resolved credentials. Entries never outlive
+    # the exp of the token.
+    auth_token_cache_ttl: int = 60
+    auth_token_cache_size: int = 10000
+    # The login providers are served from memory. Seconds between checks of
+    # auth_oauth_provider for changes, and after which the list is reloaded
+    # even if nothing changed.
+    login_provider_catalog_enabled: bool = True
+    login_provider_catalog_check_interval: int = 30
+    login_provider_catalog_refresh_interval: int = 600
+    partner_id_cache_ttl: int = 300
+    partner_id_cache_size: int = 10000
+    # Columns of res_partner only change when Odoo modules are upgraded.
+    partner_fields_cache_ttl: int = 3600
+    program_storage_cache_ttl: int = 300
+    program_storage_cache_size: int = 1024
+
+    details_page_size: int = 100
+    details_max_page_size: int = 500
+
+    discovery_search_mode: Literal["like", "trigram", "fulltext"] = "like"
+    # Inlined into the discovery SQL, so only a (schema qualified) identifier.
+    discovery_fulltext_config: str = Field(
+        "simple", pattern=r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$"
+    )
+
+    program_catalog_enabled: bool = True
+    # Seconds between checks of g2p_program write_date for changes.
+    program_catalog_check_interval: int = 30
+    # Seconds after which the catalog is reloaded even if nothing changed.
+    program_catalog_refresh_interval: int = 600
+
+    # Uploads are read in chunks and sent to S3 in parts of part_size bytes.
+    document_upload_chunk_size: int = 1024 * 1024
+    document_upload_part_size: int = 8 * 1024 * 1024
+    document_batch_max_files: int = 20
+    # Resumable uploads: chunk size (at least 5 MiB on S3), largest file, and
+    # seconds after which an unfinished upload session expires.
+    document_upload_session_chunk_size: int = 8 * 1024 * 1024
+    document_upload_session_max_file_size: int = 1024 * 1024 * 1024
+    document_upload_session_ttl: int = 24 * 60 * 60
+    # Seconds between aborts of the upload sessions that expired.
+    document_upload_session_cleanup_interval: int = 10 * 60
+    # Files of one batch upload streamed to the storage at the same time.
+    document_batch_upload_concurrency: int = 4
+
+    # Downloads are streamed through the API, or redirected to a presigned S3 URL.
+    # A backend can override the mode with x_download_mode_env_default.
+    document_download_mode: Literal["stream", "presigned"] = "stream"
+    document_download_chunk_size: int = 256 * 1024
+    document_presigned_url_expiry: int = 300
+
+    # Uploaded documents are post-processed in the background. The jobs are
+    # saved in g2p_document_job with the upload, and run by in-process workers.
+    document_jobs_enabled: bool = True
+    document_job_processors: List[str] = [
+        "mimetype",
+        "checksum",
+        "page_count",
+        "virus_scan",
+    ]
+    document_job_concurrency: int = 4
+    document_job_max_attempts: int = 5
+    # Seconds before a failed job is retried, doubled after each attempt.
+    document_job_retry_delay: int = 30
+    # Seconds after which a running job is considered lost and run again.
+    document_job_timeout: int = 600
+    # Seconds between checks for jobs due for retry or saved by other processes.
+    document_job_poll_interval: int = 30
+    # Command reading a document on stdin and exiting with 1 if it is infected,
+    # e.g. "clamdscan --no-summary -". Documents are not scanned if unset.
+    document_virus_scan_command: Optional[str] = None
+
+    # Directory of filesystem backends without x_directory_path_env_default.
+    storage_filesystem_root: Optional[str] = None
+
+    # Threads running the blocking S3 calls, shared by all backends.
+    s3_executor_max_workers: int = 16
+    s3_max_concurrent_transfers_per_backend: int = 4
+    # Seconds an upload waits for a free slot on its backend before failing.
+    s3_backend_wait_timeout: float = 30
+    # S3 clients are cached per storage backend and keep their connections open.
+    # The pool should not be smaller than the transfers allowed per backend.
+    s3_max_pool_connections: int = 10
+    s3_tcp_keepalive: bool = True
+    s3_connect_timeout: float = 10
+    s3_read_timeout: float = 60
+    s3_max_attempts: int = 3
+
     auth_api_get_programs: ApiAuthSettings = ApiAuthSettings(enabled=True)
     auth_api_get_program_by_id: ApiAuthSettings = ApiAuthSettings(enabled=True)
     auth_api_get_program_form: ApiAuthSettings = ApiAuthSettings(enabled=True)
@@ -38,3 +136,10 @@ class Settings(AuthSettings, Settings):
     auth_api_get_benefit_details: ApiAuthSettings = ApiAuthSettings(enabled=True)
     auth_api_get_document_by_id: ApiAuthSettings = ApiAuthSettings(enabled=True)
     auth_api_upload_document: ApiAuthSettings = ApiAuthSettings(enabled=True)
+    auth_api_upload_documents: ApiAuthSettings = ApiAuthSettings(enabled=True)
+    auth_api_create_upload_session: ApiAuthSettings = ApiAuthSettings(enabled=True)
+    auth_api_get_upload_session: ApiAuthSettings = ApiAuthSettings(enabled=True)
+    auth_api_upload_chunk: ApiAuthSettings = ApiAuthSettings(enabled=True)
+    auth_api_complete_upload_session: ApiAuthSettings = ApiAuthSettings(enabled=True)
+    auth_api_abort_upload_session: ApiAuthSettings = ApiAuthSettings(enabled=True)
+    auth_api_download_document: ApiAuthSettings = ApiAuthSettings(enabled=True)
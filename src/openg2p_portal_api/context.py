@@ -1,10 +1,49 @@
 from contextvars import ContextVar
-from typing import Any, Dict, List
 
-auth_id_type_config_cache: ContextVar[Dict[str, Any]] = ContextVar(
-    "auth_id_type_config_cache", default={}
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .config import Settings
+from .utils.cache_utils import AsyncTTLCache
+from .utils.issuer_utils import IssuerRegistry
+
+_config = Settings.get_config(strict=False)
+
+auth_id_type_config_cache = AsyncTTLCache(
+    ttl=_config.auth_id_type_config_cache_ttl,
+    maxsize=_config.auth_id_type_config_cache_size,
+)
+
+# Issuer of the auth tokens -> auth_oauth_provider id
+auth_issuer_registry = IssuerRegistry()
+
+# (token hash, api auth settings) -> AuthCredentials with the partner_id
+auth_token_cache = AsyncTTLCache(
+    ttl=_config.auth_token_cache_ttl,
+    maxsize=_config.auth_token_cache_size,
+)
+
+partner_id_cache = AsyncTTLCache(
+    ttl=_config.partner_id_cache_ttl,
+    maxsize=_config.partner_id_cache_size,
+)
+
+# program_id -> (company_id, supporting_documents_store)
+program_storage_cache = AsyncTTLCache(
+    ttl=_config.program_storage_cache_ttl,
+    maxsize=_config.program_storage_cache_size,
 )
 
-partner_fields_cache: ContextVar[List[str]] = ContextVar(
-    "partner_fields_cache", default=[]
+# table name -> column names, read from information_schema
+partner_fields_cache = AsyncTTLCache(ttl=_config.partner_fields_cache_ttl)
+
+dbsession_maker: ContextVar[async_sessionmaker] = ContextVar(
+    "dbsession_maker", default=None
 )
+
+# Session of the current unit of work, see db_utils.scoped_async_session
+request_dbsession: ContextVar[AsyncSession] = ContextVar(
+    "request_dbsession", default=None
+)
+
+# db_utils.RequestSession of the current request, see request_session_scope
+request_session: ContextVar = ContextVar("request_session", default=None)
@@ -1,6 +1,6 @@
 from typing import Annotated, List
 
-from fastapi import Depends
+from fastapi import Depends, Request, Response
 from openg2p_fastapi_auth.controllers.auth_controller import AuthController
 from openg2p_fastapi_auth.models.orm.login_provider import LoginProvider
 from openg2p_fastapi_common.errors.http_exceptions import UnauthorizedError
@@ -10,15 +10,10 @@ from ..config import Settings
 from ..dependencies import JwtBearerAuth
 from ..models.credentials import AuthCredentials
 from ..models.orm.auth_oauth_provider import AuthOauthProviderORM
-from ..models.orm.partner_orm import (
-    BankORM,
-    PartnerBankORM,
-    PartnerORM,
-    PartnerPhoneNoORM,
-)
-from ..models.orm.reg_id_orm import RegIDORM, RegIDTypeORM
 from ..models.profile import GetProfile, UpdateProfile
+from ..services.login_provider_catalog_service import LoginProviderCatalogService
 from ..services.partner_service import PartnerService
+from ..utils.db_utils import release_request_session
 
 _config = Settings.get_config()
 
@@ -34,6 +29,9 @@ class AuthController(AuthController):
         """
         super().__init__(**kwargs)
         self._partner_service = PartnerService.get_component()
+        self._login_provider_catalog_service = (
+            LoginProviderCatalogService.get_component()
+        )
 
         self.router.add_api_route(
             "/profile",
@@ -56,6 +54,14 @@ class AuthController(AuthController):
             self._partner_service = PartnerService.get_component()
         return self._partner_service
 
+    @property
+    def login_provider_catalog_service(self):
+        if not self._login_provider_catalog_service:
+            self._login_provider_catalog_service = (
+                LoginProviderCatalogService.get_component()
+            )
+        return self._login_provider_catalog_service
+
     async def get_profile(
         self,
         auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())],
@@ -80,65 +86,12 @@ class AuthController(AuthController):
                 message="Unauthorized. Partner Not Found in Registry."
             )
 
-        partner_data = await PartnerORM.get_partner_data(auth.partner_id)
-        partner_ids_data = await RegIDORM.get_all_partner_ids(partner_data.id)
-        partner_bank_data = await PartnerBankORM.get_partner_banks(partner_data.id)
-        partner_phone_data = await PartnerPhoneNoORM.get_partner_phone_details(
-            partner_data.id
-        )
-
-        partner_ids = []
-        for reg_id in partner_ids_data:
-            partner_id = {
-                "id_type": None,
-                "value": reg_id.value,
-                "expiry_date": reg_id.expiry_date,
-            }
-
-            id_type_name = await RegIDTypeORM.get_id_type_name(reg_id.id_type)
-
-            if id_type_name:
-                partner_id["id_type"] = id_type_name.name
-
-            partner_ids.append(partner_id)
-
-        partner_bank_accounts = []
-        for bank in partner_bank_data:
-            partner_bank = {
-                "bank_name": None,
-                "acc_number": bank.acc_number,
-            }
-
-            bank = await BankORM.get_by_id(bank.bank_id)
-
-            if bank:
-                partner_bank["bank_name"] = bank.name
-
-            partner_bank_accounts.append(partner_bank)
-
-        partner_phone_numbers = []
-        for phone in partner_phone_data:
-            partner_phone_numbers.append(
-                {
-                    "phone_no": phone.phone_no,
-                    "date_collected": phone.date_collected,
-                }
+        profile = await self.partner_service.get_partner_profile(auth.partner_id)
+        if not profile:
+            raise UnauthorizedError(
+                message="Unauthorized. Partner Not Found in Registry."
             )
-
-        return GetProfile(
-            id=partner_data.id,
-            ids=partner_ids,
-            email=partner_data.email,
-            gender=partner_data.gender,
-            # address=partner_data.address,
-            bank_ids=partner_bank_accounts,
-            addl_name=partner_data.addl_name,
-            given_name=partner_data.given_name,
-            family_name=partner_data.family_name,
-            birthdate=partner_data.birthdate,
-            phone_numbers=partner_phone_numbers,
-            birth_place=partner_data.birth_place,
-        )
+        return profile
 
     async def update_profile(
         self,
@@ -166,6 +119,35 @@ class AuthController(AuthController):
             return "Could not add to registrant to program!!"
         return "Updated the partner info"
 
+    async def get_login_providers(self, request: Request):
+        """
+        Get available Login Providers List. Can also be used to display login providers on UI.
+        Use getLoginProviderRedirect API to redirect to this Login Provider to perform login.
+
+        Served from the in-memory catalog when available. Responds with 304 Not
+        Modified if the If-None-Match header matches the ETag of the list.
+        """
+        catalog = (
+            self.login_provider_catalog_service.catalog
+            if self.login_provider_catalog_service
+            else None
+        )
+        if not catalog:
+            return await super().get_login_providers()
+
+        # Clients must revalidate, so that provider changes show up at once.
+        headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("If-None-Match", None)
+        if if_none_match and (
+            if_none_match.strip() == "*"
+            or catalog.etag
+            in (etag.strip().removeprefix("W/") for etag in if_none_match.split(","))
+        ):
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=catalog.body, media_type="application/json", headers=headers
+        )
+
     async def get_login_providers_db(self) -> List[LoginProvider]:
         return [
             ap.map_auth_provider_to_login_provider()
@@ -174,8 +156,14 @@ class AuthController(AuthController):
 
     async def get_login_provider_db_by_id(self, id: int) -> LoginProvider:
         ap = await AuthOauthProviderORM.get_by_id(id)
-        return ap.map_auth_provider_to_login_provider() if ap else None
+        login_provider = ap.map_auth_provider_to_login_provider() if ap else None
+        # Callers go on with HTTP calls to the provider
+        await release_request_session()
+        return login_provider
 
     async def get_login_provider_db_by_iss(self, iss: str) -> LoginProvider:
         ap = await AuthOauthProviderORM.get_auth_provider_from_iss(iss)
-        return ap.map_auth_provider_to_login_provider() if ap else None
+        login_provider = ap.map_auth_provider_to_login_provider() if ap else None
+        # Callers go on with HTTP calls to the provider
+        await release_request_session()
+        return login_provider
@@ -1,3 +1,5 @@
+from typing import Annotated, Optional
+
 from fastapi import Query
 from openg2p_fastapi_common.controller import BaseController
 
@@ -42,8 +44,12 @@ class DiscoveryController(BaseController):
     async def get_program_by_keyword(
         self,
         keyword: str = Query(..., description="keyword to search"),
-        page: int = Query(None, description="page number for pagination"),
-        pagesize: int = Query(None, description="number of records in a page"),
+        page: Annotated[
+            Optional[int], Query(ge=1, description="page number for pagination")
+        ] = None,
+        pagesize: Annotated[
+            Optional[int], Query(ge=1, description="number of records in a page")
+        ] = None,
     ):
         """
         Retrieves programs by a search keyword. Supports pagination.
@@ -58,6 +64,8 @@ class DiscoveryController(BaseController):
 
         Returns:
 
-            A list of programs that match the search criteria.
+            A list of programs that match the search criteria, best matches first.
         """
-        return await self.program_service.get_program_by_key_service(keyword)
+        return await self.program_service.get_program_by_key_service(
+            keyword, page=page, pagesize=pagesize
+        )
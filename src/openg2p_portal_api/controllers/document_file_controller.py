@@ -1,18 +1,25 @@
-from typing import Annotated
+from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, Depends, File, UploadFile
+from fastapi import APIRouter, Depends, File, Header, Request, UploadFile
 from openg2p_fastapi_common.controller import BaseController
+from openg2p_fastapi_common.errors import BaseAppException
 from openg2p_fastapi_common.errors.http_exceptions import (
     BadRequestError,
     UnauthorizedError,
 )
 
-from openg2p_portal_api.models.document_file import DocumentFile
+from openg2p_portal_api.models.document_file import (
+    DocumentFile,
+    DocumentUploadResult,
+    DocumentUploadSession,
+    DocumentUploadSessionCreate,
+)
 
 from ..config import Settings
 from ..dependencies import JwtBearerAuth
 from ..models.credentials import AuthCredentials
 from ..services.document_file_service import DocumentFileService
+from ..utils.db_utils import release_request_session
 
 _config = Settings.get_config()
 
@@ -31,6 +38,48 @@ class DocumentFileController(BaseController):
             methods=["POST"],
         )
 
+        self.router.add_api_route(
+            "/uploadDocuments/{programid}",
+            self.upload_documents,
+            responses={200: {"model": List[DocumentUploadResult]}},
+            methods=["POST"],
+        )
+
+        self.router.add_api_route(
+            "/uploadSessions/{programid}",
+            self.create_upload_session,
+            responses={200: {"model": DocumentUploadSession}},
+            methods=["POST"],
+        )
+
+        self.router.add_api_route(
+            "/uploadSession/{session_id}",
+            self.get_upload_session,
+            responses={200: {"model": DocumentUploadSession}},
+            methods=["GET"],
+        )
+
+        self.router.add_api_route(
+            "/uploadSession/{session_id}/chunks/{chunk_number}",
+            self.upload_chunk,
+            responses={200: {"model": DocumentUploadSession}},
+            methods=["PUT"],
+        )
+
+        self.router.add_api_route(
+            "/uploadSession/{session_id}/complete",
+            self.complete_upload_session,
+            responses={200: {"model": DocumentUploadSession}},
+            methods=["POST"],
+        )
+
+        self.router.add_api_route(
+            "/uploadSession/{session_id}",
+            self.abort_upload_session,
+            responses={200: {"model": DocumentUploadSession}},
+            methods=["DELETE"],
+        )
+
         self.router.add_api_route(
             "/getDocument/{document_id}",
             self.get_document_by_id,
@@ -38,6 +87,17 @@ class DocumentFileController(BaseController):
             methods=["GET"],
         )
 
+        self.router.add_api_route(
+            "/downloadDocument/{document_id}",
+            self.download_document,
+            responses={
+                200: {"content": {"application/octet-stream": {}}},
+                206: {"description": "Partial content of a Range request"},
+                307: {"description": "Redirect to a presigned URL of the document"},
+            },
+            methods=["GET"],
+        )
+
     @property
     def file_service(self):
         if not self._file_service:
@@ -64,9 +124,120 @@ class DocumentFileController(BaseController):
                 partner_id=auth.partner_id,
             )
             return message
+        except BaseAppException:
+            raise
         except Exception:
             raise BadRequestError(message="File upload failed!") from None
 
+    async def upload_documents(
+        self,
+        programid: int,
+        auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())],
+        file_tag: str = None,
+        files: List[UploadFile] = File(...),
+    ):
+        if not auth.partner_id:
+            raise UnauthorizedError(
+                message="Unauthorized. Partner Not Found in Registry."
+            )
+
+        try:
+            return await self.file_service.upload_documents(
+                files=files,
+                programid=programid,
+                file_tag=file_tag,
+                partner_id=auth.partner_id,
+            )
+        except BaseAppException:
+            raise
+        except Exception:
+            raise BadRequestError(message="File upload failed!") from None
+
+    async def create_upload_session(
+        self,
+        programid: int,
+        auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())],
+        upload: DocumentUploadSessionCreate,
+    ):
+        if not auth.partner_id:
+            raise UnauthorizedError(
+                message="Unauthorized. Partner Not Found in Registry."
+            )
+
+        return await self.file_service.create_upload_session(
+            programid=programid,
+            partner_id=auth.partner_id,
+            name=upload.name,
+            file_size=upload.file_size,
+            file_tag=upload.file_tag,
+        )
+
+    async def get_upload_session(
+        self,
+        session_id: str,
+        auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())],
+    ):
+        if not auth.partner_id:
+            raise UnauthorizedError(
+                message="Unauthorized. Partner Not Found in Registry."
+            )
+
+        return await self.file_service.get_upload_session(session_id, auth.partner_id)
+
+    async def upload_chunk(
+        self,
+        session_id: str,
+        chunk_number: int,
+        auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())],
+        request: Request,
+    ):
+        if not auth.partner_id:
+            raise UnauthorizedError(
+                message="Unauthorized. Partner Not Found in Registry."
+            )
+
+        # The raw request body is the chunk, it is never larger than the chunk
+        # size of the session, which grows with the file size.
+        upload_session = await self.file_service.get_upload_session(
+            session_id, auth.partner_id
+        )
+        # The body may be slow to arrive
+        await release_request_session()
+        data = bytearray()
+        async for block in request.stream():
+            data.extend(block)
+            if len(data) > upload_session.chunk_size:
+                raise BadRequestError(message="The chunk is too large.") from None
+        return await self.file_service.upload_chunk(
+            session_id, auth.partner_id, chunk_number, bytes(data)
+        )
+
+    async def complete_upload_session(
+        self,
+        session_id: str,
+        auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())],
+    ):
+        if not auth.partner_id:
+            raise UnauthorizedError(
+                message="Unauthorized. Partner Not Found in Registry."
+            )
+
+        return await self.file_service.complete_upload_session(
+            session_id, auth.partner_id
+        )
+
+    async def abort_upload_session(
+        self,
+        session_id: str,
+        auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())],
+    ):
+        if not auth.partner_id:
+            raise UnauthorizedError(
+                message="Unauthorized. Partner Not Found in Registry."
+            )
+
+        return await self.file_service.abort_upload_session(session_id, auth.partner_id)
+
     async def get_document_by_id(
         self,
         document_id: int,
@@ -82,3 +253,23 @@ class DocumentFileController(BaseController):
             return document
         except Exception:
             raise BadRequestError(message="Failed to retrieve document by ID") from None
+
+    async def download_document(
+        self,
+        document_id: int,
+        auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())],
+        range: Annotated[Optional[str], Header()] = None,
+    ):
+        if not auth.partner_id:
+            raise UnauthorizedError(
+                message="Unauthorized. Partner Not Found in Registry."
+            )
+
+        try:
+            return await self.file_service.download_document(
+                document_id, auth.partner_id, range_header=range
+            )
+        except BaseAppException:
+            raise
+        except Exception:
+            raise BadRequestError(message="File download failed!") from None
@@ -1,6 +1,6 @@
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 
-from fastapi import Depends
+from fastapi import Depends, Query, Response
 from fastapi.responses import JSONResponse
 from openg2p_fastapi_common.controller import BaseController
 from openg2p_fastapi_common.errors.http_exceptions import UnauthorizedError
@@ -10,6 +10,7 @@ from ..dependencies import JwtBearerAuth
 from ..models.credentials import AuthCredentials
 from ..models.program import ApplicationDetails, BenefitDetails, Program, ProgramSummary
 from ..services.program_service import ProgramService
+from ..utils.pagination_utils import NEXT_CURSOR_HEADER
 
 _config = Settings.get_config()
 
@@ -132,47 +133,84 @@ class ProgramController(BaseController):
         return await self.program_service.get_program_summary_service(auth.partner_id)
 
     async def get_application_details(
-        self, auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())]
+        self,
+        auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())],
+        response: Response = None,
+        limit: Annotated[
+            Optional[int], Query(description="number of records in a page")
+        ] = None,
+        after: Annotated[
+            Optional[str], Query(description="cursor of the page to retrieve")
+        ] = None,
     ):
         """
-        Retrieves details of applications. Requires authentication.
+        Retrieves details of applications. Requires authentication. Supports cursor pagination.
 
         Args:
 
             auth (AuthCredentials): Authentication credentials, obtained via JWT Bearer Auth.
 
+            limit (int, optional): The number of records to return per page. All the records are returned if neither limit nor after is given.
+
+            after (str, optional): The cursor returned in the X-Next-Cursor header of the previous page.
+
         Returns:
 
             List[ApplicationDetails]:
 
             A list of application detail objects. Focuses on program name, application ID, date applied, and application status for each application linked to the partner_id.
+            The X-Next-Cursor response header holds the cursor of the next page, and is absent on the last page.
         """
         if not auth.partner_id:
             raise UnauthorizedError(
                 message="Unauthorized. Partner Not Found in Registry."
             )
-        return await self.program_service.get_application_details_service(
-            auth.partner_id
+        (
+            details,
+            next_cursor,
+        ) = await self.program_service.get_application_details_service(
+            auth.partner_id, limit=limit, after=after
         )
+        if next_cursor and response is not None:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return details
 
     async def get_benefit_details(
-        self, auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())]
+        self,
+        auth: Annotated[AuthCredentials, Depends(JwtBearerAuth())],
+        response: Response = None,
+        limit: Annotated[
+            Optional[int], Query(description="number of records in a page")
+        ] = None,
+        after: Annotated[
+            Optional[str], Query(description="cursor of the page to retrieve")
+        ] = None,
     ):
         """
-        Retrieves details of benefits associated with programs. Requires authentication.
+        Retrieves details of benefits associated with programs. Requires authentication. Supports cursor pagination.
 
         Args:
 
             auth (AuthCredentials): Authentication credentials, obtained via JWT Bearer Auth.
 
+            limit (int, optional): The number of records to return per page. All the records are returned if neither limit nor after is given.
+
+            after (str, optional): The cursor returned in the X-Next-Cursor header of the previous page.
+
         Returns:
 
             List[BenefitDetails]:
 
             A list of benefit detail objects. Fetches details like program name, enrollment status, funds awaited and received, and entitlement reference numbers for specified partner_id.
+            The X-Next-Cursor response header holds the cursor of the next page, and is absent on the last page.
         """
         if not auth.partner_id:
             raise UnauthorizedError(
                 message="Unauthorized. Partner Not Found in Registry."
             )
-        return await self.program_service.get_benefit_details_service(auth.partner_id)
+        details, next_cursor = await self.program_service.get_benefit_details_service(
+            auth.partner_id, limit=limit, after=after
+        )
+        if next_cursor and response is not None:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return details
@@ -1,7 +1,11 @@
-from typing import Optional
+import hashlib
+import time
+from typing import AsyncIterator, Optional, Tuple
 
+import orjson
 from fastapi import Request
 from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
 from openg2p_fastapi_auth.dependencies import JwtBearerAuth
 from openg2p_fastapi_auth.models.credentials import (
     AuthCredentials as OriginalAuthCredentials,
@@ -10,15 +14,99 @@ from openg2p_fastapi_common.errors.http_exceptions import (
     InternalServerError,
     UnauthorizedError,
 )
+from pydantic import BaseModel
 
+from .config import Settings
+from .context import auth_token_cache
 from .models.credentials import AuthCredentials
 from .models.orm.auth_oauth_provider import AuthOauthProviderORM
 from .models.orm.reg_id_orm import RegIDORM
+from .utils.db_utils import request_session_scope
+
+_config = Settings.get_config(strict=False)
+
+
+async def get_db_session() -> AsyncIterator[None]:
+    """
+    Request scoped session. The ORM calls made while serving the request
+    outside units of work share one session, opened on the first call, and
+    hence a single pooled connection. It is released before slow I/O, see
+    db_utils.release_request_session.
+    """
+    async with request_session_scope():
+        yield
 
 
 class JwtBearerAuth(JwtBearerAuth):
     async def __call__(
         self, request: Request
+    ) -> Optional[HTTPAuthorizationCredentials]:
+        """
+        Resolved credentials are cached per token and API auth settings, so
+        the requests of a page load verify the token signature and look up
+        the partner only once. Failures are not cached.
+        """
+        cache_key = self.get_token_cache_key(request)
+        if not cache_key:
+            return await self.authenticate(request)
+
+        key, ttl = cache_key
+        res = await auth_token_cache.get_or_load(
+            key, lambda: self.authenticate(request), ttl=ttl
+        )
+        # Copied, so that a request changing its credentials does not affect
+        # the others.
+        return res.model_copy() if res else res
+
+    def get_token_cache_key(self, request: Request) -> Optional[Tuple[tuple, float]]:
+        """
+        Returns the cache key of the tokens of the request and how long their
+        credentials can be cached, None if they must not be cached.
+        The token is only parsed here, it is verified by authenticate.
+        """
+        if not _config.auth_enabled:
+            return None
+        api_auth_settings = getattr(
+            _config, "auth_api_" + str(request.scope["route"].name), None
+        )
+        if isinstance(api_auth_settings, BaseModel):
+            api_auth_settings = api_auth_settings.model_dump()
+        if not (api_auth_settings and api_auth_settings.get("enabled", None)):
+            return None
+
+        jwt_token = request.headers.get("Authorization", None) or request.cookies.get(
+            "X-Access-Token", None
+        )
+        jwt_id_token = request.cookies.get("X-ID-Token", None)
+        jwt_token = (jwt_token or "").removeprefix("Bearer ")
+        if not jwt_token:
+            return None
+
+        expiries = []
+        for token in filter(None, (jwt_token, jwt_id_token)):
+            try:
+                expiries.append(jwt.get_unverified_claims(token).get("exp", None))
+            except Exception:
+                return None
+        # Tokens without an expiry are not cached.
+        if not isinstance(expiries[0], (int, float)):
+            return None
+        now = time.time()
+        ttl = min(
+            [_config.auth_token_cache_ttl]
+            + [exp - now for exp in expiries if isinstance(exp, (int, float))]
+        )
+        if ttl <= 0:
+            return None
+
+        token_hash = hashlib.sha256(
+            f"{jwt_token}\n{jwt_id_token or ''}".encode()
+        ).hexdigest()
+        settings_key = orjson.dumps(api_auth_settings, option=orjson.OPT_SORT_KEYS)
+        return (token_hash, settings_key), ttl
+
+    async def authenticate(
+        self, request: Request
     ) -> Optional[HTTPAuthorizationCredentials]:
         res: OriginalAuthCredentials = await super().__call__(request)
         if not res:
@@ -34,15 +122,14 @@ class JwtBearerAuth(JwtBearerAuth):
             res.model_dump(), id_type_config["token_map"]
         )
 
-        partners = await RegIDORM.get_partner_by_reg_id(
+        partner_id = await RegIDORM.get_partner_id_by_reg_id(
             id_type_config["g2p_id_type"], mapped_res.get("user_id")
         )
-        if not partners:
+        if not partner_id:
             raise UnauthorizedError(
                 message="Unauthorized. Partner Not Found in Registry."
             )
-        partner = partners[0]
 
-        new_res = AuthCredentials(partner_id=partner.partner_id, **res.model_dump())
+        new_res = AuthCredentials(partner_id=partner_id, **res.model_dump())
 
         return new_res
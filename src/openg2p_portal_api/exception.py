@@ -1,6 +1,18 @@
+from openg2p_fastapi_common.errors import BaseAppException
 from openg2p_fastapi_common.errors.http_exceptions import BadRequestError
 
 
+class ServiceUnavailableError(BaseAppException):
+    def __init__(
+        self,
+        code="G2P-REQ-503",
+        message="Service Unavailable",
+        http_status_code=503,
+        **kwargs,
+    ):
+        super().__init__(code, message, http_status_code, **kwargs)
+
+
 def handle_exception(e, message_prefix="Error"):
     """Helper function to raise BadRequestError with a formatted message."""
     raise BadRequestError(message=f"{message_prefix}: {str(e)}") from None
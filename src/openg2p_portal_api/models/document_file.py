@@ -1,6 +1,33 @@
+from datetime import datetime
+from typing import List, Optional
+
 from pydantic import BaseModel, ConfigDict
 
 
 class DocumentFile(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     name: str
+
+
+class DocumentUploadResult(BaseModel):
+    name: str
+    id: Optional[int] = None
+    uploaded: bool
+    message: str
+
+
+class DocumentUploadSessionCreate(BaseModel):
+    name: str
+    file_size: int
+    file_tag: Optional[str] = None
+
+
+class DocumentUploadSession(BaseModel):
+    id: str
+    document_id: Optional[int] = None
+    file_size: int
+    chunk_size: int
+    chunk_count: int
+    missing_chunks: List[int]
+    state: str
+    expires_at: datetime
@@ -0,0 +1,20 @@
+from datetime import datetime
+from typing import Optional, Tuple
+
+from openg2p_fastapi_auth.models.login_provider import LoginProviderResponse
+from pydantic import BaseModel, ConfigDict
+
+
+class LoginProviderCatalog(BaseModel):
+    """
+    Immutable snapshot of the login providers, with the getLoginProviders
+    response body encoded once. Replaced as a whole on refresh.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    login_providers: Tuple[LoginProviderResponse, ...] = ()
+    body: bytes = b""
+    etag: str = ""
+    version: Tuple[Optional[datetime], int] = (None, 0)
+    loaded_at: float = 0
@@ -1,5 +1,6 @@
 import base64
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, List, Optional, Tuple, Union
 
 import orjson
 from openg2p_fastapi_auth.models.login_provider import LoginProviderTypes
@@ -8,13 +9,16 @@ from openg2p_fastapi_auth.models.provider_auth_parameters import (
     OauthClientAssertionType,
     OauthProviderParameters,
 )
-from openg2p_fastapi_common.context import dbengine
 from openg2p_fastapi_common.models import BaseORMModel
-from sqlalchemy import and_, select
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy import func, select
 from sqlalchemy.orm import Mapped, mapped_column
 
-from ...context import auth_id_type_config_cache
+from ...config import Settings
+from ...context import auth_id_type_config_cache, auth_issuer_registry
+from ...utils.db_utils import get_async_session
+from ..token_map import TokenMap
+
+_config = Settings.get_config(strict=False)
 
 
 class AuthOauthProviderORM(BaseORMModel):
@@ -51,14 +55,14 @@ class AuthOauthProviderORM(BaseORMModel):
     g2p_self_service_allowed: Mapped[Optional[bool]] = mapped_column()
     g2p_portal_oauth_callback_url: Mapped[Optional[str]] = mapped_column()
     g2p_id_type: Mapped[Optional[int]] = mapped_column()
+    write_date: Mapped[Optional[datetime]] = mapped_column()
 
     @classmethod
     async def get_by_id(cls, id: int, active=True) -> "AuthOauthProviderORM":
         result = None
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with get_async_session() as session:
             result = await session.get(cls, id)
-            if result.g2p_self_service_allowed != active:
+            if (not result) or (result.g2p_self_service_allowed != active):
                 result = None
 
         return result
@@ -66,8 +70,7 @@ class AuthOauthProviderORM(BaseORMModel):
     @classmethod
     async def get_all(cls, active=True) -> List["AuthOauthProviderORM"]:
         response = []
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with get_async_session() as session:
             stmt = (
                 select(cls)
                 .where(cls.g2p_self_service_allowed == active)
@@ -81,28 +84,67 @@ class AuthOauthProviderORM(BaseORMModel):
 
     @classmethod
     async def get_auth_provider_from_iss(cls, iss: str) -> "AuthOauthProviderORM":
-        response = None
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
-            stmt = (
-                select(cls)
-                .where(
-                    and_(
-                        cls.g2p_self_service_allowed == True,  # noqa: E712
-                        cls.token_endpoint.ilike(f"%{iss}%"),
-                    )
-                )
-                .order_by(cls.id.asc())
+        """
+        Returns the active provider whose issuer is iss, resolved from the
+        issuer registry and loaded by its primary key.
+        """
+        await cls.refresh_issuer_registry()
+        provider_id = auth_issuer_registry.resolve(iss)
+        if not provider_id:
+            return None
+        return await cls.get_by_id(provider_id)
+
+    @classmethod
+    async def get_providers_version(cls) -> Tuple[Optional[datetime], int]:
+        """
+        Returns the latest write_date and the number of providers, which change
+        whenever a provider is created, updated or deleted.
+        """
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(func.max(cls.write_date), func.count(cls.id))
             )
-            result = await session.execute(stmt)
-            response = result.scalar()
-        return response
+            return tuple(result.one())
+
+    @classmethod
+    async def refresh_issuer_registry(cls, force: bool = False) -> bool:
+        """
+        Rebuilds the issuer registry from the active providers if they changed.
+        Changes are checked at most every check interval. Returns True if rebuilt.
+        Changed providers also drop the cached ID type configs.
+        """
+        registry = auth_issuer_registry
+        if not (
+            force or registry.is_stale(_config.auth_issuer_registry_check_interval)
+        ):
+            return False
+
+        version: Any = await cls.get_providers_version()
+        if not force and registry.loaded and version == registry.version:
+            registry.mark_checked()
+            return False
+
+        if registry.loaded and version != registry.version:
+            auth_id_type_config_cache.invalidate()
+        registry.load(await cls.get_all(), version, _config.auth_issuer_overrides)
+        return True
 
     @classmethod
     async def get_auth_id_type_config(cls, id: int = None, iss: str = None):
-        iss_id = id if id else iss
-        id_type_config = auth_id_type_config_cache.get().get(iss_id, None)
-        if not id_type_config:
+        """
+        Returns the ID type config of the auth provider, given either its id or
+        the issuer of its tokens. Served from a process wide TTL cache, which is
+        dropped when auth_oauth_provider changes, see refresh_issuer_registry.
+        """
+        await cls.refresh_issuer_registry()
+        if id:
+            key = ("id", id)
+        elif iss:
+            key = ("iss", iss)
+        else:
+            return None
+
+        async def load():
             ap = None
             if id:
                 ap = await cls.get_by_id(id)
@@ -110,14 +152,30 @@ class AuthOauthProviderORM(BaseORMModel):
                 ap = await cls.get_auth_provider_from_iss(iss)
 
             if ap and ap.g2p_id_type:
-                id_type_config = {
+                return {
                     "g2p_id_type": ap.g2p_id_type,
-                    "token_map": ap.token_map,
+                    # Compiled once, and cached with the config
+                    "token_map": TokenMap.compile(ap.token_map),
                     "date_format": ap.date_format,
                     "company_id": ap.company_id,
                 }
-                auth_id_type_config_cache.get()[iss_id] = id_type_config
-        return id_type_config
+            return None
+
+        return await auth_id_type_config_cache.get_or_load(key, load)
+
+    @classmethod
+    def invalidate_auth_id_type_config(cls, id: int = None, iss: str = None):
+        """
+        Drops the cached ID type config of the given provider or issuer.
+        Drops all cached configs if neither is given.
+        """
+        if id:
+            auth_id_type_config_cache.invalidate(("id", id))
+        if iss:
+            auth_id_type_config_cache.invalidate(("iss", iss))
+        if not (id or iss):
+            auth_id_type_config_cache.invalidate()
+            auth_issuer_registry.invalidate()
 
     def map_auth_provider_to_login_provider(self) -> LoginProvider:
         response_type = "token"
@@ -165,13 +223,7 @@ class AuthOauthProviderORM(BaseORMModel):
         )
 
     @classmethod
-    def map_validation_response(cls, req: dict, mapping: str = None):
-        res = {}
-        mapping = mapping.strip() if mapping else ""
-        if mapping:
-            if mapping.endswith("*:*"):
-                res = req
-            for pair in mapping.split(" "):
-                from_key, to_key = (k.strip() for k in pair.split(":", 1))
-                res[to_key] = req.get(from_key, "")
-        return res
+    def map_validation_response(
+        cls, req: dict, mapping: Union[str, TokenMap, None] = None
+    ):
+        return TokenMap.compile(mapping).apply(req)
@@ -1,7 +1,9 @@
 from openg2p_fastapi_common.models import BaseORMModel
-from sqlalchemy import Boolean, ForeignKey, Integer, String
+from sqlalchemy import Boolean, ForeignKey, Integer, String, select
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from ...utils.db_utils import get_async_session
+
 
 class DocumentFileORM(BaseORMModel):
     __tablename__ = "storage_file"
@@ -32,3 +34,18 @@ class DocumentFileORM(BaseORMModel):
     program_membership = relationship(
         "ProgramMembershipORM", back_populates="document_files"
     )
+
+    @classmethod
+    async def get_partner_document(cls, document_id: int, partner_id: int):
+        """
+        Returns the active document if it belongs to one of the partner's
+        program memberships.
+        """
+        async with get_async_session() as session:
+            stmt = select(cls).where(
+                cls.id == document_id,
+                cls.active.is_(True),
+                cls.program_membership.has(partner_id=partner_id),
+            )
+            result = await session.execute(stmt)
+        return result.scalar()
@@ -0,0 +1,78 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from openg2p_fastapi_common.models import BaseORMModel
+from sqlalchemy import (
+    JSON,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+    select,
+    update,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ...utils.db_utils import get_async_session
+
+
+class DocumentJobORM(BaseORMModel):
+    """
+    Outbox of the post-processing jobs of uploaded documents. A job is saved in
+    the transaction of its upload, and run later by the document job workers.
+    """
+
+    __tablename__ = "g2p_document_job"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    document_file_id: Mapped[int] = mapped_column(
+        ForeignKey("storage_file.id", ondelete="CASCADE"), index=True
+    )
+    # pending, running, done or failed
+    state: Mapped[str] = mapped_column(String(), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer(), default=0)
+    # When a pending job is due, or when a running job is considered lost.
+    available_at: Mapped[datetime] = mapped_column(
+        DateTime(), default=datetime.utcnow, index=True
+    )
+    last_error: Mapped[Optional[str]] = mapped_column(Text(), nullable=True)
+    result: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON(), nullable=True)
+    create_date: Mapped[datetime] = mapped_column(DateTime(), default=datetime.utcnow)
+
+    @classmethod
+    async def get_due_jobs(cls, now: datetime, limit: int):
+        """
+        Returns the pending jobs that are due and the running jobs that timed
+        out, locked. Jobs locked by another worker are skipped.
+        """
+        async with get_async_session() as session:
+            stmt = (
+                select(cls)
+                .where(cls.state.in_(("pending", "running")), cls.available_at <= now)
+                .order_by(cls.available_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            result = await session.execute(stmt)
+        return result.scalars().all()
+
+    @classmethod
+    async def update_running_job(cls, job_id: int, attempt: int, **values) -> bool:
+        """
+        Updates the job only if it is still running the given attempt. A job that
+        timed out may have been claimed again, and the attempt of the worker
+        that lost it must not overwrite it. The caller commits.
+        Returns False if the job was lost.
+        """
+        async with get_async_session() as session:
+            result = await session.execute(
+                update(cls)
+                .where(
+                    cls.id == job_id,
+                    cls.state == "running",
+                    cls.attempts == attempt,
+                )
+                .values(**values)
+            )
+        return result.rowcount == 1
@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from openg2p_fastapi_common.models import BaseORMModel
+from sqlalchemy import JSON, DateTime, ForeignKey, Integer, String, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ...utils.db_utils import get_async_session
+
+
+class DocumentUploadSessionORM(BaseORMModel):
+    """
+    A resumable upload of one document, sent in numbered chunks. The chunks are
+    stored as the parts of a multipart upload on the storage backend, and the
+    received ones are tracked in parts: {"<chunk number>": {"etag", "size"}}.
+    """
+
+    __tablename__ = "g2p_document_upload_session"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    partner_id: Mapped[int] = mapped_column(Integer(), index=True)
+    document_file_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("storage_file.id", ondelete="SET NULL"), nullable=True
+    )
+    backend_id: Mapped[int] = mapped_column(Integer())
+    relative_path: Mapped[str] = mapped_column(String())
+    upload_id: Mapped[str] = mapped_column(String(), nullable=True)
+    file_size: Mapped[int] = mapped_column(Integer())
+    chunk_size: Mapped[int] = mapped_column(Integer())
+    parts: Mapped[Dict[str, Any]] = mapped_column(JSON(), default={})
+    state: Mapped[str] = mapped_column(String(), default="open")
+    create_date: Mapped[datetime] = mapped_column(DateTime(), default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(), index=True)
+
+    @property
+    def chunk_count(self) -> int:
+        return max(-(-self.file_size // self.chunk_size), 1)
+
+    def get_chunk_length(self, chunk_number: int) -> int:
+        if chunk_number < self.chunk_count:
+            return self.chunk_size
+        return self.file_size - (self.chunk_count - 1) * self.chunk_size
+
+    @property
+    def missing_chunks(self) -> List[int]:
+        return [
+            chunk_number
+            for chunk_number in range(1, self.chunk_count + 1)
+            if str(chunk_number) not in (self.parts or {})
+        ]
+
+    @classmethod
+    async def get_partner_session(
+        cls, session_id: str, partner_id: int, for_update: bool = False
+    ):
+        async with get_async_session() as session:
+            stmt = select(cls).where(cls.id == session_id, cls.partner_id == partner_id)
+            if for_update:
+                # Concurrent chunks of one session update the same parts.
+                stmt = stmt.with_for_update().execution_options(populate_existing=True)
+            result = await session.execute(stmt)
+        return result.scalar()
+
+    @classmethod
+    async def get_expired_sessions(cls, now: datetime, limit: int):
+        async with get_async_session() as session:
+            stmt = (
+                select(cls)
+                .where(cls.state == "open", cls.expires_at < now)
+                .order_by(cls.expires_at)
+                .limit(limit)
+            )
+            result = await session.execute(stmt)
+        return result.scalars().all()
@@ -1,7 +1,6 @@
 from datetime import date, datetime
 from typing import List, Optional
 
-from openg2p_fastapi_common.context import dbengine
 from openg2p_fastapi_common.models import BaseORMModel, BaseORMModelWithId
 from sqlalchemy import (
     Boolean,
@@ -9,14 +8,18 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     String,
+    column,
+    insert,
     select,
+    table,
     text,
 )
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from openg2p_portal_api.models.orm.document_file_orm import DocumentFileORM
 
+from ...utils.db_utils import get_async_session
 from .reg_id_orm import RegIDORM
 
 
@@ -49,17 +52,81 @@ class PartnerORM(BaseORMModelWithId):
 
     @classmethod
     async def get_partner_data(cls, id: int):
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with get_async_session() as session:
             stmt = select(cls).filter(cls.id == id)
 
             result = await session.execute(stmt)
         return result.scalar()
 
+    @classmethod
+    async def create_registrant(
+        cls, values: dict, id_type: int, id_value: str, phone_no: str = None
+    ) -> Optional[int]:
+        """
+        Creates the partner with its reg id and phone number in one transaction,
+        using INSERT ... RETURNING. values can hold any column of res_partner,
+        not only the mapped ones.
+
+        Returns the id of the new partner. Returns None, without creating
+        anything, if the reg id was created meanwhile by another request.
+
+        Requires a unique index on g2p_reg_id (id_type, value), the conflict
+        target of the reg id insert. Without it the insert is rejected by the
+        database instead of creating a duplicate reg id.
+        """
+        values = {**cls.get_column_defaults(), **values}
+        partner_table = table(
+            cls.__tablename__,
+            column("id"),
+            *(
+                column(key, cls.__table__.c[key].type)
+                if key in cls.__table__.c
+                else column(key)
+                for key in values
+            ),
+        )
+        async with get_async_session() as session:
+            result = await session.execute(
+                insert(partner_table).values(values).returning(partner_table.c.id)
+            )
+            partner_id = result.scalar_one()
+
+            result = await session.execute(
+                pg_insert(RegIDORM)
+                .values(partner_id=partner_id, id_type=id_type, value=id_value)
+                .on_conflict_do_nothing(index_elements=["id_type", "value"])
+                .returning(RegIDORM.id)
+            )
+            if result.scalar() is None:
+                await session.rollback()
+                return None
+
+            await session.execute(
+                insert(PartnerPhoneNoORM).values(
+                    partner_id=partner_id, phone_no=phone_no
+                )
+            )
+            await session.commit()
+        return partner_id
+
+    @classmethod
+    def get_column_defaults(cls) -> dict:
+        """
+        Returns the python side defaults of the mapped columns, which are not
+        applied to inserts into a plain table.
+        """
+        return {
+            col.key: col.default.arg(None)
+            if col.default.is_callable
+            else col.default.arg
+            for col in cls.__table__.columns
+            if col.default is not None
+            and (col.default.is_callable or col.default.is_scalar)
+        }
+
     @classmethod
     async def get_partner_fields(cls):
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with get_async_session() as session:
             result = await session.execute(
                 text(
                     "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = :tbl_name"
@@ -77,14 +144,22 @@ class PartnerBankORM(BaseORMModelWithId):
     bank_id: Mapped[int] = mapped_column()
 
     @classmethod
-    async def get_partner_banks(cls, id: int) -> List["PartnerBankORM"]:
+    async def get_partner_banks_with_name(cls, id: int):
+        """
+        Returns the bank accounts of the partner along with the name of the bank.
+        """
         response = []
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
-            stmt = select(cls).filter(cls.partner_id == id)
+        async with get_async_session() as session:
+            stmt = (
+                select(BankORM.name.label("bank_name"), cls.acc_number)
+                .select_from(cls)
+                .outerjoin(BankORM, cls.bank_id == BankORM.id)
+                .filter(cls.partner_id == id)
+                .order_by(cls.id.asc())
+            )
             result = await session.execute(stmt)
 
-            response = list(result.scalars())
+            response = result.all()
         return response
 
 
@@ -107,8 +182,7 @@ class PartnerPhoneNoORM(BaseORMModel):
     @classmethod
     async def get_partner_phone_details(cls, id: int) -> List["PartnerPhoneNoORM"]:
         response = []
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with get_async_session() as session:
             stmt = select(cls).filter(cls.partner_id == id)
             result = await session.execute(stmt)
 
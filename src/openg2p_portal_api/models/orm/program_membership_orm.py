@@ -1,14 +1,13 @@
 from datetime import datetime
 from typing import List, Optional
 
-from openg2p_fastapi_common.context import dbengine
 from openg2p_fastapi_common.models import BaseORMModel
-from sqlalchemy import DateTime, ForeignKey, Integer, String, and_, select
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy import DateTime, ForeignKey, Integer, String, and_, select, true
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from openg2p_portal_api.models.orm.document_file_orm import DocumentFileORM
 
+from ...utils.db_utils import get_async_session
 from .program_registrant_info_orm import ProgramRegistrantInfoORM
 
 
@@ -29,10 +28,30 @@ class ProgramMembershipORM(BaseORMModel):
         back_populates="program_membership"
     )
 
+    @classmethod
+    async def get_partner_memberships(cls, partner_id: int):
+        """
+        Returns the memberships of the partner, along with the state of the
+        partner's latest application in each program.
+        """
+        latest_reg_info = ProgramRegistrantInfoORM.select_latest_state(cls.id)
+        async with get_async_session() as session:
+            stmt = (
+                select(
+                    cls.program_id,
+                    cls.id.label("membership_id"),
+                    cls.state.label("membership_state"),
+                    latest_reg_info.c.state.label("last_application_status"),
+                )
+                .outerjoin(latest_reg_info, true())
+                .where(cls.partner_id == partner_id)
+            )
+            result = await session.execute(stmt)
+        return result.all()
+
     @classmethod
     async def get_membership_by_id(cls, program_id: int, partner_id: int):
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with get_async_session() as session:
             stmt = select(cls).where(
                 and_(cls.program_id == program_id, cls.partner_id == partner_id)
             )
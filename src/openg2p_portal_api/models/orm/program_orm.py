@@ -1,7 +1,6 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from openg2p_fastapi_common.context import dbengine
 from openg2p_fastapi_common.models import BaseORMModelWithId
 from sqlalchemy import (
     DateTime,
@@ -9,14 +8,25 @@ from sqlalchemy import (
     Integer,
     String,
     and_,
+    case,
     desc,
     func,
+    literal_column,
     or_,
     select,
+    true,
+)
+from sqlalchemy.orm import (
+    Mapped,
+    load_only,
+    mapped_column,
+    relationship,
+    selectinload,
 )
-from sqlalchemy.ext.asyncio import async_sessionmaker
-from sqlalchemy.orm import Mapped, mapped_column, relationship, selectinload
 
+from ...config import Settings
+from ...utils.db_utils import get_async_session
+from ...utils.pagination_utils import keyset_after
 from .cycle_membership_orm import CycleMembershipORM
 from .cycle_orm import CycleORM
 from .entitlement_orm import EntitlementORM
@@ -25,6 +35,22 @@ from .payment_orm import PaymentORM
 from .program_membership_orm import ProgramMembershipORM
 from .program_registrant_info_orm import ProgramRegistrantInfoORM
 
+_config = Settings.get_config(strict=False)
+
+
+def _is_cycle_member():
+    """
+    Condition that the partner of the entitlement is a member of its cycle.
+    """
+    return (
+        select(CycleMembershipORM.id)
+        .where(
+            CycleMembershipORM.partner_id == EntitlementORM.partner_id,
+            CycleMembershipORM.cycle_id == EntitlementORM.cycle_id,
+        )
+        .exists()
+    )
+
 
 class ProgramORM(BaseORMModelWithId):
     __tablename__ = "g2p_program"
@@ -36,6 +62,7 @@ class ProgramORM(BaseORMModelWithId):
     is_reimbursement_program: Mapped[bool] = mapped_column()
     active: Mapped[bool] = mapped_column()
     create_date: Mapped[datetime] = mapped_column(DateTime())
+    write_date: Mapped[datetime] = mapped_column(DateTime())
     company_id: Mapped[int] = mapped_column(Integer)
     supporting_documents_store: Mapped[int] = mapped_column(Integer)
     membership: Mapped[Optional[List["ProgramMembershipORM"]]] = relationship(
@@ -49,12 +76,80 @@ class ProgramORM(BaseORMModelWithId):
     # cycles: Mapped[Optional[list["CycleORM"]]] = relationship(back_populates="program")
 
     @classmethod
-    async def get_all_programs(cls) -> List["ProgramORM"]:
+    async def get_program_catalog(cls) -> List["ProgramORM"]:
+        """
+        Returns the active programs, loading only the columns kept in the
+        in-memory program catalog.
+        """
         response = []
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with get_async_session() as session:
             stmt = (
                 select(cls)
+                .options(
+                    load_only(
+                        cls.id,
+                        cls.name,
+                        cls.description,
+                        cls.state,
+                        cls.self_service_portal_form,
+                        cls.is_multiple_form_submission,
+                        cls.is_reimbursement_program,
+                        cls.create_date,
+                    )
+                )
+                .filter(cls.active.is_(True))
+                .order_by(cls.id)
+            )
+            result = await session.execute(stmt)
+            response = list(result.scalars())
+
+        return response
+
+    @classmethod
+    async def get_catalog_version(cls) -> Tuple[Optional[datetime], int]:
+        """
+        Returns the latest write_date and the number of programs.
+        Any program being created, updated or deleted changes this pair.
+        """
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(func.max(cls.write_date), func.count(cls.id))
+            )
+            return tuple(result.one())
+
+    @classmethod
+    def select_with_partner_membership(cls, partner_id: int):
+        """
+        Selects programs along with the membership of the given partner only,
+        and the state of the partner's latest application in that program.
+        Programs the partner is not a member of have NULL membership columns.
+        """
+        latest_reg_info = ProgramRegistrantInfoORM.select_latest_state(
+            ProgramMembershipORM.id
+        )
+        return (
+            select(
+                cls,
+                ProgramMembershipORM.id.label("membership_id"),
+                ProgramMembershipORM.state.label("membership_state"),
+                latest_reg_info.c.state.label("last_application_status"),
+            )
+            .outerjoin(
+                ProgramMembershipORM,
+                and_(
+                    ProgramMembershipORM.program_id == cls.id,
+                    ProgramMembershipORM.partner_id == partner_id,
+                ),
+            )
+            .outerjoin(latest_reg_info, true())
+        )
+
+    @classmethod
+    async def get_all_programs_with_membership(cls, partner_id: int):
+        response = []
+        async with get_async_session() as session:
+            stmt = (
+                cls.select_with_partner_membership(partner_id)
                 .filter(
                     cls.state != "inactive",
                     cls.state != "ended",
@@ -64,68 +159,101 @@ class ProgramORM(BaseORMModelWithId):
                         cls.is_reimbursement_program.is_(None),
                     ),
                 )
-                .options(selectinload(cls.membership))
                 .order_by(desc(cls.create_date))
             )
             result = await session.execute(stmt)
-            response = list(result.scalars())
+            response = result.all()
 
         return response
 
     @classmethod
-    async def get_all_by_program_id(cls, programid: int):
+    async def get_program_with_membership(cls, programid: int, partner_id: int):
         response = None
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
-            stmt = (
-                select(cls)
-                .filter(cls.id == programid)
-                .options(selectinload(cls.membership))
+        async with get_async_session() as session:
+            stmt = cls.select_with_partner_membership(partner_id).filter(
+                cls.id == programid
             )
             result = await session.execute(stmt)
-            response = result.scalar()
+            response = result.first()
 
         return response
 
     @classmethod
-    async def get_all_program_by_keyword(cls, keyword: str):
-        response = []
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
-            # Create a case sensitive match condition
-            case_sensitive_match = cls.name.like(f"%{keyword}%") & cls.name.ilike(
-                f"%{keyword}%"
-            )
-            # Create a case insensitive match condition
-            case_insensitive_match = cls.name.ilike(f"%{keyword}%")
+    def select_by_keyword(cls, keyword: str, search_mode: str = "like"):
+        """
+        Selects the active programs matching the keyword, best matches first.
 
-            # First, select entries that match the keyword with the same case
-            stmt = (
-                select(cls)
-                .filter(case_sensitive_match)
-                .options(selectinload(cls.membership))
+        search_mode is one of
+        - like: case insensitive substring match on name. Case sensitive matches
+          rank first.
+        - trigram: case insensitive substring match on name or description,
+          ranked by trigram similarity of the name. Needs the pg_trgm extension,
+          and can use gin (name gin_trgm_ops) / gin (description gin_trgm_ops)
+          indexes on g2p_program.
+        - fulltext: full text match on name and description, ranked by ts_rank.
+          Can use a gin (to_tsvector('simple', coalesce(name, '') || ' ' ||
+          coalesce(description, ''))) index, with the configured text search
+          config in place of 'simple'.
+        """
+        stmt = (
+            select(cls)
+            .options(
+                load_only(
+                    cls.id,
+                    cls.name,
+                    cls.description,
+                    cls.self_service_portal_form,
+                    cls.is_multiple_form_submission,
+                )
             )
-            result = await session.execute(stmt)
-            response.extend(list(result.scalars().all()))
+            .filter(cls.active.is_(True))
+        )
+        name_match = cls.name.icontains(keyword, autoescape=True)
+        exact_case_rank = case(
+            (cls.name.contains(keyword, autoescape=True), 0), else_=1
+        )
 
-            # Next, select entries that match the keyword regardless of case, excluding already selected ones
-            stmt = (
-                select(cls)
-                .filter(case_insensitive_match)
-                .filter(~case_sensitive_match)
-                .options(selectinload(cls.membership))
+        if search_mode == "fulltext":
+            # Constants are inlined, so that the expression matches the index.
+            # The config name is validated as an identifier when settings load.
+            ts_config = literal_column(
+                f"'{_config.discovery_fulltext_config}'::regconfig"
             )
+            document = func.to_tsvector(
+                ts_config,
+                func.coalesce(cls.name, literal_column("''"))
+                + literal_column("' '")
+                + func.coalesce(cls.description, literal_column("''")),
+            )
+            query = func.plainto_tsquery(ts_config, keyword)
+            return stmt.filter(document.op("@@")(query)).order_by(
+                func.ts_rank(document, query).desc(), cls.id
+            )
+        if search_mode == "trigram":
+            return stmt.filter(
+                or_(name_match, cls.description.icontains(keyword, autoescape=True))
+            ).order_by(
+                exact_case_rank, func.similarity(cls.name, keyword).desc(), cls.id
+            )
+        return stmt.filter(name_match).order_by(exact_case_rank, cls.name, cls.id)
 
+    @classmethod
+    async def get_all_program_by_keyword(
+        cls, keyword: str, page: int = None, pagesize: int = None
+    ):
+        response = []
+        async with get_async_session() as session:
+            stmt = cls.select_by_keyword(keyword, _config.discovery_search_mode)
+            if pagesize:
+                stmt = stmt.limit(pagesize).offset((max(page or 1, 1) - 1) * pagesize)
             result = await session.execute(stmt)
-            # response = list(result.scalars().all()) if result.scalars() else []
-            response.extend(list(result.scalars().all()))
+            response = list(result.scalars())
         return response
 
     @classmethod
     async def get_program_form(cls, programid: int = None):
         response = None
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with get_async_session() as session:
             stmt = (
                 select(cls).filter(cls.id == programid).options(selectinload(cls.form))
             )
@@ -135,93 +263,112 @@ class ProgramORM(BaseORMModelWithId):
         return response
 
     @classmethod
-    async def get_program_summary(cls, partner_id: int) -> List["ProgramORM"]:
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
-            latest_application_subquery = (
-                select(
-                    ProgramRegistrantInfoORM.program_id,
-                    func.max(ProgramRegistrantInfoORM.create_date).label(
-                        "latest_application_date"
-                    ),
-                )
-                .join(
-                    ProgramMembershipORM,
-                    and_(
-                        ProgramMembershipORM.partner_id
-                        == ProgramRegistrantInfoORM.registrant_id,
-                        ProgramMembershipORM.program_id
-                        == ProgramRegistrantInfoORM.program_id,
-                    ),
-                )
-                .where(ProgramMembershipORM.partner_id == partner_id)
-                .group_by(ProgramRegistrantInfoORM.program_id)
-                .subquery()
+    def select_program_summary(cls, partner_id: int):
+        """
+        Selects the summary of every program the partner is a member of.
+        Approved entitlements and paid payments are summed per program in
+        separate CTEs before joining, so that neither the cycles of a program
+        nor the payments of an entitlement multiply the totals.
+        """
+        is_cycle_member = _is_cycle_member()
+        entitlement_totals = (
+            select(
+                CycleORM.program_id,
+                func.sum(EntitlementORM.initial_amount).label("total_entitled"),
             )
-            stmt = (
-                select(
-                    ProgramORM.name.label("program_name"),
-                    ProgramMembershipORM.state.label("enrollment_status"),
-                    (
-                        func.coalesce(func.sum(EntitlementORM.initial_amount), 0)
-                        - func.coalesce(func.sum(PaymentORM.amount_paid), 0)
-                    ).label("total_funds_awaited"),
-                    func.coalesce(func.sum(PaymentORM.amount_paid), 0).label(
-                        "total_funds_received"
-                    ),
-                )
-                .select_from(ProgramMembershipORM)
-                .outerjoin(ProgramORM, ProgramMembershipORM.program_id == ProgramORM.id)
-                .outerjoin(
-                    CycleORM, ProgramMembershipORM.program_id == CycleORM.program_id
-                )
-                .outerjoin(
-                    CycleMembershipORM,
-                    and_(
-                        ProgramMembershipORM.partner_id
-                        == CycleMembershipORM.partner_id,
-                        CycleORM.id == CycleMembershipORM.cycle_id,
-                    ),
-                )
-                .outerjoin(
-                    EntitlementORM,
-                    and_(
-                        CycleMembershipORM.partner_id == EntitlementORM.partner_id,
-                        CycleMembershipORM.cycle_id == EntitlementORM.cycle_id,
-                        EntitlementORM.state == "approved",
-                    ),
-                )
-                .outerjoin(
-                    PaymentORM,
-                    and_(
-                        EntitlementORM.id == PaymentORM.entitlement_id,
-                        PaymentORM.status == "paid",
-                    ),
-                )
-                .outerjoin(
-                    latest_application_subquery,
-                    ProgramORM.id == latest_application_subquery.c.program_id,
-                )
-                .where(ProgramMembershipORM.partner_id == partner_id)
-                .group_by(
-                    ProgramORM.name,
-                    ProgramMembershipORM.state,
-                    latest_application_subquery.c.latest_application_date,
-                )
-                .order_by(desc(latest_application_subquery.c.latest_application_date))
+            .select_from(EntitlementORM)
+            .join(CycleORM, CycleORM.id == EntitlementORM.cycle_id)
+            .where(
+                EntitlementORM.partner_id == partner_id,
+                EntitlementORM.state == "approved",
+                is_cycle_member,
             )
-            result = await session.execute(stmt)
+            .group_by(CycleORM.program_id)
+            .cte("entitlement_totals")
+        )
+        payment_totals = (
+            select(
+                CycleORM.program_id,
+                func.sum(PaymentORM.amount_paid).label("total_paid"),
+            )
+            .select_from(PaymentORM)
+            .join(EntitlementORM, EntitlementORM.id == PaymentORM.entitlement_id)
+            .join(CycleORM, CycleORM.id == EntitlementORM.cycle_id)
+            .where(
+                EntitlementORM.partner_id == partner_id,
+                EntitlementORM.state == "approved",
+                PaymentORM.status == "paid",
+                is_cycle_member,
+            )
+            .group_by(CycleORM.program_id)
+            .cte("payment_totals")
+        )
+        latest_applications = (
+            select(
+                ProgramRegistrantInfoORM.program_id,
+                func.max(ProgramRegistrantInfoORM.create_date).label(
+                    "latest_application_date"
+                ),
+            )
+            .where(ProgramRegistrantInfoORM.registrant_id == partner_id)
+            .group_by(ProgramRegistrantInfoORM.program_id)
+            .cte("latest_applications")
+        )
+
+        total_paid = func.coalesce(payment_totals.c.total_paid, 0)
+        return (
+            select(
+                cls.name.label("program_name"),
+                ProgramMembershipORM.state.label("enrollment_status"),
+                (
+                    func.coalesce(entitlement_totals.c.total_entitled, 0) - total_paid
+                ).label("total_funds_awaited"),
+                total_paid.label("total_funds_received"),
+            )
+            .select_from(ProgramMembershipORM)
+            .outerjoin(cls, ProgramMembershipORM.program_id == cls.id)
+            .outerjoin(
+                entitlement_totals,
+                entitlement_totals.c.program_id == ProgramMembershipORM.program_id,
+            )
+            .outerjoin(
+                payment_totals,
+                payment_totals.c.program_id == ProgramMembershipORM.program_id,
+            )
+            .outerjoin(
+                latest_applications,
+                latest_applications.c.program_id == ProgramMembershipORM.program_id,
+            )
+            .where(ProgramMembershipORM.partner_id == partner_id)
+            .order_by(desc(latest_applications.c.latest_application_date))
+        )
+
+    @classmethod
+    async def get_program_summary(cls, partner_id: int) -> List["ProgramORM"]:
+        async with get_async_session() as session:
+            result = await session.execute(cls.select_program_summary(partner_id))
         return result.all()
 
-    async def get_application_details(partner_id: int) -> List["ProgramORM"]:
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+    @classmethod
+    async def get_application_details(
+        cls,
+        partner_id: int,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Optional[datetime], int]] = None,
+    ) -> List["ProgramORM"]:
+        """
+        Returns the applications of the partner, latest first.
+        Rows are ordered by (create_date, id), so that after can be the key of
+        the last row of the previous page.
+        """
+        async with get_async_session() as session:
             stmt = (
                 select(
                     ProgramORM.name.label("program_name"),
                     ProgramRegistrantInfoORM.application_id.label("application_id"),
                     ProgramRegistrantInfoORM.create_date.label("date_applied"),
                     ProgramRegistrantInfoORM.state.label("application_status"),
+                    ProgramRegistrantInfoORM.id.label("registrant_info_id"),
                 )
                 .select_from(ProgramRegistrantInfoORM)
                 .outerjoin(
@@ -235,67 +382,96 @@ class ProgramORM(BaseORMModelWithId):
                 )
                 .outerjoin(ProgramORM, ProgramMembershipORM.program_id == ProgramORM.id)
                 .where(ProgramMembershipORM.partner_id == partner_id)
-                .order_by(ProgramRegistrantInfoORM.create_date.desc())
+                .order_by(
+                    ProgramRegistrantInfoORM.create_date.desc().nulls_last(),
+                    ProgramRegistrantInfoORM.id.desc(),
+                )
             )
-            # print("####################################")
-            # print(stmt)
+            if after:
+                stmt = stmt.where(
+                    keyset_after(
+                        ProgramRegistrantInfoORM.create_date,
+                        ProgramRegistrantInfoORM.id,
+                        after,
+                    )
+                )
+            if limit:
+                stmt = stmt.limit(limit)
             result = await session.execute(stmt)
         return result.all()
 
-    async def get_benefit_details(cls, partner_id: int) -> List["ProgramORM"]:
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+    @classmethod
+    async def get_benefit_details(
+        cls,
+        partner_id: int,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Optional[datetime], int]] = None,
+    ) -> List["ProgramORM"]:
+        """
+        Returns one row per approved entitlement of the partner, latest first,
+        with the paid payments of the entitlement summed up.
+        Rows are ordered by (date_approved, entitlement id), so that after can be
+        the key of the last row of the previous page.
+        """
+        async with get_async_session() as session:
+            paid_amounts = (
+                select(
+                    PaymentORM.entitlement_id,
+                    func.sum(PaymentORM.amount_paid).label("amount_paid"),
+                )
+                .join(EntitlementORM, EntitlementORM.id == PaymentORM.entitlement_id)
+                .where(
+                    EntitlementORM.partner_id == partner_id,
+                    PaymentORM.status == "paid",
+                )
+                .group_by(PaymentORM.entitlement_id)
+                .subquery()
+            )
+            amount_paid = func.coalesce(paid_amounts.c.amount_paid, 0)
             stmt = (
                 select(
                     ProgramORM.name.label("program_name"),
                     EntitlementORM.date_approved.label("date_approved"),
                     (
-                        func.coalesce(EntitlementORM.initial_amount, 0)
-                        - func.coalesce(PaymentORM.amount_paid, 0)
+                        func.coalesce(EntitlementORM.initial_amount, 0) - amount_paid
                     ).label("funds_awaited"),
-                    func.coalesce(PaymentORM.amount_paid, 0).label("funds_received"),
+                    amount_paid.label("funds_received"),
                     EntitlementORM.ern.label("entitlement_reference_number"),
-                    # CycleORM.name.label("cycle_name")
-                )
-                .select_from(ProgramMembershipORM)
-                .outerjoin(ProgramORM, ProgramMembershipORM.program_id == ProgramORM.id)
-                .outerjoin(
-                    CycleORM, ProgramMembershipORM.program_id == CycleORM.program_id
+                    EntitlementORM.id.label("entitlement_id"),
                 )
-                .outerjoin(
-                    CycleMembershipORM,
+                .select_from(EntitlementORM)
+                .join(CycleORM, CycleORM.id == EntitlementORM.cycle_id)
+                .join(
+                    ProgramMembershipORM,
                     and_(
-                        ProgramMembershipORM.partner_id
-                        == CycleMembershipORM.partner_id,
-                        CycleORM.id == CycleMembershipORM.cycle_id,
+                        ProgramMembershipORM.program_id == CycleORM.program_id,
+                        ProgramMembershipORM.partner_id == EntitlementORM.partner_id,
                     ),
                 )
+                .outerjoin(ProgramORM, ProgramMembershipORM.program_id == ProgramORM.id)
                 .outerjoin(
-                    EntitlementORM,
-                    and_(
-                        CycleMembershipORM.partner_id == EntitlementORM.partner_id,
-                        CycleMembershipORM.cycle_id == EntitlementORM.cycle_id,
-                        EntitlementORM.state == "approved",
-                    ),
+                    paid_amounts, paid_amounts.c.entitlement_id == EntitlementORM.id
                 )
-                .outerjoin(
-                    PaymentORM,
-                    and_(
-                        EntitlementORM.id == PaymentORM.entitlement_id,
-                        PaymentORM.status == "paid",
+                .where(
+                    EntitlementORM.partner_id == partner_id,
+                    EntitlementORM.state == "approved",
+                    _is_cycle_member(),
+                    or_(
+                        EntitlementORM.ern.isnot(None),
+                        EntitlementORM.initial_amount != 0,
+                        paid_amounts.c.amount_paid != 0,
                     ),
                 )
-                .where(
-                    and_(
-                        ProgramMembershipORM.partner_id == partner_id,
-                        or_(
-                            EntitlementORM.ern.isnot(None),
-                            EntitlementORM.initial_amount != 0,
-                            PaymentORM.amount_paid != 0,
-                        ),
-                    )
+                .order_by(
+                    EntitlementORM.date_approved.desc().nulls_last(),
+                    EntitlementORM.id.desc(),
                 )
-                .order_by(EntitlementORM.date_approved.desc())
             )
+            if after:
+                stmt = stmt.where(
+                    keyset_after(EntitlementORM.date_approved, EntitlementORM.id, after)
+                )
+            if limit:
+                stmt = stmt.limit(limit)
             result = await session.execute(stmt)
         return result.all()
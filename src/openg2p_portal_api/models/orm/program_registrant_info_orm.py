@@ -1,12 +1,12 @@
 from datetime import datetime
 from typing import Any, Dict
 
-from openg2p_fastapi_common.context import dbengine
 from openg2p_fastapi_common.models import BaseORMModel
 from sqlalchemy import JSON, DateTime, ForeignKey, Integer, String, and_, select
-from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from ...utils.db_utils import get_async_session
+
 
 class ProgramRegistrantInfoORM(BaseORMModel):
     __tablename__ = "g2p_program_registrant_info"
@@ -25,17 +25,18 @@ class ProgramRegistrantInfoORM(BaseORMModel):
     membership = relationship("ProgramMembershipORM", back_populates="program_reg_info")
 
     @classmethod
-    async def get_latest_reg_info(cls, program_membership_id: int):
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
-            stmt = (
-                select(cls)
-                .filter(cls.program_membership_id == program_membership_id)
-                .order_by(cls.create_date.desc())
-                .limit(1)
-            )
-            result = await session.execute(stmt)
-            return result.scalar()
+    def select_latest_state(cls, program_membership_id):
+        """
+        LATERAL subquery of the state of the latest application of the
+        membership given by the program_membership_id column.
+        """
+        return (
+            select(cls.state)
+            .where(cls.program_membership_id == program_membership_id)
+            .order_by(cls.create_date.desc())
+            .limit(1)
+            .lateral()
+        )
 
 
 class ProgramRegistrantInfoDraftORM(BaseORMModel):
@@ -48,8 +49,7 @@ class ProgramRegistrantInfoDraftORM(BaseORMModel):
 
     @classmethod
     async def get_draft_reg_info_by_id(cls, program_id: int, registrant_id: int):
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with get_async_session() as session:
             stmt = select(cls).where(
                 and_(cls.program_id == program_id, cls.registrant_id == registrant_id)
             )
@@ -1,12 +1,13 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Optional
 
-from openg2p_fastapi_common.context import dbengine
 from openg2p_fastapi_common.models import BaseORMModel
 from sqlalchemy import DateTime, ForeignKey, select
-from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from ...context import partner_id_cache
+from ...utils.db_utils import get_async_session
+
 
 class RegIDORM(BaseORMModel):
     __tablename__ = "g2p_reg_id"
@@ -20,25 +21,55 @@ class RegIDORM(BaseORMModel):
     partner = relationship("PartnerORM", back_populates="reg_ids")
 
     @classmethod
-    async def get_partner_by_reg_id(cls, id_type: int, value: str) -> List["RegIDORM"]:
-        response = None
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
-            stmt = select(cls).filter(cls.id_type == id_type).filter(cls.value == value)
-            result = await session.execute(stmt)
+    async def get_partner_id_by_reg_id(cls, id_type: int, value: str) -> int:
+        """
+        Returns the id of the partner holding the given reg id.
+        Resolved partner ids are cached, misses are not.
+        """
 
-            response = list(result.scalars())
-        return response
+        return await partner_id_cache.get_or_load(
+            (id_type, value), lambda: cls.get_partner_id(id_type, value)
+        )
+
+    @classmethod
+    async def get_partner_id(cls, id_type: int, value: str) -> Optional[int]:
+        """
+        Single indexed lookup of the partner id of a reg id, without loading the row.
+        """
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(cls.partner_id)
+                .filter(cls.id_type == id_type)
+                .filter(cls.value == value)
+                .limit(1)
+            )
+            return result.scalar()
+
+    @classmethod
+    def cache_partner_id(cls, id_type: int, value: str, partner_id: int):
+        partner_id_cache.set((id_type, value), partner_id)
 
     @classmethod
-    async def get_all_partner_ids(cls, id: int) -> List["RegIDORM"]:
+    async def get_all_partner_ids_with_type(cls, id: int):
+        """
+        Returns the reg ids of the partner along with the name of their id type.
+        """
         response = []
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
-            stmt = select(cls).filter(cls.partner_id == id)
+        async with get_async_session() as session:
+            stmt = (
+                select(
+                    RegIDTypeORM.name.label("id_type"),
+                    cls.value,
+                    cls.expiry_date,
+                )
+                .select_from(cls)
+                .outerjoin(RegIDTypeORM, cls.id_type == RegIDTypeORM.id)
+                .filter(cls.partner_id == id)
+                .order_by(cls.id.asc())
+            )
             result = await session.execute(stmt)
 
-            response = list(result.scalars())
+            response = result.all()
         return response
 
 
@@ -47,13 +78,3 @@ class RegIDTypeORM(BaseORMModel):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column()
-
-    @classmethod
-    async def get_id_type_name(cls, id_type: int):
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
-            stmt = select(cls).filter(cls.id == id_type)
-            result = await session.execute(stmt)
-
-            response = result.scalar()
-        return response
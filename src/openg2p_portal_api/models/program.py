@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
 
 from pydantic import BaseModel, ConfigDict, Field, validator
 
@@ -20,6 +20,35 @@ class ProgramBase(BaseModel):
     description: Optional[str] = None
 
 
+class ProgramCatalogEntry(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    id: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+    state: Optional[str] = None
+    self_service_portal_form: Optional[int] = None
+    is_multiple_form_submission: Optional[bool] = False
+    is_reimbursement_program: Optional[bool] = None
+    create_date: Optional[datetime] = None
+
+
+class ProgramCatalog(BaseModel):
+    """
+    Immutable snapshot of the active programs. Replaced as a whole on refresh.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    programs: Tuple[ProgramCatalogEntry, ...] = ()
+    # Lowercased program names, in the same order as programs.
+    lower_names: Tuple[str, ...] = ()
+    # Programs shown in the program list, latest first.
+    listed: Tuple[ProgramCatalogEntry, ...] = ()
+    version: Tuple[Optional[datetime], int] = (None, 0)
+    loaded_at: float = 0
+
+
 class Program(ProgramBase):
     model_config = ConfigDict(from_attributes=True)
 
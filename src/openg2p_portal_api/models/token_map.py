@@ -0,0 +1,129 @@
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple, Union
+
+import orjson
+from pydantic import BaseModel, ConfigDict
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+def _to_json(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return orjson.dumps(value).decode()
+
+
+TOKEN_MAP_TYPES: Dict[str, Callable[[Any], Any]] = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": _to_bool,
+    "json": _to_json,
+}
+
+_MISSING = object()
+
+
+class TokenMapPair(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    claim: str
+    # The claim split on dots, to look up nested claims like address.city
+    path: Tuple[str, ...]
+    key: str
+    type: Optional[str] = None
+
+    def get_value(self, claims: dict) -> Any:
+        value = claims.get(self.claim, _MISSING)
+        if value is _MISSING and len(self.path) > 1:
+            value = claims
+            for part in self.path:
+                if not isinstance(value, dict):
+                    return ""
+                value = value.get(part, _MISSING)
+                if value is _MISSING:
+                    return ""
+        if value is _MISSING:
+            return ""
+        if self.type and value not in ("", None):
+            try:
+                value = TOKEN_MAP_TYPES[self.type](value)
+            except (TypeError, ValueError):
+                pass
+        return value
+
+
+class TokenMap(BaseModel):
+    """
+    Compiled token_map of an auth provider, a space separated list of
+    claim:key pairs mapping the claims of the validation response to partner
+    keys. "*:*" keeps all the claims.
+
+    A claim can be a dotted path to a nested claim (address.locality), and a
+    pair can end with the type the value is converted to, one of
+    TOKEN_MAP_TYPES (birth_year:age:int).
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    mapping: str = ""
+    pairs: Tuple[TokenMapPair, ...] = ()
+    passthrough: bool = False
+    # The claim names of all the pairs
+    claims: FrozenSet[str] = frozenset()
+    # (claim, key, pair) of each pair, pair only set for nested or typed claims
+    lookups: Tuple[Tuple[str, str, Optional[TokenMapPair]], ...] = ()
+
+    @classmethod
+    def compile(cls, mapping: Union[str, "TokenMap", None]) -> "TokenMap":
+        """
+        Returns the compiled token map. Compiled maps are cached per mapping.
+        """
+        if isinstance(mapping, TokenMap):
+            return mapping
+        return _compile_token_map(mapping.strip() if mapping else "")
+
+    def apply(self, claims: dict) -> dict:
+        res = dict(claims) if self.passthrough else {}
+        for claim, key, pair in self.lookups:
+            res[key] = pair.get_value(claims) if pair else claims.get(claim, "")
+        return res
+
+
+@lru_cache(maxsize=128)
+def _compile_token_map(mapping: str) -> TokenMap:
+    pairs = []
+    passthrough = False
+    claims = set()
+    for token in mapping.split():
+        claim, _, rest = (part.strip() for part in token.partition(":"))
+        claims.add(claim)
+        if claim == "*" and rest == "*":
+            passthrough = True
+            continue
+        key, _, type = rest.rpartition(":")
+        if not (key and type in TOKEN_MAP_TYPES):
+            key, type = rest, None
+        if not key:
+            continue
+        pairs.append(
+            TokenMapPair(claim=claim, path=tuple(claim.split(".")), key=key, type=type)
+        )
+    return TokenMap(
+        mapping=mapping,
+        pairs=tuple(pairs),
+        passthrough=passthrough,
+        claims=frozenset(claims),
+        lookups=tuple(
+            (
+                pair.claim,
+                pair.key,
+                pair if pair.type or len(pair.path) > 1 else None,
+            )
+            for pair in pairs
+        ),
+    )
@@ -1,38 +1,60 @@
-import hashlib
-import mimetypes
-import os
-
-import boto3
-from botocore.exceptions import ClientError
-from openg2p_fastapi_common.context import dbengine
-from openg2p_fastapi_common.errors.http_exceptions import BadRequestError
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from fastapi import Response
+from openg2p_fastapi_common.errors.http_exceptions import (
+    BadRequestError,
+    NotFoundError,
+)
 from openg2p_fastapi_common.service import BaseService
-from slugify import slugify as python_slugify
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.ext.asyncio import async_sessionmaker
 
+from openg2p_portal_api.config import Settings
 from openg2p_portal_api.exception import handle_exception
-from openg2p_portal_api.models.document_file import DocumentFile
+from openg2p_portal_api.models.document_file import (
+    DocumentFile,
+    DocumentUploadResult,
+    DocumentUploadSession,
+)
+from openg2p_portal_api.services.document_job_service import DocumentJobService
 from openg2p_portal_api.services.membership_service import MembershipService
+from openg2p_portal_api.utils.db_utils import (
+    release_request_session,
+    scoped_async_session,
+)
 from openg2p_portal_api.utils.file_utils import (
     compute_human_file_size,
-    create_or_update_tag,
+    create_tag_if_missing,
     extract_filename,
     get_company_and_backend_id_by_programid,
-    get_file_id_by_slug,
     get_s3_backend_config,
-    update_slug_relative_path,
+    set_slug_relative_path,
+)
+from openg2p_portal_api.utils.storage_utils import (
+    S3StorageEngine,
+    StorageEngine,
+    get_storage_engine,
 )
 
 from ..models.orm.document_file_orm import DocumentFileORM
+from ..models.orm.document_upload_session_orm import DocumentUploadSessionORM
+
+_config = Settings.get_config(strict=False)
+_logger = logging.getLogger(_config.logging_default_logger_name)
 
 
 class DocumentFileService(BaseService):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.async_session_maker = async_sessionmaker(dbengine.get())
+        # Each method is a unit of work, the helpers it calls share its session.
+        self.async_session_maker = scoped_async_session
         self.membership_service = MembershipService.get_component()
+        self.document_job_service = DocumentJobService.get_component()
+        self._cleanup_task: Optional[asyncio.Task] = None
 
     async def get_document_by_id(self, document_id: int):
         """
@@ -52,118 +74,575 @@ class DocumentFileService(BaseService):
             except SQLAlchemyError as e:
                 handle_exception(e, "Failed to retrieve document by ID")
 
+    async def download_document(
+        self, document_id: int, partner_id: int, range_header: Optional[str] = None
+    ) -> Response:
+        """
+        Serves a document of the partner from its storage backend. S3 objects are
+        streamed, or redirected to a presigned URL, depending on the download mode.
+        A single byte range in range_header is served as a partial response.
+        """
+        document = await DocumentFileORM.get_partner_document(document_id, partner_id)
+        if not document or not document.relative_path:
+            raise NotFoundError(message="Document not found") from None
+
+        backend = await get_s3_backend_config(self, document.backend_id)
+        engine = get_storage_engine(backend)
+        if not engine:
+            raise BadRequestError(
+                message="Backend type should be either amazon_s3 or filesystem."
+            ) from None
+        await release_request_session()
+        return await engine.download(
+            document.relative_path,
+            document.name,
+            mimetype=document.mimetype,
+            range_header=range_header,
+        )
+
     async def upload_document(
         self, file, programid: int, file_tag: str, partner_id: int
     ):
         """
         Uploads a document to MinIO or the local filesystem and saves its metadata in the database.
         """
+        # Committed on its own, so that it is not locked during the storage I/O
+        program_membership_id = await self.membership_service.check_and_create_mem(
+            programid=programid, partnerid=partner_id
+        )
+        # Retrieve company and backend IDs
+        (
+            company_id,
+            backend_id,
+        ) = await get_company_and_backend_id_by_programid(self, programid)
+
+        # Retrieve backend configuration using the backend_id
+        backend = await get_s3_backend_config(self, backend_id)
+        # The storage engine of the backend type, amazon_s3 or filesystem
+        engine = get_storage_engine(backend)
+        if not engine:
+            return {"message": "Backend type should be either amazon_s3 or filesystem."}
+
+        first_chunk = await self._read_first_chunk(file)
+        (new_file,) = await self._insert_pending_files(
+            [file.filename], backend_id, company_id, program_membership_id
+        )
+        # Read before the activation, a rollback expires the file
+        file_ids, stored_paths = [new_file.id], []
+        try:
+            await self._store_file(file, new_file, engine, first_chunk)
+            stored_paths.append(new_file.relative_path)
+            await self._activate_files([new_file], file_tag)
+        except Exception:
+            await self._discard_files(engine, file_ids, stored_paths)
+            raise
+        self._notify_document_jobs()
+        return {"message": "File uploaded successfully."}
+
+    async def upload_documents(
+        self, files: List, programid: int, file_tag: str, partner_id: int
+    ) -> List[DocumentUploadResult]:
+        """
+        Uploads several documents of one program at once. The program, backend,
+        tag and membership are resolved once, the file rows are inserted together
+        and the files are streamed to the storage concurrently.
+
+        Returns the result of each file; files that failed are not saved.
+        """
+        if len(files) > _config.document_batch_max_files:
+            raise BadRequestError(
+                message=f"At most {_config.document_batch_max_files} files can be uploaded at once."
+            ) from None
+
+        # Committed on its own, so that it is not locked during the storage I/O
+        program_membership_id = await self.membership_service.check_and_create_mem(
+            programid=programid, partnerid=partner_id
+        )
+        (
+            company_id,
+            backend_id,
+        ) = await get_company_and_backend_id_by_programid(self, programid)
+        backend = await get_s3_backend_config(self, backend_id)
+        engine = get_storage_engine(backend)
+        if not engine:
+            raise BadRequestError(
+                message="Backend type should be either amazon_s3 or filesystem."
+            ) from None
+
+        # Empty files fail before any row is inserted.
+        first_chunks = [await self._read_first_chunk(file) for file in files]
+        new_files = await self._insert_pending_files(
+            [file.filename for file in files],
+            backend_id,
+            company_id,
+            program_membership_id,
+        )
+
+        semaphore = asyncio.Semaphore(_config.document_batch_upload_concurrency)
+
+        async def store(file, new_file, first_chunk):
+            async with semaphore:
+                try:
+                    await self._store_file(file, new_file, engine, first_chunk)
+                except Exception as e:
+                    _logger.warning("Failed to upload %s: %s", new_file.name, e)
+                    return e
+            return None
+
+        errors = await asyncio.gather(
+            *[
+                store(file, new_file, first_chunk)
+                for file, new_file, first_chunk in zip(files, new_files, first_chunks)
+            ]
+        )
+        uploaded_files = [
+            new_file for new_file, error in zip(new_files, errors) if error is None
+        ]
+        stored_paths = [new_file.relative_path for new_file in uploaded_files]
+        failed_ids = [
+            new_file.id for new_file in new_files if new_file not in uploaded_files
+        ]
+        if failed_ids:
+            await self._discard_files(engine, failed_ids, [])
+        if uploaded_files:
+            # Read before the activation, a rollback expires the files
+            uploaded_ids = [new_file.id for new_file in uploaded_files]
+            try:
+                await self._activate_files(uploaded_files, file_tag)
+            except Exception:
+                await self._discard_files(engine, uploaded_ids, stored_paths)
+                raise
+            self._notify_document_jobs()
+
+        results = []
+        for new_file, error in zip(new_files, errors):
+            if error is not None:
+                results.append(
+                    DocumentUploadResult(
+                        name=new_file.name,
+                        uploaded=False,
+                        message=getattr(error, "message", None)
+                        or "File upload failed!",
+                    )
+                )
+            else:
+                results.append(
+                    DocumentUploadResult(
+                        name=new_file.name,
+                        id=new_file.id,
+                        uploaded=True,
+                        message="File uploaded successfully.",
+                    )
+                )
+        return results
+
+    async def create_upload_session(
+        self,
+        programid: int,
+        partner_id: int,
+        name: str,
+        file_size: int,
+        file_tag: Optional[str] = None,
+    ) -> DocumentUploadSession:
+        """
+        Starts a resumable upload of a document sent in chunks. The file row is
+        created inactive, and activated once all the chunks are received.
+        """
+        max_file_size = _config.document_upload_session_max_file_size
+        if not 0 < file_size <= max_file_size:
+            raise BadRequestError(
+                message=f"The file size should be between 1 and {max_file_size} bytes."
+            ) from None
+
+        # Committed on its own, so that it is not locked during the storage I/O
+        program_membership_id = await self.membership_service.check_and_create_mem(
+            programid=programid, partnerid=partner_id
+        )
         async with self.async_session_maker() as session:
-            # Retrieve company and backend IDs
             (
                 company_id,
                 backend_id,
             ) = await get_company_and_backend_id_by_programid(self, programid)
-
-            # Retrieve backend configuration using the backend_id
             backend = await get_s3_backend_config(self, backend_id)
-            # Determine backend type
-            backend_type = backend.server_env_defaults.get("x_backend_type_env_default")
-
-            if backend_type == "filesystem":
-                return {
-                    "message": "Uploading files via the filesystem is currently not supported."
-                }
-
-            if backend_type == "amazon_s3":
-                name = file.filename
-                data = await file.read()
-                if data is None:
-                    raise BadRequestError(
-                        message="Failed to upload document: Content must not be None."
-                    ) from None
-                # Create or update document tag
+            engine = get_storage_engine(backend)
+            if not engine:
+                raise BadRequestError(
+                    message="Backend type should be either amazon_s3 or filesystem."
+                ) from None
+            chunk_size = max(
+                _config.document_upload_session_chunk_size,
+                engine.min_part_size,
+                -(-file_size // engine.max_parts),
+            )
+
+            try:
                 if file_tag:
-                    await create_or_update_tag(self, file_tag)
+                    await create_tag_if_missing(session, file_tag)
 
-                # Get membership_id using programid and partner_id
-                program_membership_id = (
-                    await self.membership_service.check_and_create_mem(
-                        programid=programid, partnerid=partner_id
-                    )
+                new_file = self._new_document_file(
+                    name, backend_id, company_id, program_membership_id
                 )
+                session.add(new_file)
+                await session.flush()
+                set_slug_relative_path(new_file)
+                new_file.relative_path = engine.get_relative_path(new_file.slug)
 
-                # Compute file metadata
-                checksum = hashlib.sha1(data).hexdigest()
-                new_file = DocumentFileORM(
-                    name=name,
+                upload_session = DocumentUploadSessionORM(
+                    id=uuid.uuid4().hex,
+                    partner_id=partner_id,
+                    document_file_id=new_file.id,
                     backend_id=backend_id,
-                    file_size=len(data),
-                    checksum=checksum,
-                    filename=name,
-                    extension=os.path.splitext(name),
-                    mimetype=mimetypes.guess_type(name)[0] or "",
-                    company_id=company_id,
-                    active=True,
-                    program_membership_id=program_membership_id,
+                    relative_path=new_file.relative_path,
+                    upload_id=await engine.create_multipart(new_file.relative_path),
+                    file_size=file_size,
+                    chunk_size=chunk_size,
+                    parts={},
+                    state="open",
+                    expires_at=datetime.utcnow()
+                    + timedelta(seconds=_config.document_upload_session_ttl),
                 )
-                extract_filename(new_file)
-                compute_human_file_size(new_file)
-                session.add(new_file)
+                session.add(upload_session)
                 await session.commit()
-                await session.refresh(new_file)
+            except Exception:
+                await session.rollback()
+                raise
+            return self._get_upload_session_status(upload_session)
+
+    async def get_upload_session(
+        self, session_id: str, partner_id: int
+    ) -> DocumentUploadSession:
+        upload_session = await DocumentUploadSessionORM.get_partner_session(
+            session_id, partner_id
+        )
+        if not upload_session:
+            raise NotFoundError(message="Upload session not found") from None
+        return self._get_upload_session_status(upload_session)
+
+    async def upload_chunk(
+        self, session_id: str, partner_id: int, chunk_number: int, data: bytes
+    ) -> DocumentUploadSession:
+        """
+        Stores one chunk of a resumable upload. Chunks can be sent in any order,
+        and sent again if their upload failed.
+        """
+        upload_session = await self._get_open_upload_session(session_id, partner_id)
+        if not 1 <= chunk_number <= upload_session.chunk_count:
+            raise BadRequestError(
+                message=f"The chunk number should be between 1 and {upload_session.chunk_count}."
+            ) from None
+        chunk_length = upload_session.get_chunk_length(chunk_number)
+        if len(data) != chunk_length:
+            raise BadRequestError(
+                message=f"The chunk {chunk_number} should be {chunk_length} bytes long."
+            ) from None
+
+        engine = await self._get_upload_session_engine(upload_session)
+        await release_request_session()
+        etag = await engine.write_part(
+            upload_session.relative_path,
+            upload_session.upload_id,
+            chunk_number,
+            data,
+        )
+
+        async with self.async_session_maker() as session:
+            upload_session = await self._get_open_upload_session(
+                session_id, partner_id, for_update=True
+            )
+            upload_session.parts = {
+                **(upload_session.parts or {}),
+                str(chunk_number): {"etag": etag, "size": len(data)},
+            }
+            await session.commit()
+        return self._get_upload_session_status(upload_session)
 
-                # Generate slugified filename
-                slugified_filename = python_slugify(name)
-                file_id = await get_file_id_by_slug(self)
-                final_filename = f"{slugified_filename}-{file_id}"
+    async def complete_upload_session(
+        self, session_id: str, partner_id: int
+    ) -> DocumentUploadSession:
+        """
+        Assembles the chunks of a resumable upload and activates its file.
+        """
+        async with self.async_session_maker() as session:
+            upload_session = await self._get_open_upload_session(
+                session_id, partner_id, for_update=True
+            )
+            missing_chunks = upload_session.missing_chunks
+            if missing_chunks:
+                raise BadRequestError(
+                    message=f"The chunks {missing_chunks} are missing."
+                ) from None
 
-                # Update the database with the new slugified filename relative path
-                await update_slug_relative_path(self, file_id, final_filename)
+            try:
+                engine = await self._get_upload_session_engine(upload_session)
+                checksum = await engine.complete_multipart(
+                    upload_session.relative_path,
+                    upload_session.upload_id,
+                    {
+                        int(chunk_number): part["etag"]
+                        for chunk_number, part in upload_session.parts.items()
+                    },
+                )
+                document_file = await session.get(
+                    DocumentFileORM, upload_session.document_file_id
+                )
+                document_file.active = True
+                document_file.file_size = upload_session.file_size
+                document_file.checksum = checksum
+                compute_human_file_size(document_file)
+                upload_session.state = "completed"
+                DocumentJobService.enqueue(session, document_file.id)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+        self._notify_document_jobs()
+        return self._get_upload_session_status(upload_session)
 
-                # Upload the file to the backend storage
-                return await self.s3_storage_system(file, final_filename, backend)
+    async def abort_upload_session(
+        self, session_id: str, partner_id: int
+    ) -> DocumentUploadSession:
+        async with self.async_session_maker() as session:
+            upload_session = await self._get_open_upload_session(
+                session_id, partner_id, for_update=True
+            )
+            await self._close_upload_session(session, upload_session, "aborted")
+            await session.commit()
+        return self._get_upload_session_status(upload_session)
 
-        return {"message": "Backend type should be either amazon_s3 or filesystem."}
+    async def abort_expired_upload_sessions(self, limit: int = 100) -> int:
+        """
+        Drops the chunks and the file of the upload sessions that expired.
+        Returns the number of sessions closed.
+        """
+        async with self.async_session_maker() as session:
+            upload_sessions = await DocumentUploadSessionORM.get_expired_sessions(
+                datetime.utcnow(), limit
+            )
+            for upload_session in upload_sessions:
+                await self._close_upload_session(session, upload_session, "expired")
+            await session.commit()
+        return len(upload_sessions)
 
-    async def s3_storage_system(self, file: object, file_name: str, backend: object):
+    async def start(self):
         """
-        Upload a file to an S3-compatible storage system (e.g., MinIO) using the provided backend configuration.
+        Starts aborting the expired upload sessions periodically.
         """
-        file_obj = file.file
-        if file_obj is None:
+        if not self._cleanup_task:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def stop(self):
+        if self._cleanup_task:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(_config.document_upload_session_cleanup_interval)
+            try:
+                await self.abort_expired_upload_sessions()
+            except Exception:
+                _logger.exception("Failed to abort expired upload sessions")
+
+    async def _get_open_upload_session(
+        self, session_id: str, partner_id: int, for_update: bool = False
+    ) -> DocumentUploadSessionORM:
+        upload_session = await DocumentUploadSessionORM.get_partner_session(
+            session_id, partner_id, for_update=for_update
+        )
+        if not upload_session:
+            raise NotFoundError(message="Upload session not found") from None
+        if upload_session.state != "open":
             raise BadRequestError(
-                message="The file object is empty or not readable."
+                message=f"The upload session is {upload_session.state}."
             ) from None
+        if upload_session.expires_at < datetime.utcnow():
+            raise BadRequestError(message="The upload session has expired.") from None
+        return upload_session
 
-        if not hasattr(file_obj, "seek"):
-            raise BadRequestError(message="he file object is not seekable.") from None
-        file_obj.seek(0)
+    async def _get_upload_session_engine(
+        self, upload_session: DocumentUploadSessionORM
+    ) -> StorageEngine:
+        backend = await get_s3_backend_config(self, upload_session.backend_id)
+        engine = get_storage_engine(backend)
+        if not engine:
+            raise BadRequestError(
+                message="Backend type should be either amazon_s3 or filesystem."
+            ) from None
+        return engine
 
-        # Retrieve S3 configuration
-        endpoint_url = backend.server_env_defaults.get("x_aws_host_env_default")
-        aws_access_key = backend.server_env_defaults.get(
-            "x_aws_access_key_id_env_default"
+    async def _close_upload_session(
+        self, session, upload_session: DocumentUploadSessionORM, state: str
+    ):
+        try:
+            engine = await self._get_upload_session_engine(upload_session)
+            await engine.abort_multipart(
+                upload_session.relative_path, upload_session.upload_id
+            )
+        except Exception:
+            _logger.warning(
+                "Failed to drop the chunks of upload session %s", upload_session.id
+            )
+        document_file_id = upload_session.document_file_id
+        upload_session.document_file_id = None
+        upload_session.state = state
+        await session.flush()
+        if document_file_id:
+            document_file = await session.get(DocumentFileORM, document_file_id)
+            if document_file:
+                await session.delete(document_file)
+
+    def _notify_document_jobs(self):
+        if self.document_job_service:
+            self.document_job_service.notify()
+
+    @staticmethod
+    def _get_upload_session_status(
+        upload_session: DocumentUploadSessionORM,
+    ) -> DocumentUploadSession:
+        return DocumentUploadSession(
+            id=upload_session.id,
+            document_id=upload_session.document_file_id,
+            file_size=upload_session.file_size,
+            chunk_size=upload_session.chunk_size,
+            chunk_count=upload_session.chunk_count,
+            missing_chunks=upload_session.missing_chunks,
+            state=upload_session.state,
+            expires_at=upload_session.expires_at,
         )
-        aws_secret_key = backend.server_env_defaults.get(
-            "x_aws_secret_access_key_env_default"
+
+    async def _read_first_chunk(self, file) -> bytes:
+        """
+        Reads the first chunk of the file, the rest is streamed to the storage.
+        """
+        first_chunk = await file.read(_config.document_upload_chunk_size)
+        if first_chunk is None:
+            raise BadRequestError(
+                message="Failed to upload document: Content must not be None."
+            ) from None
+        return first_chunk
+
+    @staticmethod
+    def _new_document_file(
+        name: str, backend_id: int, company_id: int, program_membership_id: int
+    ) -> DocumentFileORM:
+        # Hidden until the file is stored, size and checksum are set then
+        new_file = DocumentFileORM(
+            name=name,
+            backend_id=backend_id,
+            company_id=company_id,
+            active=False,
+            program_membership_id=program_membership_id,
         )
-        region_name = backend.server_env_defaults.get("x_aws_region_env_default")
-        bucket_name = backend.server_env_defaults.get("x_aws_bucket_env_default")
+        extract_filename(new_file)
+        return new_file
+
+    async def _insert_pending_files(
+        self,
+        names: List[str],
+        backend_id: int,
+        company_id: int,
+        program_membership_id: int,
+    ) -> List[DocumentFileORM]:
+        """
+        Inserts and commits the inactive rows of new files, whose slugs need
+        their IDs. No transaction is left open during the storage I/O.
+        """
+        async with self.async_session_maker() as session:
+            new_files = [
+                self._new_document_file(
+                    name, backend_id, company_id, program_membership_id
+                )
+                for name in names
+            ]
+            try:
+                session.add_all(new_files)
+                # One INSERT ... RETURNING id for all the files
+                await session.flush()
+                for new_file in new_files:
+                    set_slug_relative_path(new_file)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+        return new_files
+
+    async def _activate_files(self, new_files: List[DocumentFileORM], file_tag: str):
+        """
+        Activates the stored files and queues their post-processing, together
+        with the tag, in one short transaction.
+        """
+        async with self.async_session_maker() as session:
+            try:
+                if file_tag:
+                    await create_tag_if_missing(session, file_tag)
+                for new_file in new_files:
+                    session.add(new_file)
+                    new_file.active = True
+                    DocumentJobService.enqueue(session, new_file.id)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def _discard_files(
+        self,
+        engine: StorageEngine,
+        file_ids: List[int],
+        stored_paths: List[str],
+    ):
+        """
+        Deletes the rows of files that could not be saved, then the objects
+        written for them. Errors are logged, rows left behind stay inactive.
+        """
         try:
-            # Initialize S3 client
-            s3_client = boto3.client(
-                "s3",
-                endpoint_url=endpoint_url,
-                aws_access_key_id=aws_access_key,
-                aws_secret_access_key=aws_secret_key,
-                region_name=region_name,
-            )
-            bucket_name = bucket_name
-            # Upload file to S3
-            s3_client.upload_fileobj(file_obj, bucket_name, file_name)
-        except ClientError as e:
-            handle_exception(e, "Client error occurred")
-        except Exception as e:
-            handle_exception(e, f"Unexpected error while uploading file {file_name}")
-        return {"message": "File uploaded successfully."}
+            async with self.async_session_maker() as session:
+                await session.execute(
+                    delete(DocumentFileORM).where(DocumentFileORM.id.in_(file_ids))
+                )
+                await session.commit()
+        except Exception:
+            _logger.exception("Failed to delete the rows of unsaved files")
+        for relative_path in stored_paths:
+            try:
+                await engine.delete(relative_path)
+            except Exception:
+                _logger.exception("Failed to delete the stored file %s", relative_path)
+
+    async def _store_file(
+        self,
+        file,
+        new_file: DocumentFileORM,
+        engine: StorageEngine,
+        first_chunk: Optional[bytes],
+    ):
+        """
+        Streams the file to the backend storage and sets the relative path,
+        size and checksum of new_file.
+        """
+        new_file.relative_path = engine.get_relative_path(new_file.slug)
+        new_file.file_size, new_file.checksum = await engine.write(
+            file, new_file.relative_path, first_chunk=first_chunk
+        )
+        compute_human_file_size(new_file)
+
+    async def s3_storage_system(
+        self,
+        file: object,
+        file_name: str,
+        backend: object,
+        first_chunk: Optional[bytes] = None,
+    ) -> Tuple[int, str]:
+        """
+        Stream a file to an S3-compatible storage system (e.g., MinIO) using the provided backend configuration.
+        The file is read in chunks and uploaded in parts, so it is never fully loaded in memory.
+        first_chunk is the part of the file already read by the caller, if any.
+
+        Returns the size and the SHA-1 checksum of the uploaded file.
+        """
+        return await S3StorageEngine(backend).write(
+            file, file_name, first_chunk=first_chunk
+        )
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from openg2p_fastapi_common.service import BaseService
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import Settings
+from ..models.orm.document_file_orm import DocumentFileORM
+from ..models.orm.document_job_orm import DocumentJobORM
+from ..utils.db_utils import get_async_session, scoped_async_session
+from ..utils.document_processors import DOCUMENT_PROCESSORS
+from ..utils.file_utils import get_s3_backend_config
+from ..utils.storage_utils import get_storage_engine
+
+_config = Settings.get_config(strict=False)
+_logger = logging.getLogger(_config.logging_default_logger_name)
+
+
+class DocumentJobService(BaseService):
+    """
+    Post-processes uploaded documents (mimetype sniffing, missing checksums,
+    page counts, virus scanning) outside of the request path.
+
+    Jobs are saved in the g2p_document_job outbox in the transaction of the
+    upload, so that none is lost. A background task runs the due jobs with
+    bounded concurrency, and retries the failed ones with a growing delay.
+    It is woken up by notify once an upload is committed, and otherwise checks
+    the outbox every poll interval.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.async_session_maker = get_async_session
+        self._worker_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @staticmethod
+    def enqueue(session: AsyncSession, document_file_id: int):
+        """
+        Adds a job for the document to the session. The job is saved with the
+        caller's transaction, call notify once it is committed.
+        """
+        if _config.document_jobs_enabled:
+            session.add(
+                DocumentJobORM(
+                    document_file_id=document_file_id,
+                    state="pending",
+                    attempts=0,
+                    available_at=datetime.utcnow(),
+                )
+            )
+
+    def notify(self):
+        """
+        Wakes up the worker, if it runs in this process.
+        """
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def start(self):
+        if not _config.document_jobs_enabled or self._worker_task:
+            return
+        self._wakeup = asyncio.Event()
+        self._worker_task = asyncio.create_task(self._worker_loop())
+
+    async def stop(self):
+        if self._worker_task:
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+            self._worker_task = None
+        self._wakeup = None
+
+    async def claim_jobs(self, limit: int) -> List[int]:
+        """
+        Marks up to limit due jobs as running, and returns their IDs.
+        """
+        async with scoped_async_session() as session:
+            now = datetime.utcnow()
+            jobs = await DocumentJobORM.get_due_jobs(now, limit)
+            job_ids = []
+            for job in jobs:
+                if job.attempts >= _config.document_job_max_attempts:
+                    # Lost by a worker on its last attempt
+                    job.state = "failed"
+                    job.last_error = job.last_error or "The job timed out."
+                    continue
+                job.state = "running"
+                job.attempts += 1
+                job.available_at = now + timedelta(seconds=_config.document_job_timeout)
+                job_ids.append(job.id)
+            await session.commit()
+        return job_ids
+
+    async def run_job(self, job_id: int):
+        """
+        Runs the processors of one claimed job, and saves their outcome with the
+        state of the job. A failed job is retried until max attempts is reached.
+
+        The job and the file are loaded and saved in short transactions, no
+        connection is held while the document is streamed and processed.
+        The attempt number of the claim is the lease of this worker: if the job
+        was claimed again meanwhile, the outcome is dropped.
+        """
+        async with scoped_async_session() as session:
+            job = await session.get(DocumentJobORM, job_id)
+            attempt = job.attempts
+            document_file = await session.get(DocumentFileORM, job.document_file_id)
+            await session.commit()
+
+        try:
+            result = await asyncio.wait_for(
+                self.process_document(document_file), _config.document_job_timeout
+            )
+        except Exception as e:
+            _logger.exception("Document job %s failed", job_id)
+            if isinstance(e, asyncio.TimeoutError):
+                error = "The job timed out."
+            else:
+                error = getattr(e, "message", None) or str(e)
+            if attempt >= _config.document_job_max_attempts:
+                values = {"state": "failed"}
+            else:
+                values = {
+                    "state": "pending",
+                    "available_at": datetime.utcnow()
+                    + timedelta(
+                        seconds=_config.document_job_retry_delay * 2 ** (attempt - 1)
+                    ),
+                }
+            async with scoped_async_session() as session:
+                if await DocumentJobORM.update_running_job(
+                    job_id, attempt, last_error=error, **values
+                ):
+                    await session.commit()
+                else:
+                    self._log_lost_job(job_id, attempt)
+            return
+
+        async with scoped_async_session() as session:
+            if not await DocumentJobORM.update_running_job(
+                job_id, attempt, result=result, state="done", last_error=None
+            ):
+                self._log_lost_job(job_id, attempt)
+                return
+            if document_file is not None:
+                # Only the attributes changed by the processors are updated.
+                session.add(document_file)
+            await session.commit()
+
+    @staticmethod
+    def _log_lost_job(job_id: int, attempt: int):
+        _logger.warning(
+            "Document job %s was claimed again, attempt %s is dropped", job_id, attempt
+        )
+
+    async def process_document(self, document_file: Optional[DocumentFileORM]) -> dict:
+        """
+        Streams the stored document once through all the processors that apply.
+        Returns their results.
+        """
+        if document_file is None or document_file.to_delete:
+            return {}
+        processors = [
+            DOCUMENT_PROCESSORS[name](document_file)
+            for name in _config.document_job_processors
+            if name in DOCUMENT_PROCESSORS
+        ]
+        processors = [processor for processor in processors if processor.applies()]
+        if not processors:
+            return {}
+
+        backend = await get_s3_backend_config(self, document_file.backend_id)
+        engine = get_storage_engine(backend)
+        if not engine:
+            raise ValueError("Backend type should be either amazon_s3 or filesystem.")
+        result = {}
+        try:
+            async for chunk in engine.read(document_file.relative_path):
+                for processor in processors:
+                    await processor.feed(chunk)
+            for processor in processors:
+                result.update(await processor.finish())
+        finally:
+            for processor in processors:
+                await processor.close()
+        return result
+
+    async def _worker_loop(self):
+        running: Set[asyncio.Task] = set()
+
+        def job_done(task: asyncio.Task):
+            running.discard(task)
+            self.notify()
+
+        try:
+            while True:
+                self._wakeup.clear()
+                free_slots = _config.document_job_concurrency - len(running)
+                if free_slots > 0:
+                    try:
+                        job_ids = await self.claim_jobs(free_slots)
+                    except Exception:
+                        _logger.exception("Failed to claim document jobs")
+                        job_ids = []
+                    for job_id in job_ids:
+                        task = asyncio.create_task(self._run_job_safely(job_id))
+                        running.add(task)
+                        task.add_done_callback(job_done)
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), _config.document_job_poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def _run_job_safely(self, job_id: int):
+        try:
+            await self.run_job(job_id)
+        except Exception:
+            # The job is run again once it times out.
+            _logger.exception("Failed to save document job %s", job_id)
@@ -2,11 +2,9 @@ import random
 from datetime import datetime
 
 from fastapi import HTTPException, status
-from openg2p_fastapi_common.context import dbengine
 from openg2p_fastapi_common.service import BaseService
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from ..models.form import ProgramForm
 from ..models.orm.program_orm import ProgramORM
@@ -14,6 +12,7 @@ from ..models.orm.program_registrant_info_orm import (
     ProgramRegistrantInfoDraftORM,
     ProgramRegistrantInfoORM,
 )
+from ..utils.db_utils import scoped_async_session
 from .membership_service import MembershipService
 from .partner_service import PartnerService
 
@@ -63,8 +62,7 @@ class FormService(BaseService):
             )
 
     async def create_form_draft(self, program_id: int, form_data, registrant_id: int):
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with scoped_async_session() as session:
             draft_form = await ProgramRegistrantInfoDraftORM.get_draft_reg_info_by_id(
                 program_id, registrant_id
             )
@@ -97,8 +95,7 @@ class FormService(BaseService):
     async def submit_application_form(
         self, program_id: int, form_data, registrant_id: int
     ):
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+        async with scoped_async_session() as session:
             program = await session.get(
                 ProgramORM, program_id
             )  # Fetch the ProgramORM object
@@ -130,7 +127,7 @@ class FormService(BaseService):
             try:
                 program_membership_id = (
                     await self.membership_service.check_and_create_mem(
-                        program_id, registrant_id
+                        program_id, registrant_id, session=session
                     )
                 )
             except ValueError as e:
@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import List, Optional
+
+from openg2p_fastapi_auth.models.login_provider import (
+    LoginProviderHttpResponse,
+    LoginProviderResponse,
+    LoginProviderTypes,
+)
+from openg2p_fastapi_common.service import BaseService
+
+from ..config import Settings
+from ..models.login_provider import LoginProviderCatalog
+from ..models.orm.auth_oauth_provider import AuthOauthProviderORM
+
+_config = Settings.get_config(strict=False)
+_logger = logging.getLogger(_config.logging_default_logger_name)
+
+
+class LoginProviderCatalogService(BaseService):
+    """
+    Keeps the response of getLoginProviders in memory, already encoded, so that
+    the public login page is served without querying auth_oauth_provider.
+
+    The snapshot is rebuilt by a background task when the latest write_date or
+    the number of providers changes, or when it is older than the refresh interval.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._catalog: Optional[LoginProviderCatalog] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def catalog(self) -> Optional[LoginProviderCatalog]:
+        """
+        The current snapshot. None if the catalog is disabled or not loaded yet.
+        """
+        if not _config.login_provider_catalog_enabled:
+            return None
+        return self._catalog
+
+    async def refresh(self, force: bool = False) -> bool:
+        """
+        Rebuilds the snapshot if the providers changed. Returns True if rebuilt.
+        """
+        version = await AuthOauthProviderORM.get_providers_version()
+        catalog = self._catalog
+        if (
+            not force
+            and catalog
+            and catalog.version == version
+            and time.monotonic() - catalog.loaded_at
+            < _config.login_provider_catalog_refresh_interval
+        ):
+            return False
+        providers = await AuthOauthProviderORM.get_all()
+        self._catalog = self.build_catalog(
+            [
+                LoginProviderResponse(
+                    id=provider.id,
+                    name=provider.name,
+                    # Only the following type is supported for now
+                    type=LoginProviderTypes.oauth2_auth_code,
+                    displayName=provider.body or "",
+                    displayIconUrl=provider.image_icon_url or "",
+                )
+                for provider in providers
+            ],
+            version,
+        )
+        return True
+
+    @staticmethod
+    def build_catalog(
+        login_providers: List[LoginProviderResponse], version
+    ) -> LoginProviderCatalog:
+        body = (
+            LoginProviderHttpResponse(loginProviders=login_providers)
+            .model_dump_json()
+            .encode()
+        )
+        return LoginProviderCatalog(
+            login_providers=tuple(login_providers),
+            body=body,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            version=version,
+            loaded_at=time.monotonic(),
+        )
+
+    async def start(self):
+        if not _config.login_provider_catalog_enabled or self._refresh_task:
+            return
+        try:
+            await self.refresh(force=True)
+        except Exception:
+            _logger.exception("Failed to load login provider catalog")
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        self._catalog = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(_config.login_provider_catalog_check_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                _logger.exception("Failed to refresh login provider catalog")
@@ -1,18 +1,29 @@
-from openg2p_fastapi_common.context import dbengine
 from openg2p_fastapi_common.service import BaseService
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from ..models.orm.program_membership_orm import ProgramMembershipORM
+from ..utils.db_utils import get_async_session
 
 
 class MembershipService(BaseService):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-    async def check_and_create_mem(self, programid: int, partnerid: int) -> int:
-        async_session_maker = async_sessionmaker(dbengine.get())
-        async with async_session_maker() as session:
+    async def check_and_create_mem(
+        self, programid: int, partnerid: int, session=None
+    ) -> int:
+        """
+        Returns the id of the partner's membership in the program, creating and
+        committing it if needed. Call it before opening a unit of work that does
+        slow I/O, so that the new membership is not locked during the I/O.
+        Given the session of a unit of work, the membership is only flushed, and
+        saved with the caller's transaction.
+        Raises ValueError if the membership can neither be created nor found.
+        """
+        if session is not None:
+            return await self._get_or_add_membership(programid, partnerid, session)
+
+        async with get_async_session() as session:
             membership = await ProgramMembershipORM.get_membership_by_id(
                 programid, partnerid
             )
@@ -27,6 +38,36 @@ class MembershipService(BaseService):
                     await session.commit()
                     await session.refresh(membership)
                 except IntegrityError:
-                    return "Could not add to registrant to program!!"
+                    # Created meanwhile by a concurrent request of the partner
+                    await session.rollback()
+                    membership = await self._get_existing_membership(
+                        programid, partnerid
+                    )
+
+        return membership.id
 
+    async def _get_or_add_membership(self, programid: int, partnerid: int, session):
+        membership = await ProgramMembershipORM.get_membership_by_id(
+            programid, partnerid
+        )
+        if membership is None:
+            membership = ProgramMembershipORM(
+                program_id=programid, partner_id=partnerid, state="draft"
+            )
+            try:
+                # A savepoint, so that a concurrent insert does not roll back
+                # the caller's transaction
+                async with session.begin_nested():
+                    session.add(membership)
+            except IntegrityError:
+                membership = await self._get_existing_membership(programid, partnerid)
         return membership.id
+
+    @staticmethod
+    async def _get_existing_membership(programid: int, partnerid: int):
+        membership = await ProgramMembershipORM.get_membership_by_id(
+            programid, partnerid
+        )
+        if membership is None:
+            raise ValueError("Could not add to registrant to program!!") from None
+        return membership
@@ -1,19 +1,21 @@
 import logging
 from datetime import datetime
+from typing import Union
 
 import orjson
-from openg2p_fastapi_common.context import dbengine
 from openg2p_fastapi_common.errors.http_exceptions import InternalServerError
 from openg2p_fastapi_common.service import BaseService
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from ..config import Settings
 from ..context import partner_fields_cache
 from ..models.orm.auth_oauth_provider import AuthOauthProviderORM
-from ..models.orm.partner_orm import PartnerORM, PartnerPhoneNoORM
+from ..models.orm.partner_orm import PartnerBankORM, PartnerORM, PartnerPhoneNoORM
 from ..models.orm.reg_id_orm import RegIDORM
+from ..models.profile import GetProfile
+from ..models.token_map import TokenMap
+from ..utils.db_utils import get_async_session
 
 _config = Settings.get_config(strict=False)
 _logger = logging.getLogger(_config.logging_default_logger_name)
@@ -34,83 +36,124 @@ class PartnerService(BaseService):
         validation = AuthOauthProviderORM.map_validation_response(
             validation, id_type_config["token_map"]
         )
-        reg_id_res = await RegIDORM.get_partner_by_reg_id(
-            id_type_config["g2p_id_type"], validation["user_id"]
+        id_type = id_type_config["g2p_id_type"]
+        id_value = validation["user_id"]
+        partner_id = await RegIDORM.get_partner_id_by_reg_id(id_type, id_value)
+        if partner_id:
+            return partner_id
+
+        name = validation.pop("name", "")
+        partner_dict = {
+            "given_name": name.split(" ")[0],
+            "family_name": name.split(" ")[-1],
+            "addl_name": " ".join(name.split(" ")[1:-1]),
+            "email": validation.pop("email", ""),
+            "is_registrant": True,
+            "is_group": False,
+            "active": True,
+            "company_id": id_type_config["company_id"],
+        }
+        partner_dict["name"] = self.create_partner_process_name(
+            partner_dict["family_name"],
+            partner_dict["given_name"],
+            partner_dict["addl_name"],
         )
+        partner_dict["gender"] = self.create_partner_process_gender(
+            validation.pop("gender", "")
+        )
+        partner_dict["birthdate"] = self.create_partner_process_birthdate(
+            validation.pop("birthdate", None),
+            date_format=id_type_config["date_format"],
+        )
+        phone = validation.pop("phone", "")
+        partner_dict["phone"] = phone
 
-        if not reg_id_res:
-            id_value = validation["user_id"]
-
-            name = validation.pop("name", "")
-            partner_dict = {
-                "given_name": name.split(" ")[0],
-                "family_name": name.split(" ")[-1],
-                "addl_name": " ".join(name.split(" ")[1:-1]),
-                "email": validation.pop("email", ""),
-                "is_registrant": True,
-                "is_group": False,
-                "active": True,
-                "company_id": id_type_config["company_id"],
-            }
-            partner_dict["name"] = self.create_partner_process_name(
-                partner_dict["family_name"],
-                partner_dict["given_name"],
-                partner_dict["addl_name"],
-            )
-            partner_dict["gender"] = self.create_partner_process_gender(
-                validation.pop("gender", "")
-            )
-            partner_dict["birthdate"] = self.create_partner_process_birthdate(
-                validation.pop("birthdate", None),
-                date_format=id_type_config["date_format"],
-            )
-            phone = validation.pop("phone", "")
-            partner_dict["phone"] = phone
-
-            # Image is stored as attachment in odoo. So the following wont work.
-            # partner_dict["image_1920"] = self.process_picture(
-            #     validation.pop("picture", None)
-            # )
-
-            partner_fields = await self.get_partner_fields()
-            partner_dict.update(
-                self.create_partner_process_other_fields(
-                    validation, id_type_config["token_map"], partner_fields
-                )
+        # Image is stored as attachment in odoo. So the following wont work.
+        # partner_dict["image_1920"] = self.process_picture(
+        #     validation.pop("picture", None)
+        # )
+
+        partner_fields = await self.get_partner_fields()
+        # display_name is not stored anymore from Odoo 17.0
+        if "display_name" in partner_fields:
+            partner_dict["display_name"] = partner_dict["name"]
+        partner_dict.update(
+            self.create_partner_process_other_fields(
+                validation, id_type_config["token_map"], partner_fields
             )
+        )
 
-            async_session_maker = async_sessionmaker(
-                dbengine.get(), expire_on_commit=False
+        try:
+            partner_id = await PartnerORM.create_registrant(
+                partner_dict, id_type, id_value, phone_no=phone
             )
-            async with async_session_maker() as session:
-                try:
-                    partner = PartnerORM(**partner_dict)
-                    reg_id = RegIDORM(
-                        partner=partner,
-                        id_type=id_type_config["g2p_id_type"],
-                        value=id_value,
-                    )
-                    phone_number = PartnerPhoneNoORM(
-                        partner=partner,
-                        phone_no=phone,
-                    )
-                    session.add(partner)
-                    session.add(reg_id)
-                    session.add(phone_number)
-
-                    await session.commit()
-                    await self.create_partner_add_display_name(partner, session)
-                except IntegrityError as e:
-                    raise InternalServerError(
-                        message=f"Could not create partner. {repr(e)}",
-                    ) from e
+        except IntegrityError as e:
+            raise InternalServerError(
+                message=f"Could not create partner. {repr(e)}",
+            ) from e
+        if not partner_id:
+            # Created by a concurrent login of the same user.
+            return await RegIDORM.get_partner_id_by_reg_id(id_type, id_value)
+        RegIDORM.cache_partner_id(id_type, id_value, partner_id)
+        return partner_id
+
+    async def get_partner_profile(self, partner_id: int) -> GetProfile:
+        """
+        Assembles the profile of a partner. The reg ids and bank accounts are
+        loaded joined with their type and bank names, so the number of queries
+        does not depend on how many ids or accounts the partner has.
+        """
+        partner_data = await PartnerORM.get_partner_data(partner_id)
+        if not partner_data:
+            return None
+
+        partner_ids = await RegIDORM.get_all_partner_ids_with_type(partner_data.id)
+        partner_bank_accounts = await PartnerBankORM.get_partner_banks_with_name(
+            partner_data.id
+        )
+        partner_phone_data = await PartnerPhoneNoORM.get_partner_phone_details(
+            partner_data.id
+        )
+
+        return GetProfile(
+            id=partner_data.id,
+            ids=[
+                {
+                    "id_type": reg_id.id_type,
+                    "value": reg_id.value,
+                    "expiry_date": reg_id.expiry_date,
+                }
+                for reg_id in partner_ids
+            ],
+            email=partner_data.email,
+            gender=partner_data.gender,
+            # address=partner_data.address,
+            bank_ids=[
+                {
+                    "bank_name": bank.bank_name,
+                    "acc_number": bank.acc_number,
+                }
+                for bank in partner_bank_accounts
+            ],
+            addl_name=partner_data.addl_name,
+            given_name=partner_data.given_name,
+            family_name=partner_data.family_name,
+            birthdate=partner_data.birthdate,
+            phone_numbers=[
+                {
+                    "phone_no": phone.phone_no,
+                    "date_collected": phone.date_collected,
+                }
+                for phone in partner_phone_data
+            ],
+            birth_place=partner_data.birth_place,
+        )
 
     async def update_partner_info(self, partner_id, data, session=None):
         # Update partner_info with fields from program_registrant_info
-        is_create_session = False
         if not session:
-            session = async_sessionmaker(dbengine.get())()
-            is_create_session = True
+            async with get_async_session() as session:
+                return await self.update_partner_info(partner_id, data, session=session)
         updated_fields = {}
         partner_fields = await self.get_partner_fields()
         for key, value in data.items():
@@ -131,8 +174,6 @@ class PartnerService(BaseService):
                 )
             )
             await session.commit()
-        if is_create_session:
-            await session.close()
         return updated_fields
 
     def create_partner_process_gender(self, gender):
@@ -161,10 +202,14 @@ class PartnerService(BaseService):
     #     return image_parsed
 
     def create_partner_process_other_fields(
-        self, validation: dict, mapping: str, partner_fields: list[str]
+        self,
+        validation: dict,
+        mapping: Union[str, TokenMap],
+        partner_fields: list[str],
     ):
         res = {}
-        all_fields = [pair.split(":")[0].strip() for pair in mapping.split(" ")]
+        all_fields = TokenMap.compile(mapping).claims
+        partner_fields = set(partner_fields)
         for key in list(validation):
             if key in all_fields and key in partner_fields:
                 value = validation.pop(key)
@@ -174,18 +219,11 @@ class PartnerService(BaseService):
                     res[key] = value
         return res
 
-    async def create_partner_add_display_name(self, partner, session):
-        try:
-            await self.update_partner_info(
-                partner.id, {"display_name": partner.name}, session=session
-            )
-        except IntegrityError:
-            _logger.warning("Failed to insert display name. Odoo version maybe 17.0")
-
     async def get_partner_fields(self):
-        partner_field = partner_fields_cache.get()
-        if partner_field:
-            return partner_field
-        partner_field = await PartnerORM.get_partner_fields()
-        partner_fields_cache.set(partner_field)
-        return partner_field
+        async def load():
+            # An empty list means the table is missing, it is not cached.
+            return list(await PartnerORM.get_partner_fields()) or None
+
+        return (
+            await partner_fields_cache.get_or_load(PartnerORM.__tablename__, load) or []
+        )
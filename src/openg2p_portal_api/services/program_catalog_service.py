@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from openg2p_fastapi_common.service import BaseService
+
+from ..config import Settings
+from ..models.orm.program_orm import ProgramORM
+from ..models.program import ProgramCatalog, ProgramCatalogEntry
+
+_config = Settings.get_config(strict=False)
+_logger = logging.getLogger(_config.logging_default_logger_name)
+
+
+class ProgramCatalogService(BaseService):
+    """
+    Keeps an in-memory snapshot of the active programs, so that discovery and
+    the program list are served without querying g2p_program.
+
+    The snapshot is reloaded by a background task when the latest write_date or
+    the number of programs changes, or when it is older than the refresh interval.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._catalog: Optional[ProgramCatalog] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def catalog(self) -> Optional[ProgramCatalog]:
+        """
+        The current snapshot. None if the catalog is disabled or not loaded yet.
+        """
+        if not _config.program_catalog_enabled:
+            return None
+        return self._catalog
+
+    async def refresh(self, force: bool = False) -> bool:
+        """
+        Reloads the snapshot if the programs changed. Returns True if reloaded.
+        """
+        version = await ProgramORM.get_catalog_version()
+        catalog = self._catalog
+        if (
+            not force
+            and catalog
+            and catalog.version == version
+            and time.monotonic() - catalog.loaded_at
+            < _config.program_catalog_refresh_interval
+        ):
+            return False
+
+        programs = await ProgramORM.get_program_catalog()
+        self._catalog = self.build_catalog(
+            [ProgramCatalogEntry.model_validate(program) for program in programs],
+            version,
+        )
+        return True
+
+    @staticmethod
+    def build_catalog(programs: List[ProgramCatalogEntry], version) -> ProgramCatalog:
+        # Same as state != 'inactive' AND state != 'ended' in SQL, which is not
+        # true for programs without a state.
+        listed = [
+            program
+            for program in programs
+            if program.state is not None
+            and program.state not in ("inactive", "ended")
+            and not program.is_reimbursement_program
+        ]
+        # Latest first, programs without create_date first like in Postgres.
+        listed.sort(
+            key=lambda program: (
+                program.create_date is None,
+                program.create_date or datetime.min,
+            ),
+            reverse=True,
+        )
+        return ProgramCatalog(
+            programs=tuple(programs),
+            lower_names=tuple((program.name or "").lower() for program in programs),
+            listed=tuple(listed),
+            version=version,
+            loaded_at=time.monotonic(),
+        )
+
+    def search(
+        self, keyword: str, page: int = None, pagesize: int = None
+    ) -> Optional[List[ProgramCatalogEntry]]:
+        """
+        Case insensitive substring search on program names, case sensitive
+        matches first. Returns None if the catalog is not available.
+        """
+        catalog = self.catalog
+        if catalog is None:
+            return None
+
+        lower_keyword = keyword.lower()
+        matches = [
+            catalog.programs[index]
+            for index, name in enumerate(catalog.lower_names)
+            if lower_keyword in name
+        ]
+        matches.sort(
+            key=lambda program: (
+                keyword not in (program.name or ""),
+                program.name or "",
+                program.id,
+            )
+        )
+        if pagesize:
+            start = (max(page or 1, 1) - 1) * pagesize
+            matches = matches[start : start + pagesize]
+        return matches
+
+    async def start(self):
+        if not _config.program_catalog_enabled or self._refresh_task:
+            return
+        try:
+            await self.refresh(force=True)
+        except Exception:
+            _logger.exception("Failed to load program catalog")
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        self._catalog = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(_config.program_catalog_check_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                _logger.exception("Failed to refresh program catalog")
@@ -1,7 +1,8 @@
 from openg2p_fastapi_common.service import BaseService
 
+from ..config import Settings
+from ..models.orm.program_membership_orm import ProgramMembershipORM
 from ..models.orm.program_orm import ProgramORM
-from ..models.orm.program_registrant_info_orm import ProgramRegistrantInfoORM
 from ..models.program import (
     ApplicationDetails,
     BenefitDetails,
@@ -9,18 +10,72 @@ from ..models.program import (
     ProgramBase,
     ProgramSummary,
 )
+from ..utils.pagination_utils import decode_cursor, get_page_size, paginate
+from .program_catalog_service import ProgramCatalogService
+
+_config = Settings.get_config(strict=False)
 
 
 class ProgramService(BaseService):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._program_catalog_service = ProgramCatalogService.get_component()
+
+    @property
+    def program_catalog_service(self):
+        if not self._program_catalog_service:
+            self._program_catalog_service = ProgramCatalogService.get_component()
+        return self._program_catalog_service
+
+    @property
+    def program_catalog(self):
+        if not self.program_catalog_service:
+            return None
+        return self.program_catalog_service.catalog
+
+    async def get_all_programs_with_membership(self, partnerid: int):
+        """
+        Returns (program, membership_id, membership_state, last_application_status)
+        of the listed programs. Programs are taken from the program catalog when
+        it is loaded, and only the partner's memberships are queried.
+        """
+        catalog = self.program_catalog
+        if not catalog:
+            return await ProgramORM.get_all_programs_with_membership(partnerid)
+
+        memberships = {
+            membership.program_id: membership
+            for membership in await ProgramMembershipORM.get_partner_memberships(
+                partnerid
+            )
+        }
+        res = []
+        for program in catalog.listed:
+            membership = memberships.get(program.id)
+            if membership:
+                res.append(
+                    (
+                        program,
+                        membership.membership_id,
+                        membership.membership_state,
+                        membership.last_application_status,
+                    )
+                )
+            else:
+                res.append((program, None, None, None))
+        return res
 
     async def get_all_program_service(self, partnerid: int):
         program_list = []
-        res = await ProgramORM.get_all_programs()
+        res = await self.get_all_programs_with_membership(partnerid)
 
         if res:
-            for program in res:
+            for (
+                program,
+                membership_id,
+                membership_state,
+                last_application_status,
+            ) in res:
                 response_dict = {
                     "id": program.id,
                     "name": program.name,
@@ -35,70 +90,63 @@ class ProgramService(BaseService):
                     if program.create_date
                     else None,
                 }
-                membership = program.membership
-                if membership:
-                    for member in membership:
-                        if member.partner_id == partnerid:
-                            response_dict.update(
-                                {"state": member.state, "has_applied": True}
-                            )
-                            latest_reg_info = (
-                                await ProgramRegistrantInfoORM.get_latest_reg_info(
-                                    member.id
-                                )
-                            )
-                            if latest_reg_info:
-                                response_dict[
-                                    "last_application_status"
-                                ] = latest_reg_info.state
+                if membership_id:
+                    response_dict.update(
+                        {"state": membership_state, "has_applied": True}
+                    )
+                    if last_application_status:
+                        response_dict[
+                            "last_application_status"
+                        ] = last_application_status
 
                 program_list.append(Program(**response_dict))
 
         return program_list
 
     async def get_program_by_id_service(self, programid: int, partnerid: int):
-        res = await ProgramORM.get_all_by_program_id(programid)
+        res = await ProgramORM.get_program_with_membership(programid, partnerid)
 
         if res:
+            program, membership_id, membership_state, last_application_status = res
             response_dict = {
-                "id": res.id,
-                "name": res.name,
-                "description": res.description,
+                "id": program.id,
+                "name": program.name,
+                "description": program.description,
                 "state": "Not Applied",
                 "has_applied": False,
-                "self_service_portal_form": res.self_service_portal_form,
-                "is_multiple_form_submission": res.is_multiple_form_submission,
+                "self_service_portal_form": program.self_service_portal_form,
+                "is_multiple_form_submission": program.is_multiple_form_submission,
                 "last_application_status": "Not submitted any application",
             }
-            membership = res.membership
-            if membership:
-                for member in membership:
-                    if member.partner_id == partnerid:
-                        response_dict.update(
-                            {
-                                "state": member.state,
-                                "has_applied": True,
-                            }
-                        )
-                        latest_reg_info = (
-                            await ProgramRegistrantInfoORM.get_latest_reg_info(
-                                member.id
-                            )
-                        )
-                        if latest_reg_info:
-                            response_dict[
-                                "last_application_status"
-                            ] = latest_reg_info.state
-
-                        break
+            if membership_id:
+                response_dict.update(
+                    {
+                        "state": membership_state,
+                        "has_applied": True,
+                    }
+                )
+                if last_application_status:
+                    response_dict["last_application_status"] = last_application_status
 
             return Program(**response_dict)
         else:
             return {"message": f"Program with ID {programid} not found."}
 
-    async def get_program_by_key_service(self, keyword: str):
+    async def get_program_by_key_service(
+        self, keyword: str, page: int = None, pagesize: int = None
+    ):
         program_list = []
-        res = await ProgramORM.get_all_program_by_keyword(keyword)
+        if pagesize:
+            pagesize = min(pagesize, _config.details_max_page_size)
+        res = None
+        if _config.discovery_search_mode == "like" and self.program_catalog_service:
+            res = self.program_catalog_service.search(
+                keyword, page=page, pagesize=pagesize
+            )
+        if res is None:
+            res = await ProgramORM.get_all_program_by_keyword(
+                keyword, page=page, pagesize=pagesize
+            )
 
         if res:
             for program in res:
@@ -117,13 +165,31 @@ class ProgramService(BaseService):
         summary_details = await ProgramORM.get_program_summary(partnerid)
         return [ProgramSummary.model_validate(program) for program in summary_details]
 
-    async def get_application_details_service(self, partnerid: int):
-        application_details = await ProgramORM.get_application_details(partnerid)
+    async def get_application_details_service(
+        self, partnerid: int, limit: int = None, after: str = None
+    ):
+        limit = get_page_size(limit, after)
+        application_details = await ProgramORM.get_application_details(
+            partnerid, limit=limit and limit + 1, after=decode_cursor(after)
+        )
+        application_details, next_cursor = paginate(
+            application_details, limit, "date_applied", "registrant_info_id"
+        )
         return [
             ApplicationDetails.model_validate(program)
             for program in application_details
-        ]
-
-    async def get_benefit_details_service(self, partnerid: int):
-        benefit_details = await ProgramORM.get_benefit_details(self, partnerid)
-        return [BenefitDetails.model_validate(program) for program in benefit_details]
+        ], next_cursor
+
+    async def get_benefit_details_service(
+        self, partnerid: int, limit: int = None, after: str = None
+    ):
+        limit = get_page_size(limit, after)
+        benefit_details = await ProgramORM.get_benefit_details(
+            partnerid, limit=limit and limit + 1, after=decode_cursor(after)
+        )
+        benefit_details, next_cursor = paginate(
+            benefit_details, limit, "date_approved", "entitlement_id"
+        )
+        return [
+            BenefitDetails.model_validate(program) for program in benefit_details
+        ], next_cursor
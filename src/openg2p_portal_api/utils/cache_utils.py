@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class AsyncTTLCache:
+    """
+    Process wide, size bounded LRU cache whose entries expire after a ttl.
+
+    get_or_load makes sure that concurrent misses on the same key trigger only
+    one call to the loader; the other callers wait for its result.
+    None results are not cached.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable):
+        return self._lookup(key)[0]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        found, value = self._lookup(key)
+        return value if found else default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if value is None:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable = None):
+        """
+        Removes the given key from the cache. Clears the cache if no key is given.
+        """
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+    ) -> Any:
+        found, value = self._lookup(key)
+        if found:
+            return value
+
+        # The loader runs in its own task, so that a cancelled caller, e.g. on
+        # a client disconnect, does not cancel the load for the other callers.
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader, ttl))
+            task.add_done_callback(_retrieve_exception)
+            self._loading[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float],
+    ) -> Any:
+        # Imported here, context creates the caches of this module.
+        from ..context import request_dbsession
+        from .db_utils import request_session_scope
+
+        # Outside of the unit of work and the request of the first caller,
+        # whose session may be closed before the load is done. The queries of
+        # the loader share a session of their own.
+        request_dbsession.set(None)
+        try:
+            async with request_session_scope():
+                value = await loader()
+            self.set(key, value, ttl=ttl)
+            return value
+        finally:
+            self._loading.pop(key, None)
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+
+def _retrieve_exception(task: asyncio.Task):
+    # Marks the exception as retrieved, in case every caller was cancelled.
+    if not task.cancelled():
+        task.exception()
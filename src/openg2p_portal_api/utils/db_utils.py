@@ -0,0 +1,121 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from openg2p_fastapi_common.context import dbengine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from openg2p_portal_api.context import (
+    dbsession_maker,
+    request_dbsession,
+    request_session,
+)
+
+
+def create_session_maker() -> async_sessionmaker:
+    """
+    Creates the process wide session factory bound to the current db engine.
+    """
+    return async_sessionmaker(dbengine.get(), expire_on_commit=False)
+
+
+def get_session_maker() -> async_sessionmaker:
+    """
+    Returns the session factory created by the app Initializer.
+    Falls back to a new factory when the app is not initialized (CLI, tests).
+    """
+    return dbsession_maker.get() or create_session_maker()
+
+
+class RequestSession:
+    """
+    Session shared by the ORM calls of a request made outside units of work,
+    opened on the first call and closed on release.
+    """
+
+    def __init__(self):
+        self.session: Optional[AsyncSession] = None
+
+    def get_session(self) -> AsyncSession:
+        if self.session is None:
+            self.session = get_session_maker()()
+        return self.session
+
+    async def release(self):
+        session, self.session = self.session, None
+        if session is not None:
+            await session.close()
+
+
+@asynccontextmanager
+async def request_session_scope() -> AsyncIterator[RequestSession]:
+    """
+    Scope of a request: the ORM calls made in the block outside units of work
+    share one lazily opened session, and hence a single pooled connection.
+    The session is closed on exit.
+    """
+    scope = RequestSession()
+    token = request_session.set(scope)
+    try:
+        yield scope
+    finally:
+        request_session.reset(token)
+        await scope.release()
+
+
+async def release_request_session():
+    """
+    Closes the session of the current request, if open, returning its
+    connection to the pool. Call it before slow I/O (S3, scanners, request
+    bodies); the next ORM call of the request opens a new session.
+    """
+    scope = request_session.get()
+    if scope is not None:
+        await scope.release()
+
+
+@asynccontextmanager
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """
+    Yields the session of the current unit of work, if any, else the session
+    of the current request. Otherwise opens a new session from the shared
+    factory and closes it on exit.
+    """
+    session = request_dbsession.get()
+    if session is not None:
+        yield session
+        return
+
+    scope = request_session.get()
+    if scope is not None:
+        yield scope.get_session()
+        return
+
+    async with get_session_maker()() as session:
+        yield session
+
+
+@asynccontextmanager
+async def scoped_async_session() -> AsyncIterator[AsyncSession]:
+    """
+    Unit of work: all ORM calls made in the block share one session, and hence
+    one transaction and one pooled connection. A commit or rollback made in the
+    block, also by a helper, applies to everything done in the block so far.
+    Helpers given a session or running in a unit of work leave committing to it.
+
+    Keep slow I/O (S3, scanners) out of these blocks. A nested block joins
+    the enclosing unit of work. The session of the request is released first,
+    so that a request holds at most one connection.
+    """
+    session = request_dbsession.get()
+    if session is not None:
+        yield session
+        return
+
+    await release_request_session()
+
+    async with get_session_maker()() as session:
+        token = request_dbsession.set(session)
+        try:
+            yield session
+        finally:
+            request_dbsession.reset(token)
@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import re
+import shlex
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+from openg2p_portal_api.config import Settings
+from openg2p_portal_api.models.orm.document_file_orm import DocumentFileORM
+
+_config = Settings.get_config(strict=False)
+
+_PDF_HEADER = b"%PDF-"
+# Leading bytes of the file types seen in supporting documents.
+_MIME_SIGNATURES = (
+    (_PDF_HEADER, "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),
+)
+# Office documents are zip or OLE files, their guessed mimetype is more precise.
+_CONTAINER_MIMETYPES = ("application/zip", "application/x-ole-storage")
+_PDF_PAGE_PATTERN = re.compile(rb"/Type\s{0,8}/Page(?![a-zA-Z])")
+# Longest match of the page pattern, kept between two chunks.
+_PDF_PAGE_OVERLAP = 32
+
+
+def sniff_mimetype(head: bytes) -> Optional[str]:
+    """
+    Returns the mimetype of a file from its first bytes, None if unknown.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mimetype in _MIME_SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    return None
+
+
+class DocumentProcessor(ABC):
+    """
+    Computes something about a stored document from its content, which is fed
+    chunk by chunk. finish applies the outcome to the storage_file row, and
+    returns what is saved in the result of the job.
+    """
+
+    name: str = None
+
+    def __init__(self, document_file: DocumentFileORM):
+        self.document_file = document_file
+
+    def applies(self) -> bool:
+        return True
+
+    @abstractmethod
+    async def feed(self, data: bytes):
+        """
+        Processes the next chunk of the document.
+        """
+
+    @abstractmethod
+    async def finish(self) -> dict:
+        """
+        Called once the whole document was fed. Returns the result to save.
+        """
+
+    async def close(self):  # noqa: B027
+        """
+        Releases what the processor holds, called even if processing failed.
+        """
+
+
+class MimetypeProcessor(DocumentProcessor):
+    """
+    Replaces the mimetype guessed from the file name with the one of the content.
+    """
+
+    name = "mimetype"
+    head_size = 16
+
+    def __init__(self, document_file: DocumentFileORM):
+        super().__init__(document_file)
+        self.head = b""
+
+    async def feed(self, data: bytes):
+        if len(self.head) < self.head_size:
+            self.head += data[: self.head_size - len(self.head)]
+
+    async def finish(self) -> dict:
+        mimetype = sniff_mimetype(self.head)
+        if mimetype in _CONTAINER_MIMETYPES and self.document_file.mimetype:
+            mimetype = None
+        if mimetype:
+            self.document_file.mimetype = mimetype
+        return {"mimetype": self.document_file.mimetype}
+
+
+class ChecksumProcessor(DocumentProcessor):
+    """
+    Computes the checksum of files stored without one, like resumable S3 uploads.
+    """
+
+    name = "checksum"
+
+    def __init__(self, document_file: DocumentFileORM):
+        super().__init__(document_file)
+        self.sha1 = hashlib.sha1()
+
+    def applies(self) -> bool:
+        return not self.document_file.checksum
+
+    async def feed(self, data: bytes):
+        self.sha1.update(data)
+
+    async def finish(self) -> dict:
+        self.document_file.checksum = self.sha1.hexdigest()
+        return {"checksum": self.document_file.checksum}
+
+
+class PdfPageCountProcessor(DocumentProcessor):
+    """
+    Counts the page objects of PDF files. Pages inside compressed object
+    streams are not seen, no count is returned then.
+    """
+
+    name = "page_count"
+
+    def __init__(self, document_file: DocumentFileORM):
+        super().__init__(document_file)
+        self.head = b""
+        self.page_count = 0
+        self.tail = b""
+
+    async def feed(self, data: bytes):
+        if len(self.head) < len(_PDF_HEADER):
+            self.head += data[: len(_PDF_HEADER) - len(self.head)]
+        if not _PDF_HEADER.startswith(self.head):
+            return
+        buffer = self.tail + data
+        # Matches ending in the tail were counted with the previous chunk, and
+        # the character after a match must be known.
+        self.page_count += sum(
+            1
+            for match in _PDF_PAGE_PATTERN.finditer(buffer)
+            if len(self.tail) <= match.end() < len(buffer)
+        )
+        self.tail = buffer[-_PDF_PAGE_OVERLAP:]
+
+    async def finish(self) -> dict:
+        if self.head != _PDF_HEADER:
+            return {}
+        # A match at the very end of the file was never counted.
+        self.page_count += sum(
+            1
+            for match in _PDF_PAGE_PATTERN.finditer(self.tail)
+            if match.end() == len(self.tail)
+        )
+        return {"page_count": self.page_count} if self.page_count else {}
+
+
+class VirusScanProcessor(DocumentProcessor):
+    """
+    Pipes the file to the configured scan command, which exits with 1 if the
+    file is infected (e.g. clamdscan --no-summary -). Infected files are
+    deactivated and marked for deletion, with the files sharing their object.
+    """
+
+    name = "virus_scan"
+
+    def __init__(self, document_file: DocumentFileORM):
+        super().__init__(document_file)
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    def applies(self) -> bool:
+        return bool(_config.document_virus_scan_command)
+
+    async def feed(self, data: bytes):
+        if self.process is None:
+            self.process = await asyncio.create_subprocess_exec(
+                *shlex.split(_config.document_virus_scan_command),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+        self.process.stdin.write(data)
+        await self.process.stdin.drain()
+
+    async def finish(self) -> dict:
+        if self.process is None:
+            await self.feed(b"")
+        self.process.stdin.close()
+        output = await self.process.stdout.read()
+        await self.process.wait()
+        output = output.decode(errors="replace").strip()
+        if self.process.returncode == 1:
+            self.document_file.active = False
+            self.document_file.to_delete = True
+            return {"virus_scan": "infected", "virus_scan_output": output}
+        if self.process.returncode != 0:
+            raise RuntimeError(f"Virus scan failed: {output}")
+        return {"virus_scan": "clean"}
+
+    async def close(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.kill()
+            await self.process.wait()
+
+
+DOCUMENT_PROCESSORS: Dict[str, Type[DocumentProcessor]] = {
+    processor.name: processor
+    for processor in (
+        MimetypeProcessor,
+        ChecksumProcessor,
+        PdfPageCountProcessor,
+        VirusScanProcessor,
+    )
+}
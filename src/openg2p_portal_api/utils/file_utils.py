@@ -3,9 +3,12 @@ import mimetypes
 import os
 
 from openg2p_fastapi_common.errors.http_exceptions import BadRequestError
+from slugify import slugify as python_slugify
 from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from openg2p_portal_api.context import program_storage_cache
 from openg2p_portal_api.exception import handle_exception
 from openg2p_portal_api.models.orm.document_file_orm import DocumentFileORM
 from openg2p_portal_api.models.orm.document_store_orm import DocumentStoreORM
@@ -14,10 +17,9 @@ from openg2p_portal_api.models.orm.program_orm import ProgramORM
 
 # The methods below enable concurrent document uploads to Odoo and MinIO (S3-compatible).
 # - get_s3_backend_config
-# - create_or_update_tag
+# - create_tag_if_missing
 # - get_company_and_backend_id_by_programid
-# - get_file_id_by_slug
-# - update_slug_relative_path
+# - set_slug_relative_path
 # - compute_human_file_size
 # - human_size
 # - extract_filename
@@ -45,81 +47,47 @@ async def get_s3_backend_config(self, backend_id: int):
         return backend
 
 
-async def create_or_update_tag(self, tag_name: str):
+async def create_tag_if_missing(session: AsyncSession, tag_name: str):
     """
-    Checks for an existing tag; updates it if found, or creates a new tag if not.
+    Adds the tag to the session if no tag with this name exists.
+    The tag is saved with the caller's transaction.
     """
-    async with self.async_session_maker() as session:
-        try:
-            result = await session.execute(
-                select(DocumentTagORM).where(DocumentTagORM.name == tag_name)
-            )
-            existing_tag = result.scalars().first()
-
-            if existing_tag:
-                existing_tag.name = tag_name
-                await session.commit()
-                await session.refresh(existing_tag)
-            else:
-                new_tag = DocumentTagORM(name=tag_name)
-                session.add(new_tag)
-                await session.commit()
-                await session.refresh(new_tag)
-
-        except SQLAlchemyError as e:
-            await session.rollback()
-            handle_exception(e, "Error creating or updating tag")
+    try:
+        result = await session.execute(
+            select(DocumentTagORM.id).where(DocumentTagORM.name == tag_name).limit(1)
+        )
+        if result.scalar() is None:
+            session.add(DocumentTagORM(name=tag_name))
+    except SQLAlchemyError as e:
+        handle_exception(e, "Error creating tag")
 
 
 async def get_company_and_backend_id_by_programid(self, programid: int):
     """
     Fetch the company_id and backend_id from the ProgramORM using the provided programid.
+    The result is cached, unknown programs are not.
     """
-    async with self.async_session_maker() as session:
-        result = await session.execute(select(ProgramORM).filter_by(id=programid))
-        program = result.scalars().first()
-        if program:
-            return program.company_id, program.supporting_documents_store
-        else:
-            return None, None
 
+    async def load():
+        async with self.async_session_maker() as session:
+            result = await session.execute(
+                select(
+                    ProgramORM.company_id, ProgramORM.supporting_documents_store
+                ).where(ProgramORM.id == programid)
+            )
+            row = result.first()
+            return tuple(row) if row else None
 
-async def get_file_id_by_slug(self):
-    """
-    Update the document's slug and relative path in the database after it is uploaded.
-    """
-    async with self.async_session_maker() as session:
-        result = await session.execute(
-            select(DocumentFileORM)
-            .where(DocumentFileORM.slug.is_(None))
-            .order_by(DocumentFileORM.id.desc())
-            .limit(1)
-        )
-        document_file = result.scalars().first()
-        if document_file:
-            return document_file.id
-        else:
-            return None
+    return await program_storage_cache.get_or_load(programid, load) or (None, None)
 
 
-async def update_slug_relative_path(self, file_id: int, slug: str):
+def set_slug_relative_path(document_file: DocumentFileORM):
     """
-    Updates the slug and relative path of a document file identified by its ID.
+    Sets the slug and relative path of a document file from its name and ID.
+    The ID must be known, i.e. the file must have been flushed.
     """
-    async with self.async_session_maker() as session:
-        async with session.begin():
-            result = await session.execute(
-                select(DocumentFileORM).where(DocumentFileORM.id == file_id)
-            )
-            document_file = result.scalars().first()
-            if document_file:
-                document_file.slug = slug
-                document_file.relative_path = slug
-                await session.commit()
-            else:
-                handle_exception(
-                    Exception(f"Document file with ID {file_id} not found.")
-                )
+    document_file.slug = f"{python_slugify(document_file.name)}-{document_file.id}"
+    document_file.relative_path = document_file.slug
 
 
 def compute_human_file_size(document_file: DocumentFileORM):
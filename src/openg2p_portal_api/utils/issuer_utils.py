@@ -0,0 +1,83 @@
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+
+def normalize_issuer(iss: Optional[str]) -> str:
+    """
+    Lowercases the scheme and host of an issuer URL and drops any trailing slash,
+    query and fragment.
+    """
+    iss = (iss or "").strip()
+    parts = urlsplit(iss)
+    if not (parts.scheme and parts.netloc):
+        return iss.rstrip("/")
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path}".rstrip("/")
+
+
+def get_issuer_candidates(url: Optional[str]) -> List[str]:
+    """
+    Returns the issuers a provider endpoint can belong to: the origin of the URL
+    and each of its path prefixes, shortest first. Issuers are a prefix of the
+    endpoints, e.g. https://host/realms/a for https://host/realms/a/protocol/...
+    """
+    base = normalize_issuer(url)
+    if "://" not in base:
+        return []
+    scheme, rest = base.split("://", 1)
+    origin, *path = rest.split("/")
+    candidates = [f"{scheme}://{origin}"]
+    for segment in path:
+        candidates.append(f"{candidates[-1]}/{segment}")
+    return candidates
+
+
+class IssuerRegistry:
+    """
+    Process wide index of the issuers of the auth providers, from the normalized
+    issuer to the provider id. Rebuilt as a whole when the providers change.
+
+    Issuers are derived from the token endpoint and the jwks uri of each provider.
+    When several providers share an issuer, the one with the lowest id wins.
+    Explicit issuers take precedence over the derived ones.
+    """
+
+    def __init__(self):
+        self.issuers: Dict[str, int] = {}
+        self.version: Any = None
+        self.checked_at: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.checked_at is not None
+
+    def is_stale(self, check_interval: float) -> bool:
+        return not self.loaded or time.monotonic() - self.checked_at >= check_interval
+
+    def mark_checked(self):
+        self.checked_at = time.monotonic()
+
+    def resolve(self, iss: Optional[str]) -> Optional[int]:
+        return self.issuers.get(normalize_issuer(iss))
+
+    def load(self, providers: Iterable, version: Any, explicit: Dict[str, int] = None):
+        providers = sorted(providers, key=lambda provider: provider.id)
+        issuers = {}
+        for provider in providers:
+            for url in (provider.token_endpoint, provider.jwks_uri):
+                for candidate in get_issuer_candidates(url):
+                    issuers.setdefault(candidate, provider.id)
+        provider_ids = {provider.id for provider in providers}
+        for iss, provider_id in (explicit or {}).items():
+            if provider_id in provider_ids:
+                issuers[normalize_issuer(iss)] = provider_id
+
+        self.issuers = issuers
+        self.version = version
+        self.mark_checked()
+
+    def invalidate(self):
+        """
+        Makes the next lookup reload the registry.
+        """
+        self.checked_at = None
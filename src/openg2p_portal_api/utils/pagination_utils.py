@@ -0,0 +1,72 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from openg2p_fastapi_common.errors.http_exceptions import BadRequestError
+from sqlalchemy import and_, or_
+
+from openg2p_portal_api.config import Settings
+
+_config = Settings.get_config(strict=False)
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def get_page_size(limit: Optional[int], after: Optional[str] = None) -> Optional[int]:
+    """
+    Returns the requested page size, bounded by the configured maximum.
+    None, meaning all the rows, if neither a limit nor a cursor is given, as
+    clients from before pagination expect the full list.
+    """
+    if not limit or limit < 1:
+        return _config.details_page_size if after else None
+    return min(limit, _config.details_max_page_size)
+
+
+def encode_cursor(sort_value: Optional[datetime], id: int) -> str:
+    """
+    Encodes the sort key of the last row of a page into an opaque cursor.
+    """
+    payload = json.dumps([sort_value.isoformat() if sort_value else None, id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Optional[datetime], int]]:
+    if not cursor:
+        return None
+    try:
+        sort_value, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(sort_value) if sort_value else None, int(id))
+    except (binascii.Error, TypeError, ValueError):
+        raise BadRequestError(message="Invalid pagination cursor.") from None
+
+
+def keyset_after(sort_column, id_column, cursor: Tuple[Optional[datetime], int]):
+    """
+    Condition selecting the rows that come after the cursor, for rows ordered by
+    sort_column descending with nulls last, and then by id_column descending.
+    """
+    sort_value, id = cursor
+    if sort_value is None:
+        return and_(sort_column.is_(None), id_column < id)
+    return or_(
+        sort_column < sort_value,
+        and_(sort_column == sort_value, id_column < id),
+        sort_column.is_(None),
+    )
+
+
+def paginate(
+    rows: List[Any], limit: Optional[int], sort_key: str, id_key: str
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Splits rows fetched with limit + 1 into the page and the cursor of the next
+    page. The cursor is None on the last page, or if limit is None.
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_key), getattr(last, id_key))
@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+import boto3
+from botocore.config import Config as BotoConfig
+
+from openg2p_portal_api.config import Settings
+from openg2p_portal_api.exception import ServiceUnavailableError
+
+_config = Settings.get_config(strict=False)
+_logger = logging.getLogger(_config.logging_default_logger_name)
+
+# boto3 is blocking, so every S3 call runs on this bounded pool.
+_s3_executor: Optional[ThreadPoolExecutor] = None
+# backend_id -> semaphore, per event loop as asyncio primitives are bound to one.
+_backend_semaphores: "WeakKeyDictionary[Any, Dict[int, asyncio.Semaphore]]" = (
+    WeakKeyDictionary()
+)
+# backend_id -> (config hash, client). boto3 clients are thread safe, so one
+# client, with its connection pool, is shared by all uploads to a backend.
+_s3_clients: Dict[int, Tuple[str, Any]] = {}
+_s3_clients_lock = threading.Lock()
+
+# Only single byte ranges are passed on to S3, others are ignored (RFC 9110).
+_BYTE_RANGE_PATTERN = re.compile(r"^bytes=(\d+-\d*|-\d+)$")
+
+# S3 rejects multipart parts smaller than 5 MiB, except for the last one.
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def get_s3_executor() -> ThreadPoolExecutor:
+    global _s3_executor
+    if _s3_executor is None:
+        _s3_executor = ThreadPoolExecutor(
+            max_workers=_config.s3_executor_max_workers, thread_name_prefix="s3"
+        )
+    return _s3_executor
+
+
+def shutdown_s3_executor():
+    global _s3_executor
+    if _s3_executor is not None:
+        _s3_executor.shutdown(wait=False)
+        _s3_executor = None
+    invalidate_s3_clients()
+
+
+def get_s3_config_hash(server_env_defaults: dict) -> str:
+    return hashlib.sha1(
+        json.dumps(server_env_defaults, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def get_s3_client(backend_id: int, server_env_defaults: dict):
+    """
+    Returns the S3 client of a storage backend, creating it on first use.
+    Backends are read from the db on every use, so the client is recreated when
+    the hash of their configuration changes. The replaced client is closed.
+
+    Blocking, run it with run_in_s3_executor.
+    """
+    config_hash = get_s3_config_hash(server_env_defaults)
+    with _s3_clients_lock:
+        entry = _s3_clients.get(backend_id)
+        if entry and entry[0] == config_hash:
+            return entry[1]
+        # A session per client, the default boto3 session is not thread safe.
+        s3_client = boto3.session.Session().client(
+            "s3",
+            endpoint_url=server_env_defaults.get("x_aws_host_env_default"),
+            aws_access_key_id=server_env_defaults.get(
+                "x_aws_access_key_id_env_default"
+            ),
+            aws_secret_access_key=server_env_defaults.get(
+                "x_aws_secret_access_key_env_default"
+            ),
+            region_name=server_env_defaults.get("x_aws_region_env_default"),
+            config=BotoConfig(
+                max_pool_connections=_config.s3_max_pool_connections,
+                tcp_keepalive=_config.s3_tcp_keepalive,
+                connect_timeout=_config.s3_connect_timeout,
+                read_timeout=_config.s3_read_timeout,
+                retries={"max_attempts": _config.s3_max_attempts, "mode": "standard"},
+            ),
+        )
+        _s3_clients[backend_id] = (config_hash, s3_client)
+    if entry:
+        close_s3_client(entry[1])
+    return s3_client
+
+
+def close_s3_client(s3_client):
+    """
+    Closes the connection pool of a client. Requests still running on it finish
+    on their connection, later requests open new connections.
+    """
+    try:
+        s3_client.close()
+    except Exception:
+        _logger.exception("Error while closing an S3 client")
+
+
+def invalidate_s3_clients(backend_id: Optional[int] = None):
+    """
+    Drops and closes the cached S3 client of the given backend, or of all backends.
+    """
+    with _s3_clients_lock:
+        if backend_id is None:
+            entries = list(_s3_clients.values())
+            _s3_clients.clear()
+        else:
+            entries = [_s3_clients.pop(backend_id, None)]
+    for entry in entries:
+        if entry:
+            close_s3_client(entry[1])
+
+
+async def run_in_s3_executor(func: Callable, *args, **kwargs) -> Any:
+    """
+    Runs a blocking S3 call on the S3 executor without blocking the event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        get_s3_executor(), partial(func, *args, **kwargs)
+    )
+
+
+@asynccontextmanager
+async def s3_backend_slot(backend_id: int):
+    """
+    Limits the number of concurrent transfers to one storage backend, so that a
+    slow backend cannot take all the S3 executor threads.
+    Raises ServiceUnavailableError, with Retry-After, if no slot is freed within
+    the configured timeout.
+    """
+    semaphores = _backend_semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = semaphores.get(backend_id)
+    if semaphore is None:
+        semaphore = semaphores[backend_id] = asyncio.Semaphore(
+            _config.s3_max_concurrent_transfers_per_backend
+        )
+    try:
+        await asyncio.wait_for(
+            semaphore.acquire(), timeout=_config.s3_backend_wait_timeout
+        )
+    except asyncio.TimeoutError:
+        raise ServiceUnavailableError(
+            message=f"The storage backend {backend_id} is busy. Try again later.",
+            headers={
+                "Retry-After": str(max(math.ceil(_config.s3_backend_wait_timeout), 1))
+            },
+        ) from None
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def parse_byte_range(range_header: Optional[str]) -> Optional[str]:
+    """
+    Returns the Range header if it is a single byte range, None otherwise.
+    """
+    if range_header and _BYTE_RANGE_PATTERN.match(range_header.strip()):
+        return range_header.strip()
+    return None
+
+
+async def iter_s3_body(body, chunk_size: int) -> AsyncIterator[bytes]:
+    """
+    Yields the body of a get_object response chunk by chunk, reading it on the
+    S3 executor. The body is closed when done, or when the client goes away.
+    """
+    try:
+        while True:
+            chunk = await run_in_s3_executor(body.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        body.close()
+
+
+class S3MultipartUploader:
+    """
+    Writes an object to S3 from a stream of chunks, keeping at most one part in
+    memory. The SHA-1 checksum and the size are computed while writing.
+
+    Objects smaller than one part are uploaded with a single put_object call;
+    a multipart upload is only started once the first part is full.
+
+    The methods are blocking, run them with run_in_s3_executor.
+    """
+
+    def __init__(
+        self, s3_client, bucket: str, key: str, part_size: Optional[int] = None
+    ):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(
+            part_size or _config.document_upload_part_size, S3_MIN_PART_SIZE
+        )
+        self.size = 0
+        self._sha1 = hashlib.sha1()
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[dict] = []
+
+    @property
+    def checksum(self) -> str:
+        return self._sha1.hexdigest()
+
+    def write(self, data: bytes):
+        self._sha1.update(data)
+        self.size += len(data)
+        self._buffer.extend(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+
+    def complete(self) -> Tuple[int, str]:
+        """
+        Uploads what is left in the buffer and completes the upload.
+        Returns the size and the checksum of the object.
+        """
+        if self._upload_id is None:
+            self.s3_client.put_object(
+                Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer)
+            )
+        else:
+            if self._buffer:
+                self._upload_part()
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        self._buffer = bytearray()
+        return self.size, self.checksum
+
+    def abort(self):
+        self._buffer = bytearray()
+        if self._upload_id is not None:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+            self._upload_id = None
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            self._upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key
+            )["UploadId"]
+        part_number = len(self._parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=bytes(self._buffer),
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self._buffer = bytearray()
@@ -0,0 +1,547 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from functools import partial
+from typing import AsyncIterator, Dict, Optional, Tuple, Type
+from urllib.parse import quote
+
+from botocore.exceptions import ClientError
+from fastapi import Response
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from openg2p_fastapi_common.errors.http_exceptions import (
+    BadRequestError,
+    NotFoundError,
+)
+
+from openg2p_portal_api.config import Settings
+from openg2p_portal_api.exception import handle_exception
+from openg2p_portal_api.utils.s3_utils import (
+    S3_MIN_PART_SIZE,
+    S3MultipartUploader,
+    get_s3_client,
+    iter_s3_body,
+    parse_byte_range,
+    run_in_s3_executor,
+    s3_backend_slot,
+)
+
+_config = Settings.get_config(strict=False)
+_logger = logging.getLogger(_config.logging_default_logger_name)
+
+
+class StorageEngine(ABC):
+    """
+    Reads and writes the files of one storage backend (storage_backend row).
+    Files are addressed by their relative_path on the backend.
+    """
+
+    backend_type: str = None
+    # Smallest part of a multipart upload, except for the last one.
+    min_part_size: int = 1
+    # S3 allows at most 10000 parts per upload.
+    max_parts: int = 10000
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.server_env_defaults = backend.server_env_defaults
+
+    def get_relative_path(self, slug: str) -> str:
+        """
+        Returns the relative path under which a new file is stored.
+        """
+        return slug
+
+    @abstractmethod
+    async def write(
+        self, file, relative_path: str, first_chunk: Optional[bytes] = None
+    ) -> Tuple[int, str]:
+        """
+        Streams the file to the storage, chunk by chunk.
+        first_chunk is the part of the file already read by the caller, if any.
+
+        Returns the size and the SHA-1 checksum of the stored file.
+        """
+
+    @abstractmethod
+    async def download(
+        self,
+        relative_path: str,
+        name: str,
+        mimetype: Optional[str] = None,
+        range_header: Optional[str] = None,
+    ) -> Response:
+        """
+        Returns the response serving the stored file. A single byte range in
+        range_header is served as a partial response.
+        """
+
+    @abstractmethod
+    async def read(self, relative_path: str) -> AsyncIterator[bytes]:
+        """
+        Yields the content of the stored file, chunk by chunk.
+        """
+
+    @abstractmethod
+    async def create_multipart(self, relative_path: str) -> str:
+        """
+        Starts a multipart upload, whose parts can be written in any order and
+        written again. Returns the upload id.
+        """
+
+    @abstractmethod
+    async def write_part(
+        self, relative_path: str, upload_id: str, part_number: int, data: bytes
+    ) -> str:
+        """
+        Stores one part of a multipart upload. Returns the ETag of the part.
+        """
+
+    @abstractmethod
+    async def complete_multipart(
+        self, relative_path: str, upload_id: str, parts: Dict[int, str]
+    ) -> Optional[str]:
+        """
+        Assembles the parts, given as {part number: ETag}, into the file.
+        Returns the SHA-1 checksum of the file, if the engine can compute it.
+        """
+
+    @abstractmethod
+    async def abort_multipart(self, relative_path: str, upload_id: str):
+        """
+        Drops the parts of a multipart upload.
+        """
+
+    @abstractmethod
+    async def delete(self, relative_path: str):
+        """
+        Deletes the stored file, if it exists.
+        """
+
+    @staticmethod
+    async def read_first_chunk(file, first_chunk: Optional[bytes]) -> bytes:
+        if first_chunk is not None:
+            return first_chunk
+        if file.file is None:
+            raise BadRequestError(
+                message="The file object is empty or not readable."
+            ) from None
+        await file.seek(0)
+        return await file.read(_config.document_upload_chunk_size)
+
+    @staticmethod
+    def content_disposition(name: str) -> str:
+        return "attachment; filename*=UTF-8''" + quote(name)
+
+
+class S3StorageEngine(StorageEngine):
+    """
+    Stores files in an S3-compatible storage (e.g., MinIO). Uploads are sent in
+    parts and downloads are proxied or redirected to a presigned URL.
+    """
+
+    backend_type = "amazon_s3"
+    min_part_size = S3_MIN_PART_SIZE
+
+    @property
+    def bucket_name(self) -> str:
+        return self.server_env_defaults.get("x_aws_bucket_env_default")
+
+    async def get_client(self):
+        # Reuse the backend's S3 client and its open connections
+        return await run_in_s3_executor(
+            get_s3_client, self.backend.id, self.server_env_defaults
+        )
+
+    async def write(
+        self, file, relative_path: str, first_chunk: Optional[bytes] = None
+    ) -> Tuple[int, str]:
+        chunk = await self.read_first_chunk(file, first_chunk)
+        async with s3_backend_slot(self.backend.id):
+            uploader = None
+            try:
+                s3_client = await self.get_client()
+                # Upload file to S3, one part at a time
+                uploader = S3MultipartUploader(
+                    s3_client, self.bucket_name, relative_path
+                )
+                while chunk:
+                    await run_in_s3_executor(uploader.write, chunk)
+                    chunk = await file.read(_config.document_upload_chunk_size)
+                return await run_in_s3_executor(uploader.complete)
+            except ClientError as e:
+                await self._abort_upload(uploader)
+                handle_exception(e, "Client error occurred")
+            except Exception as e:
+                await self._abort_upload(uploader)
+                handle_exception(
+                    e, f"Unexpected error while uploading file {relative_path}"
+                )
+
+    async def download(
+        self,
+        relative_path: str,
+        name: str,
+        mimetype: Optional[str] = None,
+        range_header: Optional[str] = None,
+    ) -> Response:
+        content_disposition = self.content_disposition(name)
+        download_mode = (
+            self.server_env_defaults.get("x_download_mode_env_default")
+            or _config.document_download_mode
+        )
+        try:
+            s3_client = await self.get_client()
+            if download_mode == "presigned":
+                url = await run_in_s3_executor(
+                    s3_client.generate_presigned_url,
+                    "get_object",
+                    Params={
+                        "Bucket": self.bucket_name,
+                        "Key": relative_path,
+                        "ResponseContentDisposition": content_disposition,
+                        "ResponseContentType": mimetype or "application/octet-stream",
+                    },
+                    ExpiresIn=_config.document_presigned_url_expiry,
+                )
+                return RedirectResponse(url, status_code=307)
+
+            byte_range = parse_byte_range(range_header)
+            async with s3_backend_slot(self.backend.id):
+                s3_object = await run_in_s3_executor(
+                    s3_client.get_object,
+                    Bucket=self.bucket_name,
+                    Key=relative_path,
+                    **({"Range": byte_range} if byte_range else {}),
+                )
+        except ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code")
+            if error_code == "InvalidRange":
+                raise BadRequestError(
+                    code="G2P-REQ-416",
+                    message="Requested range not satisfiable",
+                    http_status_code=416,
+                ) from None
+            if error_code in ("NoSuchKey", "404"):
+                raise NotFoundError(message="Document not found") from None
+            handle_exception(e, "Client error occurred")
+
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": content_disposition,
+            "Content-Length": str(s3_object["ContentLength"]),
+        }
+        if s3_object.get("ETag"):
+            headers["ETag"] = s3_object["ETag"]
+        if s3_object.get("ContentRange"):
+            headers["Content-Range"] = s3_object["ContentRange"]
+        return StreamingResponse(
+            iter_s3_body(s3_object["Body"], _config.document_download_chunk_size),
+            status_code=206 if s3_object.get("ContentRange") else 200,
+            media_type=mimetype or "application/octet-stream",
+            headers=headers,
+        )
+
+    async def read(self, relative_path: str) -> AsyncIterator[bytes]:
+        try:
+            s3_client = await self.get_client()
+            async with s3_backend_slot(self.backend.id):
+                s3_object = await run_in_s3_executor(
+                    s3_client.get_object, Bucket=self.bucket_name, Key=relative_path
+                )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise NotFoundError(message="Document not found") from None
+            handle_exception(e, "Client error occurred")
+        async for chunk in iter_s3_body(
+            s3_object["Body"], _config.document_upload_chunk_size
+        ):
+            yield chunk
+
+    async def create_multipart(self, relative_path: str) -> str:
+        try:
+            s3_client = await self.get_client()
+            response = await run_in_s3_executor(
+                s3_client.create_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=relative_path,
+            )
+        except ClientError as e:
+            handle_exception(e, "Client error occurred")
+        return response["UploadId"]
+
+    async def write_part(
+        self, relative_path: str, upload_id: str, part_number: int, data: bytes
+    ) -> str:
+        async with s3_backend_slot(self.backend.id):
+            try:
+                s3_client = await self.get_client()
+                response = await run_in_s3_executor(
+                    s3_client.upload_part,
+                    Bucket=self.bucket_name,
+                    Key=relative_path,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=data,
+                )
+            except ClientError as e:
+                handle_exception(e, "Client error occurred")
+        return response["ETag"]
+
+    async def complete_multipart(
+        self, relative_path: str, upload_id: str, parts: Dict[int, str]
+    ) -> Optional[str]:
+        try:
+            s3_client = await self.get_client()
+            await run_in_s3_executor(
+                s3_client.complete_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=relative_path,
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {"ETag": parts[part_number], "PartNumber": part_number}
+                        for part_number in sorted(parts)
+                    ]
+                },
+            )
+        except ClientError as e:
+            handle_exception(e, "Client error occurred")
+        # The object was never seen as a whole, its checksum is not known.
+        return None
+
+    async def abort_multipart(self, relative_path: str, upload_id: str):
+        try:
+            s3_client = await self.get_client()
+            await run_in_s3_executor(
+                s3_client.abort_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=relative_path,
+                UploadId=upload_id,
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                handle_exception(e, "Client error occurred")
+
+    async def delete(self, relative_path: str):
+        try:
+            s3_client = await self.get_client()
+            await run_in_s3_executor(
+                s3_client.delete_object, Bucket=self.bucket_name, Key=relative_path
+            )
+        except ClientError as e:
+            handle_exception(e, "Client error occurred")
+
+    async def _abort_upload(self, uploader: Optional[S3MultipartUploader]):
+        if not uploader:
+            return
+        try:
+            await run_in_s3_executor(uploader.abort)
+        except Exception:
+            _logger.warning("Failed to abort multipart upload of %s", uploader.key)
+
+
+class FilesystemStorageEngine(StorageEngine):
+    """
+    Stores files under the backend's directory, in directories sharded by the
+    hash of the slug. Files are written to a temporary file which is renamed
+    once complete, so readers never see partial files.
+    """
+
+    backend_type = "filesystem"
+
+    @property
+    def root(self) -> str:
+        root = (
+            self.server_env_defaults.get("x_directory_path_env_default")
+            or _config.storage_filesystem_root
+        )
+        if not root:
+            raise BadRequestError(
+                message=f"The backend {self.backend.id} has no directory path."
+            ) from None
+        return os.path.realpath(root)
+
+    def get_relative_path(self, slug: str) -> str:
+        digest = hashlib.sha1(slug.encode()).hexdigest()
+        return f"{digest[:2]}/{digest[2:4]}/{slug}"
+
+    def get_full_path(self, relative_path: str) -> str:
+        root = self.root
+        full_path = os.path.realpath(os.path.join(root, relative_path))
+        if os.path.commonpath([root, full_path]) != root:
+            raise BadRequestError(message="Invalid file path.") from None
+        return full_path
+
+    async def write(
+        self, file, relative_path: str, first_chunk: Optional[bytes] = None
+    ) -> Tuple[int, str]:
+        chunk = await self.read_first_chunk(file, first_chunk)
+        full_path = self.get_full_path(relative_path)
+        tmp_path = f"{full_path}.{uuid.uuid4().hex}.part"
+        loop = asyncio.get_running_loop()
+        sha1 = hashlib.sha1()
+        size = 0
+        try:
+            await loop.run_in_executor(
+                None, partial(os.makedirs, os.path.dirname(full_path), exist_ok=True)
+            )
+            tmp_file = await loop.run_in_executor(None, open, tmp_path, "wb")
+            try:
+                while chunk:
+                    sha1.update(chunk)
+                    size += len(chunk)
+                    await loop.run_in_executor(None, tmp_file.write, chunk)
+                    chunk = await file.read(_config.document_upload_chunk_size)
+                await loop.run_in_executor(None, tmp_file.flush)
+                await loop.run_in_executor(None, os.fsync, tmp_file.fileno())
+            finally:
+                await loop.run_in_executor(None, tmp_file.close)
+            await loop.run_in_executor(None, os.replace, tmp_path, full_path)
+        except Exception as e:
+            await loop.run_in_executor(None, self._remove, tmp_path)
+            handle_exception(e, f"Unexpected error while writing file {relative_path}")
+        return size, sha1.hexdigest()
+
+    async def download(
+        self,
+        relative_path: str,
+        name: str,
+        mimetype: Optional[str] = None,
+        range_header: Optional[str] = None,
+    ) -> Response:
+        full_path = self.get_full_path(relative_path)
+        exists = await asyncio.get_running_loop().run_in_executor(
+            None, os.path.isfile, full_path
+        )
+        if not exists:
+            raise NotFoundError(message="Document not found") from None
+        # FileResponse answers Range requests itself, and hands the file to the
+        # server for zero-copy sending when it supports http.response.pathsend.
+        return FileResponse(
+            full_path,
+            media_type=mimetype or "application/octet-stream",
+            filename=name,
+        )
+
+    async def read(self, relative_path: str) -> AsyncIterator[bytes]:
+        full_path = self.get_full_path(relative_path)
+        loop = asyncio.get_running_loop()
+        try:
+            stored_file = await loop.run_in_executor(None, open, full_path, "rb")
+        except FileNotFoundError:
+            raise NotFoundError(message="Document not found") from None
+        try:
+            while True:
+                chunk = await loop.run_in_executor(
+                    None, stored_file.read, _config.document_upload_chunk_size
+                )
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await loop.run_in_executor(None, stored_file.close)
+
+    async def create_multipart(self, relative_path: str) -> str:
+        # The parts are written next to the file, in a directory of the upload.
+        self.get_full_path(relative_path)
+        return uuid.uuid4().hex
+
+    async def write_part(
+        self, relative_path: str, upload_id: str, part_number: int, data: bytes
+    ) -> str:
+        parts_dir = self._get_parts_dir(relative_path, upload_id)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._write_part, parts_dir, part_number, data
+            )
+        except OSError as e:
+            handle_exception(e, f"Unexpected error while writing file {relative_path}")
+
+    async def complete_multipart(
+        self, relative_path: str, upload_id: str, parts: Dict[int, str]
+    ) -> Optional[str]:
+        full_path = self.get_full_path(relative_path)
+        parts_dir = self._get_parts_dir(relative_path, upload_id)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._join_parts, full_path, parts_dir, sorted(parts)
+            )
+        except OSError as e:
+            handle_exception(e, f"Unexpected error while writing file {relative_path}")
+
+    async def abort_multipart(self, relative_path: str, upload_id: str):
+        parts_dir = self._get_parts_dir(relative_path, upload_id)
+        await asyncio.get_running_loop().run_in_executor(
+            None, partial(shutil.rmtree, parts_dir, ignore_errors=True)
+        )
+
+    async def delete(self, relative_path: str):
+        full_path = self.get_full_path(relative_path)
+        await asyncio.get_running_loop().run_in_executor(None, self._remove, full_path)
+
+    def _get_parts_dir(self, relative_path: str, upload_id: str) -> str:
+        if not upload_id.isalnum():
+            raise BadRequestError(message="Invalid upload id.") from None
+        return f"{self.get_full_path(relative_path)}.{upload_id}.parts"
+
+    @staticmethod
+    def _write_part(parts_dir: str, part_number: int, data: bytes) -> str:
+        os.makedirs(parts_dir, exist_ok=True)
+        part_path = os.path.join(parts_dir, str(part_number))
+        tmp_path = f"{part_path}.{uuid.uuid4().hex}.part"
+        with open(tmp_path, "wb") as part_file:
+            part_file.write(data)
+            part_file.flush()
+            os.fsync(part_file.fileno())
+        os.replace(tmp_path, part_path)
+        return hashlib.sha1(data).hexdigest()
+
+    @classmethod
+    def _join_parts(cls, full_path: str, parts_dir: str, part_numbers) -> str:
+        sha1 = hashlib.sha1()
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        tmp_path = f"{full_path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(tmp_path, "wb") as tmp_file:
+                for part_number in part_numbers:
+                    with open(os.path.join(parts_dir, str(part_number)), "rb") as part:
+                        while True:
+                            block = part.read(_config.document_upload_chunk_size)
+                            if not block:
+                                break
+                            sha1.update(block)
+                            tmp_file.write(block)
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            cls._remove(tmp_path)
+            raise
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        return sha1.hexdigest()
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+STORAGE_ENGINES: Dict[str, Type[StorageEngine]] = {
+    engine.backend_type: engine for engine in (S3StorageEngine, FilesystemStorageEngine)
+}
+
+
+def get_storage_engine(backend) -> Optional[StorageEngine]:
+    """
+    Returns the storage engine of the backend, None if its type is not supported.
+    """
+    engine = STORAGE_ENGINES.get(
+        backend.server_env_defaults.get("x_backend_type_env_default")
+    )
+    return engine(backend) if engine else None
@@ -0,0 +1,267 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from openg2p_portal_api.context import auth_id_type_config_cache, auth_issuer_registry
+from openg2p_portal_api.models.orm.auth_oauth_provider import (
+    AuthOauthProviderORM,
+    _config,
+)
+from openg2p_portal_api.models.token_map import TokenMap
+from openg2p_portal_api.utils.issuer_utils import get_issuer_candidates
+from pydantic import ValidationError
+
+PROVIDERS = [
+    SimpleNamespace(
+        id=1,
+        token_endpoint="https://auth.example.com/realms/ab/protocol/openid-connect/token",
+        jwks_uri=None,
+    ),
+    SimpleNamespace(
+        id=2,
+        token_endpoint="https://auth.example.com/realms/a/protocol/openid-connect/token",
+        jwks_uri="https://keys.example.com/a/certs",
+    ),
+    SimpleNamespace(
+        id=3, token_endpoint="https://other.example.com/oauth/token", jwks_uri=None
+    ),
+]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    auth_id_type_config_cache.invalidate()
+    auth_issuer_registry.load([], None)
+    auth_issuer_registry.invalidate()
+    yield
+    auth_id_type_config_cache.invalidate()
+    auth_issuer_registry.load([], None)
+    auth_issuer_registry.invalidate()
+
+
+@pytest.fixture
+def mock_registry_orm():
+    with patch.object(
+        AuthOauthProviderORM,
+        "get_providers_version",
+        new_callable=AsyncMock,
+        return_value=(None, 3),
+    ) as get_version, patch.object(
+        AuthOauthProviderORM,
+        "get_all",
+        new_callable=AsyncMock,
+        return_value=PROVIDERS,
+    ) as get_all, patch.object(
+        AuthOauthProviderORM,
+        "get_by_id",
+        new_callable=AsyncMock,
+        side_effect=lambda provider_id: SimpleNamespace(id=provider_id),
+    ):
+        yield get_version, get_all
+
+
+@pytest.fixture
+def mock_provider():
+    return MagicMock(
+        g2p_id_type=1,
+        token_map="sub:user_id name:name",
+        date_format="%Y/%m/%d",
+        company_id=1,
+    )
+
+
+class TestAuthOauthProviderORM:
+    @pytest.mark.asyncio
+    async def test_get_auth_id_type_config_is_cached(
+        self, mock_registry_orm, mock_provider
+    ):
+        with patch.object(
+            AuthOauthProviderORM,
+            "get_auth_provider_from_iss",
+            new_callable=AsyncMock,
+            return_value=mock_provider,
+        ) as get_from_iss:
+            first = await AuthOauthProviderORM.get_auth_id_type_config(iss="issuer")
+            second = await AuthOauthProviderORM.get_auth_id_type_config(iss="issuer")
+
+        assert first == second, "Cached config should match the loaded config"
+        assert first["g2p_id_type"] == 1, "ID type should be taken from the provider"
+        assert first["token_map"] == TokenMap.compile(
+            "sub:user_id name:name"
+        ), "The token map should be cached compiled"
+        get_from_iss.assert_awaited_once_with("issuer")
+
+    @pytest.mark.asyncio
+    async def test_invalidate_auth_id_type_config(
+        self, mock_registry_orm, mock_provider
+    ):
+        with patch.object(
+            AuthOauthProviderORM,
+            "get_by_id",
+            new_callable=AsyncMock,
+            return_value=mock_provider,
+        ) as get_by_id:
+            await AuthOauthProviderORM.get_auth_id_type_config(id=1)
+            AuthOauthProviderORM.invalidate_auth_id_type_config(id=1)
+            await AuthOauthProviderORM.get_auth_id_type_config(id=1)
+
+        assert get_by_id.await_count == 2, "Invalidated config should be reloaded"
+
+    @pytest.mark.asyncio
+    async def test_provider_change_reloads_auth_id_type_config(
+        self, mock_registry_orm, mock_provider
+    ):
+        get_version, _ = mock_registry_orm
+
+        with patch.object(
+            _config, "auth_issuer_registry_check_interval", 0
+        ), patch.object(
+            AuthOauthProviderORM,
+            "get_by_id",
+            new_callable=AsyncMock,
+            return_value=mock_provider,
+        ) as get_by_id:
+            await AuthOauthProviderORM.get_auth_id_type_config(id=1)
+            await AuthOauthProviderORM.get_auth_id_type_config(id=1)
+            assert get_by_id.await_count == 1, "Unchanged config should be cached"
+
+            get_version.return_value = (None, 4)
+            await AuthOauthProviderORM.get_auth_id_type_config(id=1)
+
+        assert get_by_id.await_count == 2, "Changed providers should reload configs"
+
+    @pytest.mark.asyncio
+    async def test_get_auth_id_type_config_not_configured(self, mock_registry_orm):
+        with patch.object(
+            AuthOauthProviderORM,
+            "get_by_id",
+            new_callable=AsyncMock,
+            return_value=MagicMock(g2p_id_type=None),
+        ) as get_by_id:
+            assert await AuthOauthProviderORM.get_auth_id_type_config(id=1) is None
+            assert await AuthOauthProviderORM.get_auth_id_type_config(id=1) is None
+
+        assert get_by_id.await_count == 2, "Missing configs should not be cached"
+
+    @pytest.mark.parametrize(
+        "mapping, expected",
+        [
+            (None, {}),
+            ("sub:user_id name:name", {"user_id": "123", "name": "Jane"}),
+            (
+                " sub:user_id missing:email *:* ",
+                {
+                    "sub": "123",
+                    "name": "Jane",
+                    "address": {"locality": "Town", "zip": "0042"},
+                    "age": "42",
+                    "verified": "true",
+                    "user_id": "123",
+                    "email": "",
+                },
+            ),
+            (
+                "address.locality:city address.zip:zip:int address.street:street",
+                {"city": "Town", "zip": 42, "street": ""},
+            ),
+            (
+                "age:age:int verified:verified:bool address:address:json name:name:int",
+                {
+                    "age": 42,
+                    "verified": True,
+                    "address": '{"locality":"Town","zip":"0042"}',
+                    "name": "Jane",
+                },
+            ),
+            ("sub:urn:id", {"urn:id": "123"}),
+        ],
+    )
+    def test_map_validation_response(self, mapping, expected):
+        claims = {
+            "sub": "123",
+            "name": "Jane",
+            "address": {"locality": "Town", "zip": "0042"},
+            "age": "42",
+            "verified": "true",
+        }
+
+        assert (
+            AuthOauthProviderORM.map_validation_response(claims, mapping) == expected
+        ), f"{mapping} should map the claims to {expected}"
+        assert (
+            AuthOauthProviderORM.map_validation_response(
+                claims, TokenMap.compile(mapping)
+            )
+            == expected
+        ), "A compiled token map should map the claims the same way"
+        assert "user_id" not in claims, "The claims should not be modified"
+
+    def test_token_map_compiled_once(self):
+        token_map = TokenMap.compile("sub:user_id name:name *:*")
+
+        assert (
+            TokenMap.compile("sub:user_id name:name *:*") is token_map
+        ), "The same mapping should be compiled once"
+        assert token_map.claims == frozenset(
+            {"sub", "name", "*"}
+        ), "The claim names should be listed"
+        with pytest.raises(ValidationError):
+            token_map.passthrough = False
+
+    def test_get_issuer_candidates(self):
+        assert get_issuer_candidates("HTTPS://Auth.Example.com/realms/a/token/") == [
+            "https://auth.example.com",
+            "https://auth.example.com/realms",
+            "https://auth.example.com/realms/a",
+            "https://auth.example.com/realms/a/token",
+        ], "The origin and each path prefix should be candidates"
+        assert get_issuer_candidates(None) == [], "No endpoint, no candidates"
+        assert get_issuer_candidates("/token") == [], "Relative URLs are ignored"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "iss, provider_id",
+        [
+            ("https://auth.example.com/realms/a", 2),
+            ("https://auth.example.com/realms/ab/", 1),
+            ("https://AUTH.example.com/realms/a", 2),
+            ("https://keys.example.com/a", 2),
+            ("https://auth.example.com", 1),
+            ("https://explicit.example.com", 3),
+            ("realms/a", None),
+            ("https://auth.example.com/realms/abc", None),
+        ],
+    )
+    async def test_get_auth_provider_from_iss(
+        self, mock_registry_orm, iss, provider_id
+    ):
+        with patch.object(
+            _config, "auth_issuer_overrides", {"https://explicit.example.com": 3}
+        ):
+            provider = await AuthOauthProviderORM.get_auth_provider_from_iss(iss)
+
+        assert (
+            provider.id if provider else None
+        ) == provider_id, f"{iss} should resolve to provider {provider_id}"
+
+    @pytest.mark.asyncio
+    async def test_issuer_registry_refresh(self, mock_registry_orm):
+        get_version, get_all = mock_registry_orm
+
+        with patch.object(_config, "auth_issuer_registry_check_interval", 0):
+            await AuthOauthProviderORM.get_auth_provider_from_iss("https://a")
+            await AuthOauthProviderORM.get_auth_provider_from_iss("https://b")
+            assert get_all.await_count == 1, "Unchanged providers are not reloaded"
+
+            get_version.return_value = (None, 4)
+            await AuthOauthProviderORM.get_auth_provider_from_iss("https://c")
+            assert get_all.await_count == 2, "Changed providers should be reloaded"
+
+        await AuthOauthProviderORM.get_auth_provider_from_iss("https://d")
+        assert (
+            get_version.await_count == 3
+        ), "Changes should be checked at most every check interval"
+
+        AuthOauthProviderORM.invalidate_auth_id_type_config()
+        await AuthOauthProviderORM.get_auth_provider_from_iss("https://e")
+        assert get_all.await_count == 3, "An invalidated registry should be reloaded"
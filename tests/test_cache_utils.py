@@ -0,0 +1,104 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from openg2p_portal_api.utils.cache_utils import AsyncTTLCache
+
+
+class TestAsyncTTLCache:
+    def test_set_and_get(self):
+        cache = AsyncTTLCache(ttl=60)
+        cache.set("key", "value")
+        assert cache.get("key") == "value", "Cached value should be returned"
+        assert "key" in cache, "Cached key should be present"
+        assert cache.get("missing", "default") == "default"
+
+    def test_entries_expire(self):
+        cache = AsyncTTLCache(ttl=10)
+        with patch("openg2p_portal_api.utils.cache_utils.time.monotonic") as clock:
+            clock.return_value = 100.0
+            cache.set("key", "value")
+            clock.return_value = 109.0
+            assert cache.get("key") == "value", "Entry should live until its ttl"
+            clock.return_value = 110.0
+            assert cache.get("key") is None, "Entry should expire after its ttl"
+            assert len(cache) == 0, "Expired entry should be removed"
+
+    def test_size_is_bounded_lru(self):
+        cache = AsyncTTLCache(ttl=60, maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert "b" not in cache, "Least recently used entry should be evicted"
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert len(cache) == 2, "Cache should not grow beyond maxsize"
+
+    def test_none_is_not_cached(self):
+        cache = AsyncTTLCache(ttl=60)
+        cache.set("key", None)
+        assert "key" not in cache, "None values should not be cached"
+
+    def test_invalidate(self):
+        cache = AsyncTTLCache(ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.invalidate("a")
+        assert "a" not in cache and "b" in cache, "Only the given key is dropped"
+        cache.invalidate()
+        assert len(cache) == 0, "Invalidate without key should clear the cache"
+
+    @pytest.mark.asyncio
+    async def test_get_or_load_single_flight(self):
+        cache = AsyncTTLCache(ttl=60)
+        release = asyncio.Event()
+
+        async def load():
+            await release.wait()
+            return "value"
+
+        loader = AsyncMock(side_effect=load)
+        tasks = [
+            asyncio.create_task(cache.get_or_load("key", loader)) for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert results == ["value"] * 5, "All callers should get the loaded value"
+        loader.assert_awaited_once()
+        assert await cache.get_or_load("key", loader) == "value"
+        loader.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_get_or_load_error_is_not_cached(self):
+        cache = AsyncTTLCache(ttl=60)
+        loader = AsyncMock(side_effect=[ValueError("db down"), "value"])
+
+        with pytest.raises(ValueError):
+            await cache.get_or_load("key", loader)
+        assert await cache.get_or_load("key", loader) == "value"
+        assert loader.await_count == 2, "Failed loads should be retried"
+
+    @pytest.mark.asyncio
+    async def test_get_or_load_survives_cancelled_caller(self):
+        cache = AsyncTTLCache(ttl=60)
+        release = asyncio.Event()
+
+        async def load():
+            await release.wait()
+            return "value"
+
+        loader = AsyncMock(side_effect=load)
+        first = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == "value", "Other callers should get the loaded value"
+        assert first.cancelled(), "Only the cancelled caller should be cancelled"
+        assert cache.get("key") == "value", "Loaded value should be cached"
+        loader.assert_awaited_once()
@@ -0,0 +1,144 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from openg2p_portal_api.context import request_dbsession, request_session
+from openg2p_portal_api.dependencies import get_db_session
+from openg2p_portal_api.utils.db_utils import (
+    get_async_session,
+    release_request_session,
+    request_session_scope,
+    scoped_async_session,
+)
+
+
+@pytest.fixture
+def mock_sessions():
+    """
+    A session factory returning a new mock session on each call.
+    """
+    sessions = []
+
+    def new_session():
+        session = AsyncMock()
+        session.__aenter__.return_value = session
+        sessions.append(session)
+        return session
+
+    with patch(
+        "openg2p_portal_api.utils.db_utils.get_session_maker",
+        return_value=MagicMock(side_effect=new_session),
+    ):
+        yield sessions
+
+
+@pytest.fixture
+def mock_session_maker():
+    session = AsyncMock()
+    async_session = AsyncMock()
+    async_session.__aenter__.return_value = session
+    async_session.__aexit__.return_value = None
+    session_maker = MagicMock(return_value=async_session)
+    with patch(
+        "openg2p_portal_api.utils.db_utils.get_session_maker",
+        return_value=session_maker,
+    ):
+        yield session_maker, session
+
+
+class TestDbUtils:
+    @pytest.mark.asyncio
+    async def test_get_async_session_without_request_session(self, mock_session_maker):
+        session_maker, session = mock_session_maker
+
+        async with get_async_session() as result:
+            assert result is session, "Should open a session from the shared factory"
+        session_maker.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_get_async_session_reuses_unit_of_work(self, mock_session_maker):
+        session_maker, session = mock_session_maker
+
+        async with scoped_async_session() as unit_session:
+            async with get_async_session() as first:
+                pass
+            # A nested unit of work joins the enclosing one
+            async with scoped_async_session() as nested:
+                async with get_async_session() as second:
+                    pass
+
+        assert unit_session is session, "Unit of work should open a new session"
+        assert (
+            first is second is nested is unit_session
+        ), "All calls in a unit of work should share its session"
+        session_maker.assert_called_once()
+        assert request_dbsession.get() is None, "Unit of work session should be reset"
+
+    @pytest.mark.asyncio
+    async def test_get_async_session_outside_unit_of_work(self, mock_session_maker):
+        session_maker, _ = mock_session_maker
+
+        async with get_async_session():
+            pass
+        async with get_async_session():
+            pass
+
+        assert (
+            session_maker.call_count == 2
+        ), "Sessions should not be shared outside of a unit of work"
+
+    @pytest.mark.asyncio
+    async def test_request_session_is_opened_lazily(self, mock_sessions):
+        async with request_session_scope():
+            assert mock_sessions == [], "No session before the first ORM call"
+            async with get_async_session() as first:
+                pass
+            async with get_async_session() as second:
+                pass
+            assert first is second, "Calls of a request should share its session"
+
+            # Before slow I/O
+            await release_request_session()
+            first.close.assert_awaited_once()
+            async with get_async_session() as third:
+                pass
+
+        assert third is not first, "A released session should not be reused"
+        third.close.assert_awaited_once()
+        assert len(mock_sessions) == 2, "Sessions should only be opened when used"
+        assert request_session.get() is None, "Request scope should be reset"
+
+    @pytest.mark.asyncio
+    async def test_unit_of_work_releases_request_session(self, mock_sessions):
+        async with request_session_scope():
+            async with get_async_session() as request_session_:
+                pass
+            async with scoped_async_session() as unit_session:
+                request_session_.close.assert_awaited_once()
+                async with get_async_session() as inner:
+                    pass
+
+        assert (
+            inner is unit_session is not request_session_
+        ), "A unit of work should have its own session, after the request's one"
+
+    def test_request_dependency(self, mock_sessions):
+        app = FastAPI(dependencies=[Depends(get_db_session)])
+
+        @app.get("/")
+        async def endpoint():
+            async with get_async_session() as first:
+                pass
+            async with get_async_session() as second:
+                pass
+            return {"shared": first is second}
+
+        with TestClient(app) as client:
+            response = client.get("/")
+
+        assert response.json() == {
+            "shared": True
+        }, "The ORM calls of a request should share one session"
+        assert len(mock_sessions) == 1, "One session should be opened per request"
+        mock_sessions[0].close.assert_awaited_once()
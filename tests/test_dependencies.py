@@ -0,0 +1,189 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from jose import jwt
+from openg2p_fastapi_common.errors.http_exceptions import UnauthorizedError
+from openg2p_portal_api.context import auth_token_cache, partner_id_cache
+from openg2p_portal_api.dependencies import JwtBearerAuth
+from openg2p_portal_api.models.orm.auth_oauth_provider import AuthOauthProviderORM
+from openg2p_portal_api.models.orm.reg_id_orm import RegIDORM
+
+ID_TYPE_CONFIG = {"g2p_id_type": 1, "token_map": "sub:user_id"}
+
+
+@pytest.fixture(autouse=True)
+def clear_partner_id_cache():
+    partner_id_cache.invalidate()
+    auth_token_cache.invalidate()
+    yield
+    partner_id_cache.invalidate()
+    auth_token_cache.invalidate()
+
+
+def make_token(expires_in=None, **claims):
+    if expires_in is not None:
+        claims["exp"] = int(time.time()) + expires_in
+    return jwt.encode(claims, "secret", algorithm="HS256")
+
+
+def make_request(route_name="get_programs", expires_in=300, id_token_expires_in=None):
+    token = make_token(expires_in, iss="https://issuer.example.org", sub="user123")
+    cookies = {}
+    if id_token_expires_in is not None:
+        cookies["X-ID-Token"] = make_token(id_token_expires_in)
+    return SimpleNamespace(
+        scope={"route": SimpleNamespace(name=route_name)},
+        headers={"Authorization": f"Bearer {token}"},
+        cookies=cookies,
+    )
+
+
+@pytest.fixture
+def mock_credentials():
+    credentials = MagicMock()
+    credentials.iss = "https://issuer.example.org"
+    credentials.model_dump.return_value = {
+        "iss": "https://issuer.example.org",
+        "sub": "user123",
+        "credentials": "token",
+    }
+    return credentials
+
+
+@pytest.fixture
+def mock_auth(mock_credentials):
+    with patch(
+        "openg2p_fastapi_auth.dependencies.JwtBearerAuth.__call__",
+        new=AsyncMock(return_value=mock_credentials),
+    ), patch.object(
+        AuthOauthProviderORM,
+        "get_auth_id_type_config",
+        new=AsyncMock(return_value=ID_TYPE_CONFIG),
+    ), patch(
+        "openg2p_portal_api.dependencies.AuthCredentials"
+    ) as mock_auth_credentials:
+        yield mock_auth_credentials
+
+
+class TestJwtBearerAuth:
+    @pytest.mark.asyncio
+    async def test_partner_id_resolved_once(self, mock_auth):
+        with patch.object(
+            RegIDORM, "get_partner_id", new=AsyncMock(return_value=7)
+        ) as mock_get_partner:
+            await JwtBearerAuth()(MagicMock())
+            await JwtBearerAuth()(MagicMock())
+
+        mock_get_partner.assert_awaited_once_with(1, "user123")
+        assert (
+            mock_auth.call_args.kwargs["partner_id"] == 7
+        ), "Credentials should carry the resolved partner id"
+
+    @pytest.mark.asyncio
+    async def test_partner_not_found_is_not_cached(self, mock_auth):
+        with patch.object(
+            RegIDORM, "get_partner_id", new=AsyncMock(return_value=None)
+        ) as mock_get_partner:
+            for _ in range(2):
+                with pytest.raises(UnauthorizedError):
+                    await JwtBearerAuth()(MagicMock())
+
+        assert mock_get_partner.await_count == 2, "Misses should not be cached"
+
+    @pytest.mark.asyncio
+    async def test_cached_partner_id_skips_lookup(self, mock_auth):
+        RegIDORM.cache_partner_id(1, "user123", 9)
+        with patch.object(
+            RegIDORM, "get_partner_id", new=AsyncMock()
+        ) as mock_get_partner:
+            await JwtBearerAuth()(MagicMock())
+
+        mock_get_partner.assert_not_awaited()
+        assert (
+            mock_auth.call_args.kwargs["partner_id"] == 9
+        ), "Credentials should carry the cached partner id"
+
+
+class TestJwtBearerAuthTokenCache:
+    @pytest.mark.asyncio
+    async def test_same_token_verified_once(self, mock_auth):
+        request = make_request()
+        with patch.object(
+            RegIDORM, "get_partner_id_by_reg_id", new=AsyncMock(return_value=7)
+        ) as mock_get_partner_id:
+            first = await JwtBearerAuth()(request)
+            second = await JwtBearerAuth()(request)
+            # Another route with the same auth settings
+            third = await JwtBearerAuth()(
+                SimpleNamespace(
+                    scope={"route": SimpleNamespace(name="get_program_summary")},
+                    headers=request.headers,
+                    cookies=request.cookies,
+                )
+            )
+
+        mock_get_partner_id.assert_awaited_once_with(1, "user123")
+        assert mock_auth.call_count == 1, "Credentials should be built once"
+        assert (
+            first == second == third
+        ), "Cached credentials should be returned for the same token"
+
+    @pytest.mark.asyncio
+    async def test_failures_not_cached(self, mock_auth):
+        request = make_request()
+        with patch.object(
+            RegIDORM, "get_partner_id_by_reg_id", new=AsyncMock(return_value=None)
+        ) as mock_get_partner_id:
+            for _ in range(2):
+                with pytest.raises(UnauthorizedError):
+                    await JwtBearerAuth()(request)
+
+        assert mock_get_partner_id.await_count == 2, "Failures should not be cached"
+        assert len(auth_token_cache) == 0, "Nothing should be cached"
+
+    @pytest.mark.asyncio
+    async def test_token_without_exp_not_cached(self, mock_auth):
+        request = make_request(expires_in=None)
+        with patch.object(
+            RegIDORM, "get_partner_id_by_reg_id", new=AsyncMock(return_value=7)
+        ) as mock_get_partner_id:
+            await JwtBearerAuth()(request)
+            await JwtBearerAuth()(request)
+
+        assert (
+            mock_get_partner_id.await_count == 2
+        ), "Tokens without an expiry should be verified on every call"
+
+    @pytest.mark.parametrize(
+        "request_kwargs, expected_ttl",
+        [
+            ({"expires_in": 3600}, 60),
+            ({"expires_in": 10}, 10),
+            ({"expires_in": 3600, "id_token_expires_in": 20}, 20),
+        ],
+    )
+    def test_cache_ttl_capped_at_exp(self, request_kwargs, expected_ttl):
+        _, ttl = JwtBearerAuth().get_token_cache_key(make_request(**request_kwargs))
+
+        assert (
+            expected_ttl - 2 < ttl <= expected_ttl
+        ), "Credentials should not be cached past the expiry of the tokens"
+
+    @pytest.mark.parametrize(
+        "request_",
+        [
+            make_request(expires_in=-10),
+            make_request(route_name="unknown_route"),
+            SimpleNamespace(
+                scope={"route": SimpleNamespace(name="get_programs")},
+                headers={"Authorization": "Bearer not-a-jwt"},
+                cookies={},
+            ),
+        ],
+    )
+    def test_uncacheable_requests(self, request_):
+        assert (
+            JwtBearerAuth().get_token_cache_key(request_) is None
+        ), "Expired, unprotected or malformed tokens should not be cached"
@@ -56,7 +56,7 @@ class TestDiscoveryController:
             response == expected_response
         ), f"Expected response to be {expected_response}"
         mock_program_service.get_program_by_key_service.assert_awaited_once_with(
-            TEST_DATA["KEYWORD"]
+            TEST_DATA["KEYWORD"], page=None, pagesize=None
         )
 
     @pytest.mark.asyncio
@@ -71,7 +71,7 @@ class TestDiscoveryController:
 
         assert response == [], "Expected response to be an empty list"
         mock_program_service.get_program_by_key_service.assert_awaited_once_with(
-            TEST_DATA["NONEXISTENT_KEYWORD"]
+            TEST_DATA["NONEXISTENT_KEYWORD"], page=None, pagesize=None
         )
 
     @pytest.mark.asyncio
@@ -1,16 +1,24 @@
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
-from fastapi import UploadFile
+from fastapi import FastAPI, UploadFile
+from fastapi.testclient import TestClient
 from openg2p_fastapi_auth.models.credentials import AuthCredentials
 from openg2p_fastapi_common.errors.http_exceptions import (
     BadRequestError,
+    NotFoundError,
     UnauthorizedError,
 )
 from openg2p_portal_api.controllers.document_file_controller import (
     DocumentFileController,
+    _config,
+)
+from openg2p_portal_api.models.document_file import (
+    DocumentFile,
+    DocumentUploadResult,
+    DocumentUploadSession,
+    DocumentUploadSessionCreate,
 )
-from openg2p_portal_api.models.document_file import DocumentFile
 
 
 @pytest.fixture
@@ -20,6 +28,17 @@ def document_controller():
     return controller
 
 
+@pytest.fixture
+def client(document_controller):
+    app = FastAPI()
+    app.include_router(document_controller.router)
+    # The app settings, as registered first by the app before openg2p_fastapi_auth
+    with patch("openg2p_fastapi_auth.dependencies._config", _config), TestClient(
+        app, raise_server_exceptions=False
+    ) as client:
+        yield client
+
+
 @pytest.fixture
 def auth_credentials():
     return AuthCredentials(partner_id=1, credentials="test_token")
@@ -35,6 +54,11 @@ def mock_file():
     return MagicMock(spec=UploadFile)
 
 
+async def async_iter(items):
+    for item in items:
+        yield item
+
+
 class TestDocumentFileController:
     @pytest.mark.asyncio
     async def test_upload_document_success(
@@ -133,3 +157,190 @@ class TestDocumentFileController:
         assert (
             str(exc_info.value.detail) == "Failed to retrieve document by ID"
         ), "BadRequestError was not raised with the expected message."
+
+    @pytest.mark.asyncio
+    async def test_download_document_success(
+        self, document_controller, auth_credentials
+    ):
+        expected_response = MagicMock()
+        document_controller.file_service.download_document = AsyncMock(
+            return_value=expected_response
+        )
+
+        result = await document_controller.download_document(
+            1, auth_credentials, range="bytes=0-9"
+        )
+
+        assert result == expected_response, "The download response should be returned"
+        document_controller.file_service.download_document.assert_called_once_with(
+            1, auth_credentials.partner_id, range_header="bytes=0-9"
+        )
+
+    @pytest.mark.asyncio
+    async def test_download_document_not_found(
+        self, document_controller, auth_credentials
+    ):
+        document_controller.file_service.download_document = AsyncMock(
+            side_effect=NotFoundError(message="Document not found")
+        )
+
+        with pytest.raises(NotFoundError):
+            await document_controller.download_document(1, auth_credentials)
+
+    @pytest.mark.asyncio
+    async def test_download_document_failure(
+        self, document_controller, auth_credentials
+    ):
+        document_controller.file_service.download_document = AsyncMock(
+            side_effect=Exception()
+        )
+
+        with pytest.raises(BadRequestError) as exc_info:
+            await document_controller.download_document(1, auth_credentials)
+        assert (
+            str(exc_info.value.detail) == "File download failed!"
+        ), "BadRequestError was not raised with the expected message."
+
+    @pytest.mark.asyncio
+    async def test_upload_documents_success(
+        self, document_controller, auth_credentials, mock_file
+    ):
+        expected_response = [
+            DocumentUploadResult(
+                name="test.pdf", id=1, uploaded=True, message="File uploaded."
+            )
+        ]
+        document_controller.file_service.upload_documents = AsyncMock(
+            return_value=expected_response
+        )
+
+        result = await document_controller.upload_documents(
+            1, auth_credentials, "tag", [mock_file]
+        )
+
+        assert (
+            result == expected_response
+        ), "The results of each file should be returned"
+        document_controller.file_service.upload_documents.assert_called_once_with(
+            files=[mock_file],
+            programid=1,
+            file_tag="tag",
+            partner_id=auth_credentials.partner_id,
+        )
+
+    @pytest.mark.asyncio
+    async def test_upload_documents_unauthorized(
+        self, document_controller, unauthorized_credentials, mock_file
+    ):
+        with pytest.raises(UnauthorizedError):
+            await document_controller.upload_documents(
+                1, unauthorized_credentials, "tag", [mock_file]
+            )
+
+    @pytest.mark.asyncio
+    async def test_create_upload_session_success(
+        self, document_controller, auth_credentials
+    ):
+        expected_response = MagicMock(spec=DocumentUploadSession)
+        document_controller.file_service.create_upload_session = AsyncMock(
+            return_value=expected_response
+        )
+
+        result = await document_controller.create_upload_session(
+            1,
+            auth_credentials,
+            DocumentUploadSessionCreate(name="test.pdf", file_size=10, file_tag="tag"),
+        )
+
+        assert result == expected_response, "The upload session should be returned"
+        document_controller.file_service.create_upload_session.assert_called_once_with(
+            programid=1,
+            partner_id=auth_credentials.partner_id,
+            name="test.pdf",
+            file_size=10,
+            file_tag="tag",
+        )
+
+    @pytest.mark.asyncio
+    async def test_create_upload_session_unauthorized(
+        self, document_controller, unauthorized_credentials
+    ):
+        with pytest.raises(UnauthorizedError):
+            await document_controller.create_upload_session(
+                1,
+                unauthorized_credentials,
+                DocumentUploadSessionCreate(name="test.pdf", file_size=10),
+            )
+
+    @pytest.mark.asyncio
+    async def test_upload_chunk_success(self, document_controller, auth_credentials):
+        request = MagicMock()
+        request.stream = MagicMock(return_value=async_iter([b"01", b"23"]))
+        document_controller.file_service.get_upload_session = AsyncMock(
+            return_value=MagicMock(chunk_size=4)
+        )
+        document_controller.file_service.upload_chunk = AsyncMock()
+
+        # The chunk size of large files is above the configured one
+        with patch.object(_config, "document_upload_session_chunk_size", 1):
+            await document_controller.upload_chunk("abc", 2, auth_credentials, request)
+
+        document_controller.file_service.upload_chunk.assert_called_once_with(
+            "abc", auth_credentials.partner_id, 2, b"0123"
+        )
+
+    @pytest.mark.asyncio
+    async def test_upload_chunk_too_large(self, document_controller, auth_credentials):
+        request = MagicMock()
+        request.stream = MagicMock(return_value=async_iter([b"01", b"23"]))
+        document_controller.file_service.get_upload_session = AsyncMock(
+            return_value=MagicMock(chunk_size=3)
+        )
+        document_controller.file_service.upload_chunk = AsyncMock()
+
+        with pytest.raises(BadRequestError):
+            await document_controller.upload_chunk("abc", 1, auth_credentials, request)
+        document_controller.file_service.get_upload_session.assert_called_once_with(
+            "abc", auth_credentials.partner_id
+        )
+        document_controller.file_service.upload_chunk.assert_not_called()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "method",
+        ["get_upload_session", "complete_upload_session", "abort_upload_session"],
+    )
+    async def test_upload_session_actions(
+        self, document_controller, auth_credentials, unauthorized_credentials, method
+    ):
+        setattr(document_controller.file_service, method, AsyncMock())
+
+        await getattr(document_controller, method)("abc", auth_credentials)
+        with pytest.raises(UnauthorizedError):
+            await getattr(document_controller, method)("abc", unauthorized_credentials)
+
+        getattr(document_controller.file_service, method).assert_called_once_with(
+            "abc", auth_credentials.partner_id
+        )
+
+    @pytest.mark.parametrize(
+        "method, url",
+        [
+            ("GET", "/downloadDocument/1"),
+            ("POST", "/uploadDocuments/1"),
+            ("POST", "/uploadSessions/1"),
+            ("GET", "/uploadSession/abc"),
+            ("PUT", "/uploadSession/abc/chunks/1"),
+            ("POST", "/uploadSession/abc/complete"),
+            ("DELETE", "/uploadSession/abc"),
+        ],
+    )
+    def test_routes_require_auth(self, client, document_controller, method, url):
+        # Through the real JwtBearerAuth, which needs the auth_api_ setting
+        # of the route.
+        response = client.request(
+            method, url, headers={"Authorization": "Bearer invalid-token"}
+        )
+
+        assert response.status_code == 401, f"{method} {url} should need a valid token"
+        assert not document_controller.file_service.method_calls, "Nothing should run"
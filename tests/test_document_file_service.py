@@ -1,15 +1,50 @@
+import asyncio
+import hashlib
+import io
+import os
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import boto3
 import pytest
+from botocore.exceptions import ClientError
 from fastapi import UploadFile
-from openg2p_fastapi_common.errors.http_exceptions import BadRequestError
+from moto import mock_aws
+from openg2p_fastapi_common.errors.http_exceptions import (
+    BadRequestError,
+    NotFoundError,
+)
+from openg2p_portal_api.context import (
+    dbsession_maker,
+    program_storage_cache,
+    request_dbsession,
+)
 from openg2p_portal_api.models.document_file import DocumentFile
 from openg2p_portal_api.models.orm.document_file_orm import DocumentFileORM
+from openg2p_portal_api.models.orm.document_job_orm import DocumentJobORM
 from openg2p_portal_api.models.orm.document_store_orm import DocumentStoreORM
 from openg2p_portal_api.models.orm.document_tag_orm import DocumentTagORM
+from openg2p_portal_api.models.orm.document_upload_session_orm import (
+    DocumentUploadSessionORM,
+)
+from openg2p_portal_api.models.orm.program_membership_orm import ProgramMembershipORM
 from openg2p_portal_api.models.orm.program_orm import ProgramORM
-from openg2p_portal_api.services.document_file_service import DocumentFileService
-from sqlalchemy.ext.asyncio import AsyncSession
+from openg2p_portal_api.services.document_file_service import (
+    DocumentFileService,
+    _config,
+)
+from openg2p_portal_api.utils.s3_utils import (
+    S3MultipartUploader,
+    invalidate_s3_clients,
+)
+from openg2p_portal_api.utils.storage_utils import S3StorageEngine
+from openg2p_portal_api.services.document_job_service import DocumentJobService
+from openg2p_portal_api.services.membership_service import MembershipService
+from openg2p_portal_api.utils.db_utils import request_session_scope
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from tests.test_program_summary import create_tables
 
 TEST_CONSTANTS = {
     "PROGRAM_ID": 1,
@@ -19,10 +54,35 @@ TEST_CONSTANTS = {
     "DOCUMENT_ID": 1,
     "DOCUMENT_NOT_FOUND_ID": 999,
     "SUCCESS_MESSAGE": "File uploaded successfully.",
-    "FILESYSTEM_UNSUPPORTED_MESSAGE": "Uploading files via the filesystem is currently not supported.",
     "INVALID_BACKEND_MESSAGE": "Backend type should be either amazon_s3 or filesystem.",
     "EMPTY_CONTENT_ERROR": "Failed to upload document: Content must not be None.",
+    "S3_BUCKET": "test-bucket",
+    "S3_KEY": "test-pdf-1",
 }
+PROGRAM_STORAGE = (1, 1)
+UPLOAD_TABLES = [
+    ProgramORM,
+    ProgramMembershipORM,
+    DocumentStoreORM,
+    DocumentFileORM,
+    DocumentTagORM,
+    DocumentJobORM,
+]
+
+
+def get_added(mock_session, orm):
+    return [
+        call.args[0]
+        for call in mock_session.add.call_args_list
+        if isinstance(call.args[0], orm)
+    ]
+
+
+@pytest.fixture(autouse=True)
+def clear_program_storage_cache():
+    program_storage_cache.invalidate()
+    yield
+    program_storage_cache.invalidate()
 
 
 @pytest.fixture
@@ -51,13 +111,6 @@ def mock_file():
     return file
 
 
-@pytest.fixture
-def mock_program():
-    return ProgramORM(
-        id=TEST_CONSTANTS["PROGRAM_ID"], company_id=1, supporting_documents_store=1
-    )
-
-
 @pytest.fixture
 def mock_backend_s3():
     return DocumentStoreORM(
@@ -66,9 +119,33 @@ def mock_backend_s3():
 
 
 @pytest.fixture
-def mock_backend_filesystem():
+def mock_backend_s3_bucket():
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(
+            Bucket=TEST_CONSTANTS["S3_BUCKET"]
+        )
+        yield DocumentStoreORM(
+            id=1,
+            server_env_defaults={
+                "x_backend_type_env_default": "amazon_s3",
+                "x_aws_region_env_default": "us-east-1",
+                "x_aws_access_key_id_env_default": "testing",
+                "x_aws_secret_access_key_env_default": "testing",
+                "x_aws_bucket_env_default": TEST_CONSTANTS["S3_BUCKET"],
+            },
+        )
+    # Cached clients would outlive the mock.
+    invalidate_s3_clients()
+
+
+@pytest.fixture
+def mock_backend_filesystem(tmp_path):
     return DocumentStoreORM(
-        id=1, server_env_defaults={"x_backend_type_env_default": "filesystem"}
+        id=1,
+        server_env_defaults={
+            "x_backend_type_env_default": "filesystem",
+            "x_directory_path_env_default": str(tmp_path),
+        },
     )
 
 
@@ -121,109 +198,115 @@ class TestDocumentFileService:
         ), "Exception detail should indicate document not found"
 
     @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "size, parts",
+        [(0, 0), (1024, 0), (11 * 1024 * 1024, 2)],
+    )
     async def test_upload_s3_success(
-        self, document_service, mock_session, mock_file, mock_program, mock_backend_s3
+        self, document_service, mock_backend_s3_bucket, size, parts
     ):
-        mock_result = AsyncMock()
-        mock_result.scalars = MagicMock()
-        mock_result.scalars.return_value.first.side_effect = [
-            mock_program,
-            mock_backend_s3,
-        ]
-        mock_session.execute.return_value = mock_result
+        data = os.urandom(size)
+        upload = UploadFile(io.BytesIO(data), filename=TEST_CONSTANTS["DOCUMENT_NAME"])
+
+        with patch.object(
+            S3MultipartUploader,
+            "_upload_part",
+            autospec=True,
+            side_effect=S3MultipartUploader._upload_part,
+        ) as mock_upload_part:
+            file_size, checksum = await document_service.s3_storage_system(
+                upload, TEST_CONSTANTS["S3_KEY"], mock_backend_s3_bucket
+            )
 
-        document_service.async_session_maker.return_value.__aenter__.return_value = (
-            mock_session
+        s3_object = boto3.client("s3", region_name="us-east-1").get_object(
+            Bucket=TEST_CONSTANTS["S3_BUCKET"], Key=TEST_CONSTANTS["S3_KEY"]
         )
+        assert s3_object["Body"].read() == data, "S3 object should match the upload"
+        assert file_size == size, "Size should be counted while streaming"
+        assert (
+            checksum == hashlib.sha1(data).hexdigest()
+        ), "Checksum should be computed while streaming"
+        assert (
+            mock_upload_part.call_count == parts
+        ), "Large files should be uploaded in parts"
 
-        with patch("boto3.client") as mock_boto3:
-            mock_s3_client = MagicMock()
-            mock_boto3.return_value = mock_s3_client
-
-            result = await document_service.s3_storage_system(
-                mock_file, TEST_CONSTANTS["PROGRAM_ID"], mock_backend_s3
+    @pytest.mark.asyncio
+    async def test_upload_s3_aborts_on_error(
+        self, document_service, mock_backend_s3_bucket
+    ):
+        data = os.urandom(6 * 1024 * 1024)
+        upload = UploadFile(io.BytesIO(data), filename=TEST_CONSTANTS["DOCUMENT_NAME"])
+
+        with patch.object(
+            S3MultipartUploader,
+            "complete",
+            side_effect=ClientError({"Error": {"Code": "500"}}, "Complete"),
+        ), pytest.raises(BadRequestError):
+            await document_service.s3_storage_system(
+                upload, TEST_CONSTANTS["S3_KEY"], mock_backend_s3_bucket
             )
 
-            assert (
-                result["message"] == TEST_CONSTANTS["SUCCESS_MESSAGE"]
-            ), "S3 upload should return success message"
-            mock_s3_client.upload_fileobj.assert_called_once()
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        assert not s3_client.list_multipart_uploads(
+            Bucket=TEST_CONSTANTS["S3_BUCKET"]
+        ).get("Uploads"), "Failed multipart uploads should be aborted"
 
     @pytest.mark.asyncio
     async def test_upload_document_filesystem(
         self,
         document_service,
         mock_session,
-        mock_file,
-        mock_program,
         mock_backend_filesystem,
+        tmp_path,
     ):
         mock_result = AsyncMock()
         mock_result.scalars = MagicMock()
-        mock_result.scalars.return_value.first.side_effect = [
-            mock_program,
-            mock_backend_filesystem,
-        ]
+        mock_result.first = MagicMock(return_value=PROGRAM_STORAGE)
+        mock_result.scalars.return_value.first.return_value = mock_backend_filesystem
         mock_session.execute.return_value = mock_result
 
         document_service.async_session_maker.return_value.__aenter__.return_value = (
             mock_session
         )
 
+        data = os.urandom(3 * 1024 * 1024)
+        upload = UploadFile(io.BytesIO(data), filename=TEST_CONSTANTS["DOCUMENT_NAME"])
+
         result = await document_service.upload_document(
-            mock_file,
+            upload,
             TEST_CONSTANTS["PROGRAM_ID"],
             TEST_CONSTANTS["FILE_TAG"],
             partner_id=TEST_CONSTANTS["PARTNER_ID"],
         )
 
         assert (
-            result["message"] == TEST_CONSTANTS["FILESYSTEM_UNSUPPORTED_MESSAGE"]
-        ), "Filesystem upload should return unsupported message"
+            result["message"] == TEST_CONSTANTS["SUCCESS_MESSAGE"]
+        ), "Filesystem upload should succeed"
+        (new_file,) = get_added(mock_session, DocumentFileORM)
+        stored_files = [path for path in tmp_path.rglob("*") if path.is_file()]
+        assert stored_files == [
+            tmp_path / new_file.relative_path
+        ], "The file should be stored under its sharded relative path"
+        assert stored_files[0].read_bytes() == data, "The stored file should match"
+        assert (
+            new_file.file_size == len(data)
+            and new_file.checksum == hashlib.sha1(data).hexdigest()
+        ), "Size and checksum of the stored file should be saved"
 
     @pytest.mark.asyncio
     async def test_upload_document_s3(
-        self, document_service, mock_session, mock_file, mock_program, mock_backend_s3
+        self, document_service, mock_session, mock_file, mock_backend_s3
     ):
-        mock_tag = DocumentTagORM(name=TEST_CONSTANTS["FILE_TAG"])
-        mock_document = DocumentFileORM(
-            name=TEST_CONSTANTS["DOCUMENT_NAME"],
-            backend_id=1,
-            file_size=1000,
-            checksum="abc123",
-            company_id=1,
-            active=True,
-        )
-
         mock_session.execute.side_effect = [
-            AsyncMock(
-                scalars=MagicMock(
-                    return_value=MagicMock(first=MagicMock(return_value=mock_program))
-                )
-            ),
-            AsyncMock(
+            MagicMock(first=MagicMock(return_value=PROGRAM_STORAGE)),
+            MagicMock(
                 scalars=MagicMock(
                     return_value=MagicMock(
                         first=MagicMock(return_value=mock_backend_s3)
                     )
                 )
             ),
-            AsyncMock(
-                scalars=MagicMock(
-                    return_value=MagicMock(first=MagicMock(return_value=None))
-                )
-            ),
-            AsyncMock(
-                scalars=MagicMock(
-                    return_value=MagicMock(first=MagicMock(return_value=mock_tag))
-                )
-            ),
-            AsyncMock(
-                scalars=MagicMock(
-                    return_value=MagicMock(first=MagicMock(return_value=mock_document))
-                )
-            ),
-            AsyncMock(),
+            MagicMock(scalar=MagicMock(return_value=None)),
         ]
 
         document_service.async_session_maker.return_value.__aenter__.return_value = (
@@ -231,10 +314,8 @@ class TestDocumentFileService:
         )
         mock_file.read = AsyncMock(return_value=b"test content")
 
-        with patch.object(document_service, "s3_storage_system") as mock_s3_storage:
-            mock_s3_storage.return_value = {
-                "message": TEST_CONSTANTS["SUCCESS_MESSAGE"]
-            }
+        with patch.object(S3StorageEngine, "write") as mock_s3_storage:
+            mock_s3_storage.return_value = (12, "checksum")
             result = await document_service.upload_document(
                 mock_file,
                 TEST_CONSTANTS["PROGRAM_ID"],
@@ -246,22 +327,42 @@ class TestDocumentFileService:
                 result["message"] == TEST_CONSTANTS["SUCCESS_MESSAGE"]
             ), "S3 upload should return success message"
             mock_s3_storage.assert_called_once_with(
-                mock_file, str(f"test-pdf-{mock_document.id}"), mock_backend_s3
+                mock_file,
+                "test-pdf-None",
+                first_chunk=b"test content",
+            )
+            assert [type(call.args[0]) for call in mock_session.add.call_args_list] == [
+                DocumentTagORM,
+                DocumentFileORM,
+                DocumentJobORM,
+            ], "The tag, the stored file and its post-processing job should be added"
+            mock_session.add_all.assert_called_once()
+            (new_file,) = get_added(mock_session, DocumentFileORM)
+            assert mock_session.add_all.call_args.args[0] == [
+                new_file
+            ], "The pending file should be inserted before it is stored"
+            assert (
+                new_file.active
+                and new_file.file_size == 12
+                and new_file.checksum == "checksum"
+            ), "The stored file should be activated with its size and checksum"
+            document_service.membership_service.check_and_create_mem.assert_awaited_once_with(
+                programid=TEST_CONSTANTS["PROGRAM_ID"],
+                partnerid=TEST_CONSTANTS["PARTNER_ID"],
             )
+            mock_session.flush.assert_awaited_once()
             assert (
-                mock_session.add.call_count == 2
-            ), "Two objects should be added to the session"
+                mock_session.commit.await_count == 2
+            ), "The pending file and the stored file should be committed on their own"
 
     @pytest.mark.asyncio
     async def test_upload_document_empty_content(
-        self, document_service, mock_session, mock_file, mock_program, mock_backend_s3
+        self, document_service, mock_session, mock_file, mock_backend_s3
     ):
         mock_result = AsyncMock()
         mock_result.scalars = MagicMock()
-        mock_result.scalars.return_value.first.side_effect = [
-            mock_program,
-            mock_backend_s3,
-        ]
+        mock_result.first = MagicMock(return_value=PROGRAM_STORAGE)
+        mock_result.scalars.return_value.first.return_value = mock_backend_s3
         mock_session.execute.return_value = mock_result
 
         document_service.async_session_maker.return_value.__aenter__.return_value = (
@@ -282,7 +383,7 @@ class TestDocumentFileService:
 
     @pytest.mark.asyncio
     async def test_upload_document_invalid_backend(
-        self, document_service, mock_session, mock_file, mock_program
+        self, document_service, mock_session, mock_file
     ):
         mock_backend_invalid = DocumentStoreORM(
             id=1, server_env_defaults={"x_backend_type_env_default": "invalid_backend"}
@@ -290,10 +391,8 @@ class TestDocumentFileService:
 
         mock_result = AsyncMock()
         mock_result.scalars = MagicMock()
-        mock_result.scalars.return_value.first.side_effect = [
-            mock_program,
-            mock_backend_invalid,
-        ]
+        mock_result.first = MagicMock(return_value=PROGRAM_STORAGE)
+        mock_result.scalars.return_value.first.return_value = mock_backend_invalid
         mock_session.execute.return_value = mock_result
 
         document_service.async_session_maker.return_value.__aenter__.return_value = (
@@ -310,3 +409,550 @@ class TestDocumentFileService:
         assert (
             result["message"] == TEST_CONSTANTS["INVALID_BACKEND_MESSAGE"]
         ), "Invalid backend should return appropriate error message"
+
+    @pytest.mark.asyncio
+    async def test_upload_document_single_transaction(self):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(create_tables, UPLOAD_TABLES)
+            # Like the app's sessions, which do not expire on commit
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                await session.execute(
+                    insert(ProgramORM.__table__),
+                    [{"id": 1, "company_id": 1, "supporting_documents_store": 1}],
+                )
+                await session.execute(
+                    insert(DocumentStoreORM.__table__),
+                    [
+                        {
+                            "id": 1,
+                            "name": "s3",
+                            "server_env_defaults": {
+                                "x_backend_type_env_default": "amazon_s3"
+                            },
+                        }
+                    ],
+                )
+                await session.commit()
+
+                service = DocumentFileService()
+                service.membership_service = MembershipService()
+                token = request_dbsession.set(session)
+                # Cache loaders open their own sessions on the same database
+                maker_token = dbsession_maker.set(
+                    async_sessionmaker(engine, expire_on_commit=False)
+                )
+                try:
+                    with patch.object(
+                        S3StorageEngine,
+                        "write",
+                        return_value=(12, hashlib.sha1(b"test content").hexdigest()),
+                    ) as mock_s3_storage:
+                        for _ in range(2):
+                            await service.upload_document(
+                                UploadFile(
+                                    io.BytesIO(b"test content"),
+                                    filename=TEST_CONSTANTS["DOCUMENT_NAME"],
+                                ),
+                                TEST_CONSTANTS["PROGRAM_ID"],
+                                TEST_CONSTANTS["FILE_TAG"],
+                                partner_id=TEST_CONSTANTS["PARTNER_ID"],
+                            )
+                        mock_s3_storage.side_effect = BadRequestError(message="S3")
+                        with pytest.raises(BadRequestError):
+                            await service.upload_document(
+                                UploadFile(
+                                    io.BytesIO(b"other content"),
+                                    filename="failed.pdf",
+                                ),
+                                TEST_CONSTANTS["PROGRAM_ID"],
+                                "other_tag",
+                                partner_id=2,
+                            )
+                finally:
+                    dbsession_maker.reset(maker_token)
+                    request_dbsession.reset(token)
+                s3_uploads = [call.args[1] for call in mock_s3_storage.call_args_list]
+
+                files = (
+                    await session.execute(
+                        select(DocumentFileORM).order_by(DocumentFileORM.id)
+                    )
+                ).scalars()
+                files = [
+                    (f.slug, f.relative_path, f.file_size, f.program_membership_id)
+                    for f in files
+                ]
+                tags = (await session.execute(select(DocumentTagORM.name))).scalars()
+                memberships = (
+                    await session.execute(select(ProgramMembershipORM.partner_id))
+                ).scalars()
+                tags, memberships = list(tags), list(memberships)
+        finally:
+            await engine.dispose()
+
+        assert files == [
+            ("test-pdf-1", "test-pdf-1", 12, 1),
+            ("test-pdf-2", "test-pdf-2", 12, 1),
+        ], "Each file should get the slug of its own ID"
+        assert s3_uploads == [
+            "test-pdf-1",
+            "test-pdf-2",
+            "failed-pdf-3",
+        ], "Each file should be stored under its own relative path"
+        assert tags == [TEST_CONSTANTS["FILE_TAG"]], "The tag should be created once"
+        assert memberships == [
+            TEST_CONSTANTS["PARTNER_ID"],
+            2,
+        ], "Memberships are committed before the upload, on their own"
+        assert program_storage_cache.get(TEST_CONSTANTS["PROGRAM_ID"]) == (
+            1,
+            1,
+        ), "The program storage should be cached"
+
+    @pytest.mark.asyncio
+    async def test_upload_document_stores_outside_transactions(self):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        open_transactions, during_write = 0, []
+
+        def on_begin(conn):
+            nonlocal open_transactions
+            open_transactions += 1
+
+        def on_end(conn):
+            nonlocal open_transactions
+            open_transactions -= 1
+
+        event.listen(engine.sync_engine, "begin", on_begin)
+        event.listen(engine.sync_engine, "commit", on_end)
+        event.listen(engine.sync_engine, "rollback", on_end)
+
+        async def fake_write(engine, file, relative_path, first_chunk=None):
+            during_write.append(open_transactions)
+            return 12, "checksum"
+
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(create_tables, UPLOAD_TABLES)
+                await conn.execute(
+                    insert(ProgramORM.__table__),
+                    [{"id": 1, "company_id": 1, "supporting_documents_store": 1}],
+                )
+                await conn.execute(
+                    insert(DocumentStoreORM.__table__),
+                    [
+                        {
+                            "id": 1,
+                            "name": "s3",
+                            "server_env_defaults": {
+                                "x_backend_type_env_default": "amazon_s3"
+                            },
+                        }
+                    ],
+                )
+
+            service = DocumentFileService()
+            service.membership_service = MembershipService()
+            maker_token = dbsession_maker.set(
+                async_sessionmaker(engine, expire_on_commit=False)
+            )
+            try:
+                async with request_session_scope():
+                    with patch.object(
+                        S3StorageEngine, "write", new=fake_write
+                    ), patch.object(
+                        S3StorageEngine, "delete", new_callable=AsyncMock
+                    ) as mock_delete:
+                        await service.upload_document(
+                            UploadFile(
+                                io.BytesIO(b"test content"),
+                                filename=TEST_CONSTANTS["DOCUMENT_NAME"],
+                            ),
+                            TEST_CONSTANTS["PROGRAM_ID"],
+                            TEST_CONSTANTS["FILE_TAG"],
+                            partner_id=TEST_CONSTANTS["PARTNER_ID"],
+                        )
+                        with patch.object(
+                            DocumentJobService,
+                            "enqueue",
+                            side_effect=RuntimeError("Insert failed"),
+                        ), pytest.raises(RuntimeError):
+                            await service.upload_document(
+                                UploadFile(
+                                    io.BytesIO(b"other content"),
+                                    filename="failed.pdf",
+                                ),
+                                TEST_CONSTANTS["PROGRAM_ID"],
+                                None,
+                                partner_id=TEST_CONSTANTS["PARTNER_ID"],
+                            )
+            finally:
+                dbsession_maker.reset(maker_token)
+
+            async with engine.connect() as conn:
+                files = (
+                    await conn.execute(
+                        select(DocumentFileORM.slug, DocumentFileORM.active)
+                    )
+                ).all()
+        finally:
+            await engine.dispose()
+
+        assert during_write == [0, 0], "No transaction should be open during the I/O"
+        assert files == [
+            ("test-pdf-1", True)
+        ], "Only the stored file should be saved, the failed one is deleted"
+        mock_delete.assert_awaited_once_with("failed-pdf-2")
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "range_header, status, content_range, content",
+        [
+            (None, 200, None, b"0123456789"),
+            ("bytes=2-5", 206, "bytes 2-5/10", b"2345"),
+            ("bytes=-3", 206, "bytes 7-9/10", b"789"),
+            ("bytes=0-1,4-5", 200, None, b"0123456789"),
+        ],
+    )
+    async def test_download_document_stream(
+        self,
+        document_service,
+        mock_session,
+        mock_backend_s3_bucket,
+        range_header,
+        status,
+        content_range,
+        content,
+    ):
+        response = await self._download(
+            document_service, mock_session, mock_backend_s3_bucket, range_header
+        )
+        body = b"".join([chunk async for chunk in response.body_iterator])
+
+        assert response.status_code == status, f"Status should be {status}"
+        assert (
+            response.headers.get("content-range") == content_range
+        ), "Content-Range should match the requested range"
+        assert body == content, "The requested bytes should be streamed"
+        assert response.headers["content-length"] == str(
+            len(content)
+        ), "Content-Length should be the length of the streamed bytes"
+        assert (
+            response.media_type == "application/pdf"
+        ), "The document mimetype should be used"
+
+    @pytest.mark.asyncio
+    async def test_download_document_invalid_range(
+        self, document_service, mock_session, mock_backend_s3_bucket
+    ):
+        with pytest.raises(BadRequestError) as exc_info:
+            await self._download(
+                document_service, mock_session, mock_backend_s3_bucket, "bytes=20-"
+            )
+        assert (
+            exc_info.value.status_code == 416
+        ), "Unsatisfiable ranges should be rejected with 416"
+
+    @pytest.mark.asyncio
+    async def test_download_document_presigned(
+        self, document_service, mock_session, mock_backend_s3_bucket
+    ):
+        with patch.object(_config, "document_download_mode", "presigned"):
+            response = await self._download(
+                document_service, mock_session, mock_backend_s3_bucket
+            )
+
+        assert response.status_code == 307, "Presigned mode should redirect"
+        location = response.headers["location"]
+        assert (
+            f"/{TEST_CONSTANTS['S3_BUCKET']}/{TEST_CONSTANTS['S3_KEY']}" in location
+            or f"{TEST_CONSTANTS['S3_BUCKET']}.s3" in location
+        ) and "Signature" in location, "Should redirect to a presigned URL"
+
+    @pytest.mark.asyncio
+    async def test_download_document_not_found(self, document_service):
+        with patch.object(
+            DocumentFileORM, "get_partner_document", new=AsyncMock(return_value=None)
+        ), pytest.raises(NotFoundError):
+            await document_service.download_document(1, 2)
+
+    async def _download(
+        self, document_service, mock_session, backend, range_header=None
+    ):
+        boto3.client("s3", region_name="us-east-1").put_object(
+            Bucket=TEST_CONSTANTS["S3_BUCKET"],
+            Key=TEST_CONSTANTS["S3_KEY"],
+            Body=b"0123456789",
+        )
+        mock_result = MagicMock()
+        mock_result.scalars.return_value.first.return_value = backend
+        mock_session.execute.return_value = mock_result
+        document_service.async_session_maker.return_value.__aenter__.return_value = (
+            mock_session
+        )
+        document = DocumentFileORM(
+            id=1,
+            name=TEST_CONSTANTS["DOCUMENT_NAME"],
+            relative_path=TEST_CONSTANTS["S3_KEY"],
+            mimetype="application/pdf",
+            backend_id=backend.id,
+        )
+        with patch.object(
+            DocumentFileORM,
+            "get_partner_document",
+            new=AsyncMock(return_value=document),
+        ):
+            return await document_service.download_document(
+                1, TEST_CONSTANTS["PARTNER_ID"], range_header=range_header
+            )
+
+    @pytest.mark.asyncio
+    async def test_upload_documents_batch(self):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        running, max_running = 0, 0
+
+        async def fake_write(engine, file, relative_path, first_chunk=None):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if file.filename == "broken.pdf":
+                raise BadRequestError(message="Client error occurred")
+            content = first_chunk + await file.read()
+            return len(content), hashlib.sha1(content).hexdigest()
+
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(create_tables, UPLOAD_TABLES)
+            # Like the app's sessions, which do not expire on commit
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                await session.execute(
+                    insert(ProgramORM.__table__),
+                    [{"id": 1, "company_id": 1, "supporting_documents_store": 1}],
+                )
+                await session.execute(
+                    insert(DocumentStoreORM.__table__),
+                    [
+                        {
+                            "id": 1,
+                            "name": "s3",
+                            "server_env_defaults": {
+                                "x_backend_type_env_default": "amazon_s3"
+                            },
+                        }
+                    ],
+                )
+                await session.commit()
+
+                service = DocumentFileService()
+                service.membership_service = MembershipService()
+                names = ["a.pdf", "broken.pdf", "c.pdf", "d.pdf", "e.pdf"]
+                token = request_dbsession.set(session)
+                # Cache loaders open their own sessions on the same database
+                maker_token = dbsession_maker.set(
+                    async_sessionmaker(engine, expire_on_commit=False)
+                )
+                try:
+                    with patch.object(
+                        S3StorageEngine, "write", new=fake_write
+                    ), patch.object(_config, "document_batch_upload_concurrency", 2):
+                        results = await service.upload_documents(
+                            [
+                                UploadFile(io.BytesIO(name.encode()), filename=name)
+                                for name in names
+                            ],
+                            TEST_CONSTANTS["PROGRAM_ID"],
+                            TEST_CONSTANTS["FILE_TAG"],
+                            partner_id=TEST_CONSTANTS["PARTNER_ID"],
+                        )
+                finally:
+                    dbsession_maker.reset(maker_token)
+                    request_dbsession.reset(token)
+
+                files = (
+                    await session.execute(
+                        select(DocumentFileORM.slug, DocumentFileORM.file_size)
+                    )
+                ).all()
+        finally:
+            await engine.dispose()
+
+        assert [(r.name, r.uploaded) for r in results] == [
+            (name, name != "broken.pdf") for name in names
+        ], "Each file should have its own result"
+        assert (
+            results[1].message == "Client error occurred"
+        ), "The error of a failed file should be returned"
+        assert sorted(files) == [
+            ("a-pdf-1", 5),
+            ("c-pdf-3", 5),
+            ("d-pdf-4", 5),
+            ("e-pdf-5", 5),
+        ], "Only the uploaded files should be saved"
+        assert max_running == 2, "Uploads should run concurrently within the limit"
+
+    @pytest.mark.asyncio
+    async def test_upload_session(self, tmp_path):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(
+                    create_tables, UPLOAD_TABLES + [DocumentUploadSessionORM]
+                )
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                await session.execute(
+                    insert(ProgramORM.__table__),
+                    [{"id": 1, "company_id": 1, "supporting_documents_store": 1}],
+                )
+                await session.execute(
+                    insert(DocumentStoreORM.__table__),
+                    [
+                        {
+                            "id": 1,
+                            "name": "filesystem",
+                            "server_env_defaults": {
+                                "x_backend_type_env_default": "filesystem",
+                                "x_directory_path_env_default": str(tmp_path),
+                            },
+                        }
+                    ],
+                )
+                await session.commit()
+
+                service = DocumentFileService()
+                service.membership_service = MembershipService()
+                partner_id = TEST_CONSTANTS["PARTNER_ID"]
+                token = request_dbsession.set(session)
+                # Cache loaders open their own sessions on the same database
+                maker_token = dbsession_maker.set(
+                    async_sessionmaker(engine, expire_on_commit=False)
+                )
+                try:
+                    with patch.object(_config, "document_upload_session_chunk_size", 4):
+                        created = await service.create_upload_session(
+                            TEST_CONSTANTS["PROGRAM_ID"],
+                            partner_id,
+                            TEST_CONSTANTS["DOCUMENT_NAME"],
+                            10,
+                            file_tag=TEST_CONSTANTS["FILE_TAG"],
+                        )
+                        inactive = await session.get(
+                            DocumentFileORM, created.document_id
+                        )
+                        inactive = inactive.active
+
+                        await service.upload_chunk(created.id, partner_id, 3, b"89")
+                        await service.upload_chunk(created.id, partner_id, 1, b"0123")
+                        with pytest.raises(BadRequestError):
+                            await service.complete_upload_session(
+                                created.id, partner_id
+                            )
+                        with pytest.raises(BadRequestError):
+                            await service.upload_chunk(created.id, partner_id, 2, b"45")
+                        with pytest.raises(NotFoundError):
+                            await service.upload_chunk(created.id, 2, 2, b"4567")
+                        # A chunk sent again replaces the previous one
+                        await service.upload_chunk(created.id, partner_id, 1, b"0123")
+                        resumed = await service.get_upload_session(
+                            created.id, partner_id
+                        )
+                        await service.upload_chunk(created.id, partner_id, 2, b"4567")
+                        completed = await service.complete_upload_session(
+                            created.id, partner_id
+                        )
+
+                        aborted = await service.create_upload_session(
+                            TEST_CONSTANTS["PROGRAM_ID"], partner_id, "aborted.pdf", 6
+                        )
+                        await service.upload_chunk(aborted.id, partner_id, 1, b"0123")
+                        aborted = await service.abort_upload_session(
+                            aborted.id, partner_id
+                        )
+
+                        expired = await service.create_upload_session(
+                            TEST_CONSTANTS["PROGRAM_ID"], partner_id, "expired.pdf", 6
+                        )
+                        with patch.object(_config, "document_upload_session_ttl", -1):
+                            stale = await service.create_upload_session(
+                                TEST_CONSTANTS["PROGRAM_ID"], partner_id, "stale.pdf", 6
+                            )
+                        with pytest.raises(BadRequestError):
+                            await service.upload_chunk(stale.id, partner_id, 1, b"0123")
+                        expired_count = await service.abort_expired_upload_sessions()
+                finally:
+                    dbsession_maker.reset(maker_token)
+                    request_dbsession.reset(token)
+
+                files = (
+                    await session.execute(
+                        select(
+                            DocumentFileORM.name,
+                            DocumentFileORM.active,
+                            DocumentFileORM.file_size,
+                            DocumentFileORM.checksum,
+                            DocumentFileORM.relative_path,
+                        ).order_by(DocumentFileORM.id)
+                    )
+                ).all()
+                states = (
+                    await session.execute(
+                        select(
+                            DocumentUploadSessionORM.id, DocumentUploadSessionORM.state
+                        )
+                    )
+                ).all()
+        finally:
+            await engine.dispose()
+
+        assert (created.chunk_count, created.missing_chunks) == (
+            3,
+            [1, 2, 3],
+        ), "The file should be split in chunks of the configured size"
+        assert not inactive, "The file should be hidden until the upload is complete"
+        assert resumed.missing_chunks == [2], "Only the missing chunks should be resent"
+        assert completed.state == "completed", "The session should be completed"
+        assert aborted.state == "aborted", "The session should be aborted"
+        assert expired_count == 1, "Only the expired session should be closed"
+        assert dict(states) == {
+            created.id: "completed",
+            aborted.id: "aborted",
+            expired.id: "open",
+            stale.id: "expired",
+        }, "The session states should be saved"
+        assert files[0][:4] == (
+            TEST_CONSTANTS["DOCUMENT_NAME"],
+            True,
+            10,
+            hashlib.sha1(b"0123456789").hexdigest(),
+        ), "The completed file should be activated with its size and checksum"
+        assert (
+            tmp_path / files[0][4]
+        ).read_bytes() == b"0123456789", "The chunks should be joined in order"
+        assert [f[0] for f in files] == [
+            TEST_CONSTANTS["DOCUMENT_NAME"],
+            "expired.pdf",
+        ], "Aborted and expired uploads should not leave a file behind"
+        assert [path.name for path in tmp_path.rglob("*") if path.is_file()] == [
+            os.path.basename(files[0][4])
+        ], "No chunk should be left behind"
+
+    @pytest.mark.asyncio
+    async def test_expired_upload_sessions_aborted_periodically(self, document_service):
+        aborted = asyncio.Event()
+
+        async def abort_expired_upload_sessions():
+            aborted.set()
+            return 0
+
+        document_service.abort_expired_upload_sessions = abort_expired_upload_sessions
+        with patch.object(_config, "document_upload_session_cleanup_interval", 0):
+            await document_service.start()
+            try:
+                await asyncio.wait_for(aborted.wait(), timeout=1)
+            finally:
+                await document_service.stop()
+        assert (
+            document_service._cleanup_task is None
+        ), "The cleanup task should be stopped"
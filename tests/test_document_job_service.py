@@ -0,0 +1,276 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from openg2p_fastapi_common.context import component_registry
+from openg2p_portal_api.context import request_dbsession
+from openg2p_portal_api.models.orm.document_file_orm import DocumentFileORM
+from openg2p_portal_api.models.orm.document_job_orm import DocumentJobORM
+from openg2p_portal_api.models.orm.document_store_orm import DocumentStoreORM
+from openg2p_portal_api.services.document_job_service import (
+    DocumentJobService,
+    _config,
+)
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from tests.test_program_summary import create_tables
+
+PDF = b"%PDF-1.4\n1 0 obj << /Type /Page >> endobj\n2 0 obj << /Type /Page >>\n"
+
+
+@asynccontextmanager
+async def job_database(tmp_path):
+    """
+    A storage backend in tmp_path with one stored PDF file (id 1), and one
+    file missing from the storage (id 2).
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'jobs.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            create_tables, [DocumentStoreORM, DocumentFileORM, DocumentJobORM]
+        )
+        await conn.execute(
+            insert(DocumentStoreORM.__table__),
+            [
+                {
+                    "id": 1,
+                    "name": "filesystem",
+                    "server_env_defaults": {
+                        "x_backend_type_env_default": "filesystem",
+                        "x_directory_path_env_default": str(tmp_path),
+                    },
+                }
+            ],
+        )
+        await conn.execute(
+            insert(DocumentFileORM.__table__),
+            [
+                {
+                    "id": document_id,
+                    "name": f"{name}.pdf",
+                    "relative_path": name,
+                    "mimetype": "application/octet-stream",
+                    "backend_id": 1,
+                    "active": True,
+                    "to_delete": False,
+                }
+                for document_id, name in [(1, "stored"), (2, "missing")]
+            ],
+        )
+    (tmp_path / "stored").write_bytes(PDF)
+
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        with patch(
+            "openg2p_portal_api.utils.db_utils.get_session_maker",
+            return_value=session_maker,
+        ):
+            yield session_maker
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture
+def job_service():
+    service = DocumentJobService()
+    yield service
+    # Components register themselves globally, do not leak into other tests.
+    component_registry.get().remove(service)
+
+
+async def enqueue(session_maker, *document_ids):
+    async with session_maker() as session:
+        for document_id in document_ids:
+            DocumentJobService.enqueue(session, document_id)
+        await session.commit()
+
+
+async def get_jobs(session_maker):
+    async with session_maker() as session:
+        result = await session.execute(
+            select(DocumentJobORM).order_by(DocumentJobORM.id)
+        )
+        return result.scalars().all()
+
+
+class TestDocumentJobService:
+    @pytest.mark.asyncio
+    async def test_run_jobs(self, tmp_path, job_service):
+        async with job_database(tmp_path) as job_db:
+            await enqueue(job_db, 1, 2)
+
+            with patch.object(_config, "document_job_max_attempts", 2):
+                job_ids = await job_service.claim_jobs(10)
+                assert (
+                    await job_service.claim_jobs(10) == []
+                ), "Running jobs should not be claimed again"
+                for job_id in job_ids:
+                    await job_service.run_job(job_id)
+                retried = await get_jobs(job_db)
+
+                # Due for retry
+                async with job_db() as session:
+                    job = await session.get(DocumentJobORM, job_ids[1])
+                    job.available_at = datetime.utcnow()
+                    await session.commit()
+                for job_id in await job_service.claim_jobs(10):
+                    await job_service.run_job(job_id)
+                failed = await get_jobs(job_db)
+
+            async with job_db() as session:
+                document_file = await session.get(DocumentFileORM, 1)
+
+        assert job_ids == [1, 2], "All the due jobs should be claimed"
+        assert (retried[0].state, retried[0].result) == (
+            "done",
+            {
+                "mimetype": "application/pdf",
+                "checksum": document_file.checksum,
+                "page_count": 2,
+            },
+        ), "The results of the processors should be saved"
+        assert (
+            document_file.mimetype == "application/pdf" and document_file.checksum
+        ), "The processors should update the file"
+        assert (
+            retried[1].state == "pending"
+            and retried[1].attempts == 1
+            and retried[1].available_at > datetime.utcnow()
+            and retried[1].last_error == "Document not found"
+        ), "A failed job should be retried later"
+        assert (
+            failed[1].state == "failed" and failed[1].attempts == 2
+        ), "A job should fail after max attempts"
+
+    @pytest.mark.asyncio
+    async def test_infected_file_marked_for_deletion(self, tmp_path, job_service):
+        async with job_database(tmp_path) as job_db:
+            await enqueue(job_db, 1)
+
+            with patch.object(
+                _config,
+                "document_virus_scan_command",
+                "sh -c 'cat > /dev/null; echo FOUND; exit 1'",
+            ):
+                for job_id in await job_service.claim_jobs(10):
+                    await job_service.run_job(job_id)
+
+            async with job_db() as session:
+                files = (
+                    await session.execute(
+                        select(
+                            DocumentFileORM.id,
+                            DocumentFileORM.active,
+                            DocumentFileORM.to_delete,
+                        ).order_by(DocumentFileORM.id)
+                    )
+                ).all()
+
+        assert files == [
+            (1, False, True),
+            (2, True, False),
+        ], "Only the infected file should be marked for deletion"
+
+    @pytest.mark.asyncio
+    async def test_document_processed_outside_transaction(self, tmp_path, job_service):
+        sessions = []
+
+        async def process_document(document_file):
+            sessions.append(request_dbsession.get())
+            return {}
+
+        async with job_database(tmp_path) as job_db:
+            await enqueue(job_db, 1)
+            with patch.object(job_service, "process_document", new=process_document):
+                for job_id in await job_service.claim_jobs(10):
+                    await job_service.run_job(job_id)
+            jobs = await get_jobs(job_db)
+
+        assert sessions == [None], "No session should be held while processing"
+        assert jobs[0].state == "done", "The outcome should be saved afterwards"
+
+    @pytest.mark.asyncio
+    async def test_run_job_timeout(self, tmp_path, job_service):
+        async def process_document(document_file):
+            await asyncio.sleep(1)
+
+        async with job_database(tmp_path) as job_db:
+            await enqueue(job_db, 1)
+            with patch.object(
+                job_service, "process_document", new=process_document
+            ), patch.object(_config, "document_job_timeout", 0.01):
+                for job_id in await job_service.claim_jobs(10):
+                    await job_service.run_job(job_id)
+            jobs = await get_jobs(job_db)
+
+        assert (
+            jobs[0].state == "pending" and jobs[0].last_error == "The job timed out."
+        ), "A job running longer than the timeout should be retried"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("fails", [False, True])
+    async def test_lost_job_outcome_dropped(self, tmp_path, job_service, fails):
+        async with job_database(tmp_path) as job_db:
+
+            async def process_document(document_file):
+                # Timed out meanwhile, and claimed again by another worker
+                async with job_db() as session:
+                    job = await session.get(DocumentJobORM, 1)
+                    job.attempts += 1
+                    await session.commit()
+                document_file.mimetype = "text/plain"
+                if fails:
+                    raise ValueError("Processing failed")
+                return {"mimetype": "text/plain"}
+
+            await enqueue(job_db, 1)
+            with patch.object(job_service, "process_document", new=process_document):
+                for job_id in await job_service.claim_jobs(10):
+                    await job_service.run_job(job_id)
+            jobs = await get_jobs(job_db)
+            async with job_db() as session:
+                document_file = await session.get(DocumentFileORM, 1)
+
+        assert (
+            jobs[0].state == "running"
+            and jobs[0].attempts == 2
+            and jobs[0].result is None
+            and jobs[0].last_error is None
+        ), "The outcome of a lost attempt should not overwrite the new claim"
+        assert (
+            document_file.mimetype == "application/octet-stream"
+        ), "The file should not be updated by a lost attempt"
+
+    @pytest.mark.asyncio
+    async def test_enqueue_disabled(self, tmp_path):
+        async with job_database(tmp_path) as job_db:
+            with patch.object(_config, "document_jobs_enabled", False):
+                await enqueue(job_db, 1)
+            jobs = await get_jobs(job_db)
+
+        assert jobs == [], "No job should be saved when disabled"
+
+    @pytest.mark.asyncio
+    async def test_worker_is_notified(self, tmp_path, job_service):
+        async with job_database(tmp_path) as job_db:
+            with patch.object(_config, "document_job_poll_interval", 60):
+                await job_service.start()
+                try:
+                    # Let the worker find the outbox empty and wait.
+                    await asyncio.sleep(0.05)
+                    await enqueue(job_db, 1)
+                    job_service.notify()
+                    for _ in range(100):
+                        jobs = await get_jobs(job_db)
+                        if jobs[0].state == "done":
+                            break
+                        await asyncio.sleep(0.02)
+                finally:
+                    await job_service.stop()
+
+        assert (
+            jobs[0].state == "done"
+        ), "The worker should run the job once notified, before the poll interval"
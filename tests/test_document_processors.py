@@ -0,0 +1,140 @@
+import hashlib
+from unittest.mock import patch
+
+import pytest
+from openg2p_portal_api.models.orm.document_file_orm import DocumentFileORM
+from openg2p_portal_api.utils.document_processors import (
+    ChecksumProcessor,
+    DocumentProcessor,
+    MimetypeProcessor,
+    PdfPageCountProcessor,
+    VirusScanProcessor,
+    _config,
+    sniff_mimetype,
+)
+
+PDF = (
+    b"%PDF-1.4\n1 0 obj << /Type /Pages /Count 3 >> endobj\n"
+    b"2 0 obj << /Type /Page >> endobj\n3 0 obj <</Type/Page/Parent 1 0 R>>\n"
+    b"4 0 obj << /Type /Page"
+)
+
+
+async def process(processor, data: bytes, chunk_size: int):
+    for start in range(0, len(data), chunk_size):
+        await processor.feed(data[start : start + chunk_size])
+    try:
+        return await processor.finish()
+    finally:
+        await processor.close()
+
+
+class TestDocumentProcessors:
+    @pytest.mark.parametrize(
+        "head, mimetype",
+        [
+            (b"%PDF-1.7", "application/pdf"),
+            (b"\x89PNG\r\n\x1a\n....", "image/png"),
+            (b"\xff\xd8\xff\xe0", "image/jpeg"),
+            (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+            (b"plain text", None),
+        ],
+    )
+    def test_sniff_mimetype(self, head, mimetype):
+        assert sniff_mimetype(head) == mimetype, f"{head} should be {mimetype}"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "guessed, data, mimetype",
+        [
+            ("image/png", PDF, "application/pdf"),
+            (
+                "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                b"PK\x03\x04....",
+                "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            ),
+            (None, b"PK\x03\x04....", "application/zip"),
+            ("text/csv", b"a,b\n1,2\n", "text/csv"),
+        ],
+    )
+    async def test_mimetype(self, guessed, data, mimetype):
+        document_file = DocumentFileORM(mimetype=guessed)
+
+        result = await process(MimetypeProcessor(document_file), data, 3)
+
+        assert document_file.mimetype == mimetype and result == {
+            "mimetype": mimetype
+        }, "The mimetype of the content should be used, unless less precise"
+
+    @pytest.mark.asyncio
+    async def test_checksum(self):
+        assert not ChecksumProcessor(
+            DocumentFileORM(checksum="checksum")
+        ).applies(), "Known checksums should not be computed again"
+        document_file = DocumentFileORM()
+
+        await process(ChecksumProcessor(document_file), PDF, 7)
+
+        assert (
+            document_file.checksum == hashlib.sha1(PDF).hexdigest()
+        ), "The checksum of the content should be saved"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("chunk_size", [1, 5, 1024])
+    async def test_pdf_page_count(self, chunk_size):
+        result = await process(
+            PdfPageCountProcessor(DocumentFileORM()), PDF, chunk_size
+        )
+
+        assert result == {
+            "page_count": 3
+        }, "Pages split across chunks should be counted once"
+
+    @pytest.mark.asyncio
+    async def test_pdf_page_count_not_pdf(self):
+        result = await process(
+            PdfPageCountProcessor(DocumentFileORM()), b"/Type /Page", 1024
+        )
+
+        assert result == {}, "Only PDF files should be counted"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "command, result, active",
+        [
+            ("sh -c 'cat > /dev/null'", {"virus_scan": "clean"}, True),
+            (
+                "sh -c 'cat > /dev/null; echo FOUND; exit 1'",
+                {"virus_scan": "infected", "virus_scan_output": "FOUND"},
+                False,
+            ),
+        ],
+    )
+    async def test_virus_scan(self, command, result, active):
+        document_file = DocumentFileORM(active=True, to_delete=False)
+
+        with patch.object(_config, "document_virus_scan_command", command):
+            processor = VirusScanProcessor(document_file)
+            assert processor.applies(), "Files should be scanned if configured"
+            assert (
+                await process(processor, PDF, 16) == result
+            ), "The scan outcome should be returned"
+
+        assert (
+            document_file.active is active and document_file.to_delete is not active
+        ), "Infected files should be deactivated and marked for deletion"
+
+    @pytest.mark.asyncio
+    async def test_virus_scan_error(self):
+        with patch.object(
+            _config, "document_virus_scan_command", "sh -c 'cat > /dev/null; exit 2'"
+        ):
+            with pytest.raises(RuntimeError):
+                await process(VirusScanProcessor(DocumentFileORM()), PDF, 16)
+        assert not VirusScanProcessor(
+            DocumentFileORM()
+        ).applies(), "Files should not be scanned without a command"
+
+    def test_document_processor_is_abstract(self):
+        with pytest.raises(TypeError):
+            DocumentProcessor(DocumentFileORM())
@@ -1,5 +1,5 @@
 from datetime import datetime
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 
 import pytest
 from fastapi import HTTPException
@@ -133,7 +133,7 @@ class TestFormService:
         ), "Application submission message should match"
         assert len(result.split()[-1]) == 11, "Application ID length should be 11"
         form_service.membership_service.check_and_create_mem.assert_called_once_with(
-            program_id, registrant_id
+            program_id, registrant_id, session=ANY
         )
         form_service.partner_service.update_partner_info.assert_called_once()
 
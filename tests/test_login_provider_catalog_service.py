@@ -0,0 +1,105 @@
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import orjson
+import pytest
+from openg2p_fastapi_common.context import component_registry
+from openg2p_portal_api.models.orm.auth_oauth_provider import AuthOauthProviderORM
+from openg2p_portal_api.services.login_provider_catalog_service import (
+    LoginProviderCatalogService,
+    _config,
+)
+
+VERSION = (datetime(2024, 1, 1), 2)
+
+PROVIDERS = [
+    SimpleNamespace(
+        id=1, name="esignet", body="Login with eSignet", image_icon_url=None
+    ),
+    SimpleNamespace(id=2, name="keycloak", body=None, image_icon_url="/icon.png"),
+]
+
+
+@pytest.fixture
+def catalog_service():
+    service = LoginProviderCatalogService()
+    yield service
+    # Components register themselves globally, do not leak into other tests.
+    registry = component_registry.get()
+    for component in list(registry):
+        if isinstance(component, LoginProviderCatalogService):
+            registry.remove(component)
+
+
+@pytest.fixture
+def mock_provider_orm():
+    with patch.object(
+        AuthOauthProviderORM,
+        "get_providers_version",
+        new=AsyncMock(return_value=VERSION),
+    ) as mock_version, patch.object(
+        AuthOauthProviderORM, "get_all", new=AsyncMock(return_value=PROVIDERS)
+    ) as mock_providers:
+        yield mock_version, mock_providers
+
+
+class TestLoginProviderCatalogService:
+    @pytest.mark.asyncio
+    async def test_refresh_only_on_change(self, catalog_service, mock_provider_orm):
+        mock_version, mock_providers = mock_provider_orm
+
+        assert await catalog_service.refresh(), "First refresh should load"
+        etag = catalog_service.catalog.etag
+        assert not await catalog_service.refresh(), "Unchanged providers are kept"
+        assert mock_providers.await_count == 1, "Providers should be loaded once"
+
+        mock_version.return_value = (datetime(2024, 1, 2), 2)
+        mock_providers.return_value = PROVIDERS[:1]
+        assert await catalog_service.refresh(), "A newer write_date should reload"
+
+        assert catalog_service.catalog.etag != etag, "A new list needs a new ETag"
+
+    @pytest.mark.asyncio
+    async def test_catalog_body(self, catalog_service, mock_provider_orm):
+        await catalog_service.refresh()
+
+        assert orjson.loads(catalog_service.catalog.body) == {
+            "loginProviders": [
+                {
+                    "id": 1,
+                    "name": "esignet",
+                    "type": "oauth2_auth_code",
+                    "displayName": "Login with eSignet",
+                    "displayIconUrl": "",
+                },
+                {
+                    "id": 2,
+                    "name": "keycloak",
+                    "type": "oauth2_auth_code",
+                    "displayName": "",
+                    "displayIconUrl": "/icon.png",
+                },
+            ]
+        }, "Body should match the getLoginProviders response"
+
+    @pytest.mark.asyncio
+    async def test_disabled_catalog(self, catalog_service, mock_provider_orm):
+        await catalog_service.refresh()
+
+        with patch.object(_config, "login_provider_catalog_enabled", False):
+            assert catalog_service.catalog is None, "Disabled catalog is not served"
+
+    @pytest.mark.asyncio
+    async def test_start_survives_load_failure(self, catalog_service):
+        with patch.object(
+            AuthOauthProviderORM,
+            "get_providers_version",
+            new=AsyncMock(side_effect=RuntimeError("db down")),
+        ):
+            await catalog_service.start()
+        try:
+            assert catalog_service.catalog is None, "Nothing should be loaded"
+            assert catalog_service._refresh_task, "Refresh task should be running"
+        finally:
+            await catalog_service.stop()
@@ -19,8 +19,8 @@ def mock_session():
 def mock_session_maker(mock_session):
     session, async_session = mock_session
     with patch(
-        "openg2p_portal_api.services.membership_service.async_sessionmaker",
-        return_value=lambda: async_session,
+        "openg2p_portal_api.services.membership_service.get_async_session",
+        return_value=async_session,
     ) as session_maker:
         yield session_maker
 
@@ -62,6 +62,27 @@ class TestMembershipService:
             session.commit.assert_called_once(), "Should commit the new membership"
             session.refresh.assert_called_once(), "Should refresh the session after commit"
 
+    @pytest.mark.asyncio
+    async def test_check_and_create_mem_created_concurrently(
+        self, mock_session, mock_session_maker
+    ):
+        service = MembershipService()
+        session, _ = mock_session
+
+        with patch.object(
+            ProgramMembershipORM,
+            "get_membership_by_id",
+            new_callable=AsyncMock,
+            side_effect=[None, MagicMock(id=2)],
+        ):
+            session.commit.side_effect = IntegrityError(None, None, None)
+
+            result = await service.check_and_create_mem(1, 1)
+            session.rollback.assert_awaited_once(), "Should roll back the failed insert"
+            assert (
+                result == 2
+            ), "Should return the membership created by the concurrent request"
+
     @pytest.mark.asyncio
     async def test_check_and_create_mem_integrity_error(
         self, mock_session, mock_session_maker
@@ -77,7 +98,38 @@ class TestMembershipService:
         ):
             session.commit.side_effect = IntegrityError(None, None, None)
 
-            result = await service.check_and_create_mem(1, 1)
+            with pytest.raises(ValueError) as exc_info:
+                await service.check_and_create_mem(1, 1)
+            assert (
+                str(exc_info.value) == "Could not add to registrant to program!!"
+            ), "Should raise when the membership can neither be created nor found"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("created_concurrently", [False, True])
+    async def test_check_and_create_mem_in_callers_session(self, created_concurrently):
+        service = MembershipService()
+        session = MagicMock(add=MagicMock(), commit=AsyncMock(), rollback=AsyncMock())
+        savepoint = AsyncMock()
+        savepoint.__aexit__.side_effect = (
+            IntegrityError(None, None, None) if created_concurrently else None
+        )
+        session.begin_nested.return_value = savepoint
+
+        with patch.object(
+            ProgramMembershipORM,
+            "get_membership_by_id",
+            new_callable=AsyncMock,
+            side_effect=[None, MagicMock(id=2)],
+        ):
+            result = await service.check_and_create_mem(1, 1, session=session)
+
+        session.add.assert_called_once()
+        session.begin_nested.assert_called_once_with()
+        session.commit.assert_not_awaited(), "The caller's transaction is not committed"
+        session.rollback.assert_not_awaited(), "Only the savepoint is rolled back"
+        if created_concurrently:
+            assert result == 2, "Should return the concurrently created membership"
+        else:
             assert (
-                result == "Could not add to registrant to program!!"
-            ), "Should return error message when IntegrityError occurs"
+                result == session.add.call_args.args[0].id
+            ), "Should return the id of the added membership"
@@ -0,0 +1,133 @@
+from datetime import datetime
+
+import pytest
+from openg2p_fastapi_common.errors.http_exceptions import BadRequestError
+from openg2p_portal_api.context import request_dbsession
+from openg2p_portal_api.models.orm.program_membership_orm import ProgramMembershipORM
+from openg2p_portal_api.models.orm.program_orm import ProgramORM
+from openg2p_portal_api.models.orm.program_registrant_info_orm import (
+    ProgramRegistrantInfoORM,
+)
+from openg2p_portal_api.utils.pagination_utils import (
+    _config,
+    decode_cursor,
+    encode_cursor,
+    get_page_size,
+    paginate,
+)
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from tests.test_program_summary import create_tables
+
+PARTNER_ID = 1
+APPLIED_DATES = [
+    datetime(2024, 1, 3),
+    datetime(2024, 1, 1),
+    None,
+    datetime(2024, 1, 3),
+    datetime(2024, 1, 2),
+    None,
+    datetime(2024, 1, 3),
+]
+
+
+class TestPaginationUtils:
+    @pytest.mark.parametrize(
+        "cursor",
+        [(datetime(2024, 1, 1, 10, 30), 42), (None, 7)],
+    )
+    def test_cursor_round_trip(self, cursor):
+        assert (
+            decode_cursor(encode_cursor(*cursor)) == cursor
+        ), "Decoded cursor should match the encoded keyset"
+
+    @pytest.mark.parametrize("cursor", ["not a cursor", "WzEsMl0=", "e30="])
+    def test_invalid_cursor(self, cursor):
+        with pytest.raises(BadRequestError):
+            decode_cursor(cursor)
+
+    def test_page_size_bounds(self):
+        assert (
+            get_page_size(None) is None
+        ), "Should not paginate without a limit or a cursor"
+        assert (
+            get_page_size(None, "cursor") == _config.details_page_size
+        ), "Should default to the configured page size with a cursor"
+        assert (
+            get_page_size(_config.details_max_page_size + 1)
+            == _config.details_max_page_size
+        ), "Should not exceed the configured maximum"
+        assert get_page_size(5) == 5, "Should keep a valid limit"
+
+    def test_paginate_without_limit(self):
+        rows, next_cursor = paginate([1, 2, 3], None, "date", "id")
+        assert rows == [1, 2, 3], "All rows should be returned"
+        assert next_cursor is None, "Unpaginated rows should not have a cursor"
+
+    def test_paginate_last_page(self):
+        rows, next_cursor = paginate([1, 2], 2, "date", "id")
+        assert rows == [1, 2], "All rows should be returned"
+        assert next_cursor is None, "Last page should not have a next cursor"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("limit", [1, 2, 3])
+    async def test_application_details_pages(self, limit):
+        engine = create_async_engine("sqlite+aiosqlite://")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(create_tables)
+            async with async_sessionmaker(engine)() as session:
+                await session.execute(
+                    insert(ProgramORM.__table__), [{"id": 1, "name": "Program"}]
+                )
+                await session.execute(
+                    insert(ProgramMembershipORM.__table__),
+                    [{"id": 1, "partner_id": PARTNER_ID, "program_id": 1}],
+                )
+                await session.execute(
+                    insert(ProgramRegistrantInfoORM.__table__),
+                    [
+                        {
+                            "id": index + 1,
+                            "registrant_id": PARTNER_ID,
+                            "program_id": 1,
+                            "create_date": create_date,
+                        }
+                        for index, create_date in enumerate(APPLIED_DATES)
+                    ],
+                )
+                await session.commit()
+
+                token = request_dbsession.set(session)
+                try:
+                    expected = await ProgramORM.get_application_details(PARTNER_ID)
+                    pages, after = [], None
+                    while True:
+                        rows = await ProgramORM.get_application_details(
+                            PARTNER_ID, limit=limit + 1, after=after
+                        )
+                        rows, next_cursor = paginate(
+                            rows, limit, "date_applied", "registrant_info_id"
+                        )
+                        pages.extend(rows)
+                        if not next_cursor:
+                            break
+                        after = decode_cursor(next_cursor)
+                finally:
+                    request_dbsession.reset(token)
+        finally:
+            await engine.dispose()
+
+        assert [row.registrant_info_id for row in expected] == [
+            7,
+            4,
+            1,
+            5,
+            2,
+            6,
+            3,
+        ], "Rows should be latest first, then by id, with undated rows last"
+        assert [row.registrant_info_id for row in pages] == [
+            row.registrant_info_id for row in expected
+        ], "Walking the pages should return every row exactly once, in order"
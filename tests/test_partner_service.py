@@ -1,12 +1,23 @@
+import asyncio
 from datetime import date
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from openg2p_fastapi_common.errors.http_exceptions import InternalServerError
-from openg2p_portal_api.models.orm.partner_orm import PartnerORM
+from openg2p_portal_api.context import (
+    dbsession_maker,
+    partner_fields_cache,
+    partner_id_cache,
+    request_dbsession,
+)
+from openg2p_portal_api.models.orm.partner_orm import PartnerORM, PartnerPhoneNoORM
+from openg2p_portal_api.models.orm.reg_id_orm import RegIDORM
 from openg2p_portal_api.services.partner_service import PartnerService
-from sqlalchemy import Engine
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from tests.test_program_summary import create_tables
 
 VALID_PARTNER_DATA = {
     "sub": "12345",
@@ -26,6 +37,15 @@ VALID_ID_TYPE_CONFIG = {
 }
 
 
+@pytest.fixture(autouse=True)
+def clear_partner_caches():
+    partner_fields_cache.invalidate()
+    partner_id_cache.invalidate()
+    yield
+    partner_fields_cache.invalidate()
+    partner_id_cache.invalidate()
+
+
 @pytest.fixture
 def mock_engine():
     engine = MagicMock(spec=Engine)
@@ -58,9 +78,7 @@ def mock_session(mock_engine):
 
 @pytest.fixture
 def partner_service(mock_session, mock_engine):
-    with patch("openg2p_portal_api.services.partner_service.dbengine") as mock_dbengine:
-        mock_dbengine.get.return_value = mock_engine
-        return PartnerService()
+    return PartnerService()
 
 
 class TestPartnerService:
@@ -70,53 +88,210 @@ class TestPartnerService:
     ):
         expected_fields = ["name", "email", "phone", "gender", "birthdate"]
 
-        with patch(
-            "openg2p_portal_api.models.orm.reg_id_orm.RegIDORM.get_partner_by_reg_id",
-            new_callable=AsyncMock,
-            return_value=None,
+        with patch.object(
+            RegIDORM, "get_partner_id", new_callable=AsyncMock, return_value=None
         ), patch.object(
             partner_service,
             "get_partner_fields",
             new_callable=AsyncMock,
             return_value=expected_fields,
-        ), patch(
-            "openg2p_portal_api.services.partner_service.async_sessionmaker",
-            return_value=lambda: mock_session[1],
-        ):
-            await partner_service.check_and_create_partner(
+        ), patch.object(
+            PartnerORM, "create_registrant", new_callable=AsyncMock, return_value=11
+        ) as mock_create:
+            partner_id = await partner_service.check_and_create_partner(
                 VALID_PARTNER_DATA, VALID_ID_TYPE_CONFIG
             )
 
-            session = mock_session[0]
-            self._verify_partner_creation(session)
-
-    def _verify_partner_creation(self, session):
+        assert partner_id == 11, "Id of the created partner should be returned"
+        self._verify_partner_creation(mock_create)
+        assert (
+            "display_name" not in mock_create.call_args.args[0]
+        ), "display_name should only be set when res_partner has the column"
         assert (
-            session.add.call_count == 3
-        ), "Session add should be called exactly 3 times"
-        session.commit.assert_called_once(), "Session commit should be called exactly once"
+            partner_id_cache.get(("national_id", "user123")) == 11
+        ), "Created partner id should be cached"
 
-        partner_call = session.add.call_args_list[0]
-        created_partner = partner_call[0][0]
+    def _verify_partner_creation(self, mock_create):
+        mock_create.assert_awaited_once()
+        created_partner, id_type, id_value = mock_create.call_args.args
 
-        assert isinstance(
-            created_partner, PartnerORM
-        ), "Created object should be instance of PartnerORM"
         assert (
-            created_partner.name == "DOE, JOHN MIDDLE "
+            id_type == "national_id" and id_value == "user123"
+        ), "Reg id should come from the ID type config and user_id"
+        assert (
+            mock_create.call_args.kwargs["phone_no"] == "1234567890"
+        ), "Phone number should match input"
+        assert (
+            created_partner["name"] == "DOE, JOHN MIDDLE "
         ), "Partner name should be properly formatted"
         assert (
-            created_partner.email == "john@example.com"
+            created_partner["email"] == "john@example.com"
         ), "Partner email should match input"
-        assert created_partner.phone == "1234567890", "Partner phone should match input"
         assert (
-            created_partner.gender == "Male"
+            created_partner["phone"] == "1234567890"
+        ), "Partner phone should match input"
+        assert (
+            created_partner["gender"] == "Male"
         ), "Partner gender should be properly capitalized"
         assert (
-            created_partner.is_registrant is True
+            created_partner["is_registrant"] is True
         ), "Partner should be marked as registrant"
-        assert created_partner.active is True, "Partner should be marked as active"
-        assert created_partner.company_id == 1, "Partner company_id should match config"
+        assert created_partner["active"] is True, "Partner should be marked as active"
+        assert (
+            created_partner["company_id"] == 1
+        ), "Partner company_id should match config"
+
+    @pytest.mark.asyncio
+    async def test_check_and_create_partner_returning_user(self, partner_service):
+        with patch.object(
+            RegIDORM, "get_partner_id", new_callable=AsyncMock, return_value=5
+        ) as mock_get_partner_id, patch.object(
+            PartnerORM, "get_partner_fields", new_callable=AsyncMock
+        ) as mock_get_fields, patch.object(
+            PartnerORM, "create_registrant", new_callable=AsyncMock
+        ) as mock_create:
+            partner_id = await partner_service.check_and_create_partner(
+                VALID_PARTNER_DATA, VALID_ID_TYPE_CONFIG
+            )
+
+        assert partner_id == 5, "Existing partner id should be returned"
+        mock_get_partner_id.assert_awaited_once_with("national_id", "user123")
+        mock_get_fields.assert_not_awaited()
+        mock_create.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_check_and_create_partner_single_transaction(self, partner_service):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(
+                    create_tables, [PartnerORM, RegIDORM, PartnerPhoneNoORM]
+                )
+                # Unmapped columns are inserted as well
+                await conn.execute(
+                    text("ALTER TABLE res_partner ADD COLUMN display_name VARCHAR")
+                )
+                await conn.execute(
+                    text(
+                        "CREATE UNIQUE INDEX reg_id_uniq ON g2p_reg_id (id_type, value)"
+                    )
+                )
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                token = request_dbsession.set(session)
+                # Cache loaders open their own sessions on the same database
+                maker_token = dbsession_maker.set(
+                    async_sessionmaker(engine, expire_on_commit=False)
+                )
+                try:
+                    with patch.object(
+                        PartnerORM,
+                        "get_partner_fields",
+                        new_callable=AsyncMock,
+                        return_value=["name", "email", "display_name"],
+                    ):
+                        partner_id = await partner_service.check_and_create_partner(
+                            dict(VALID_PARTNER_DATA), VALID_ID_TYPE_CONFIG
+                        )
+                        # Another login raced the first one past the lookup
+                        partner_id_cache.invalidate()
+                        with patch.object(
+                            RegIDORM,
+                            "get_partner_id_by_reg_id",
+                            new=AsyncMock(side_effect=[None, partner_id]),
+                        ):
+                            raced_partner_id = (
+                                await partner_service.check_and_create_partner(
+                                    dict(VALID_PARTNER_DATA), VALID_ID_TYPE_CONFIG
+                                )
+                            )
+                    partners = (
+                        await session.execute(
+                            text("SELECT id, name, display_name, type FROM res_partner")
+                        )
+                    ).all()
+                    reg_ids = (
+                        await session.execute(
+                            text("SELECT partner_id, id_type, value FROM g2p_reg_id")
+                        )
+                    ).all()
+                    phones = (
+                        await session.execute(
+                            text("SELECT partner_id, phone_no FROM g2p_phone_number")
+                        )
+                    ).all()
+                finally:
+                    dbsession_maker.reset(maker_token)
+                    request_dbsession.reset(token)
+        finally:
+            await engine.dispose()
+
+        assert partners == [
+            (partner_id, "DOE, JOHN MIDDLE ", "DOE, JOHN MIDDLE ", "contact")
+        ], "Partner should be created once, with display_name and defaults"
+        assert reg_ids == [
+            (partner_id, "national_id", "user123")
+        ], "Reg id should be created with the partner"
+        assert phones == [
+            (partner_id, "1234567890")
+        ], "Phone number should be created with the partner"
+        assert (
+            raced_partner_id == partner_id
+        ), "A conflicting login should get the partner of the first one"
+
+    @pytest.mark.asyncio
+    async def test_create_registrant_concurrent(self, tmp_path):
+        # A file database, so that each insert runs on its own connection
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'reg.db'}")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(
+                    create_tables, [PartnerORM, RegIDORM, PartnerPhoneNoORM]
+                )
+                await conn.execute(
+                    text(
+                        "CREATE UNIQUE INDEX reg_id_uniq ON g2p_reg_id (id_type, value)"
+                    )
+                )
+            maker_token = dbsession_maker.set(
+                async_sessionmaker(engine, expire_on_commit=False)
+            )
+            try:
+                created = await asyncio.gather(
+                    *(
+                        PartnerORM.create_registrant(
+                            {"name": name}, "national_id", "user123", phone_no=name
+                        )
+                        for name in ("first", "second")
+                    )
+                )
+            finally:
+                dbsession_maker.reset(maker_token)
+            async with engine.connect() as conn:
+                partners = (
+                    await conn.execute(text("SELECT id, name FROM res_partner"))
+                ).all()
+                reg_ids = (
+                    await conn.execute(text("SELECT partner_id FROM g2p_reg_id"))
+                ).all()
+                phones = (
+                    await conn.execute(
+                        text("SELECT partner_id, phone_no FROM g2p_phone_number")
+                    )
+                ).all()
+        finally:
+            await engine.dispose()
+
+        partner_id = next(filter(None, created), None)
+        assert (
+            partner_id is not None and created.count(None) == 1
+        ), "Exactly one of the concurrent inserts should create the registrant"
+        assert (
+            len(partners) == 1 and partners[0].id == partner_id
+        ), "The partner of the losing insert should be rolled back"
+        assert reg_ids == [(partner_id,)], "Reg id should be created once"
+        assert phones == [
+            (partner_id, partners[0].name)
+        ], "Only the phone number of the created partner should be stored"
 
     @pytest.mark.asyncio
     async def test_check_and_create_partner_validation(self, partner_service):
@@ -260,3 +435,79 @@ class TestPartnerService:
             ), "Invalid field should be excluded from update"
             session_mock.execute.assert_called_once(), "Session execute should be called once"
             session_mock.commit.assert_called_once(), "Session commit should be called once"
+
+    @pytest.fixture
+    def mock_partner(self) -> MagicMock:
+        mock_partner = MagicMock()
+        mock_partner.id = 1
+        mock_partner.email = "test@example.com"
+        mock_partner.gender = "M"
+        mock_partner.addl_name = "Test"
+        mock_partner.given_name = "John"
+        mock_partner.family_name = "Doe"
+        mock_partner.birthdate = date(1990, 1, 1)
+        mock_partner.birth_place = "Test City"
+        return mock_partner
+
+    def _profile_session(self, mock_partner, id_count, bank_count):
+        reg_ids = [
+            MagicMock(id_type="National ID", value=f"ID{i}", expiry_date=None)
+            for i in range(id_count)
+        ]
+        banks = [
+            MagicMock(bank_name="Test Bank", acc_number=f"ACC{i}")
+            for i in range(bank_count)
+        ]
+        phones = [MagicMock(phone_no="+1234567890", date_collected=None)]
+        results = [
+            MagicMock(scalar=MagicMock(return_value=mock_partner)),
+            MagicMock(all=MagicMock(return_value=reg_ids)),
+            MagicMock(all=MagicMock(return_value=banks)),
+            MagicMock(scalars=MagicMock(return_value=phones)),
+        ]
+        session = AsyncMock(spec=AsyncSession)
+        session.execute.side_effect = results
+        return session
+
+    @pytest.mark.asyncio
+    async def test_get_partner_profile(self, partner_service, mock_partner):
+        session = self._profile_session(mock_partner, id_count=2, bank_count=1)
+        token = request_dbsession.set(session)
+        try:
+            profile = await partner_service.get_partner_profile(1)
+        finally:
+            request_dbsession.reset(token)
+
+        assert profile.id == 1, "Profile ID should match the partner ID"
+        assert profile.given_name == "John", "Given name should match the partner"
+        assert profile.birthdate == date(1990, 1, 1), "Birthdate should match"
+        assert [reg_id.value for reg_id in profile.ids] == ["ID0", "ID1"]
+        assert profile.ids[0].id_type == "National ID", "ID type name should be set"
+        assert profile.bank_ids[0].bank_name == "Test Bank", "Bank name should be set"
+        assert profile.bank_ids[0].acc_number == "ACC0", "Account number should match"
+        assert profile.phone_numbers[0].phone_no == "+1234567890"
+
+    @pytest.mark.asyncio
+    async def test_get_partner_profile_not_found(self, partner_service):
+        with patch.object(
+            PartnerORM, "get_partner_data", new_callable=AsyncMock, return_value=None
+        ):
+            assert await partner_service.get_partner_profile(1) is None
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("count", [1, 10, 100])
+    async def test_get_partner_profile_query_count(
+        self, partner_service, mock_partner, count
+    ):
+        # Previously 4 + one query per reg id + one query per bank account.
+        session = self._profile_session(mock_partner, id_count=count, bank_count=count)
+        token = request_dbsession.set(session)
+        try:
+            profile = await partner_service.get_partner_profile(1)
+        finally:
+            request_dbsession.reset(token)
+
+        assert len(profile.ids) == count and len(profile.bank_ids) == count
+        assert (
+            session.execute.await_count == 4
+        ), "Profile should be loaded with a constant number of queries"
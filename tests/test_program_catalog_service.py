@@ -0,0 +1,152 @@
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from openg2p_fastapi_common.context import component_registry
+from openg2p_portal_api.models.orm.program_membership_orm import ProgramMembershipORM
+from openg2p_portal_api.models.orm.program_orm import ProgramORM
+from openg2p_portal_api.models.program import ProgramCatalogEntry
+from openg2p_portal_api.services.program_catalog_service import (
+    ProgramCatalogService,
+    _config,
+)
+from openg2p_portal_api.services.program_service import ProgramService
+
+VERSION = (datetime(2024, 1, 1), 4)
+
+PROGRAMS = [
+    ProgramCatalogEntry(
+        id=1, name="Food Support", state="active", create_date=datetime(2024, 1, 1)
+    ),
+    ProgramCatalogEntry(
+        id=2, name="food bank", state="active", create_date=datetime(2024, 3, 1)
+    ),
+    ProgramCatalogEntry(
+        id=3, name="Food Reimbursement", state="active", is_reimbursement_program=True
+    ),
+    ProgramCatalogEntry(
+        id=4, name="Housing", state="ended", create_date=datetime(2024, 2, 1)
+    ),
+]
+
+
+@pytest.fixture
+def catalog_service():
+    service = ProgramCatalogService()
+    yield service
+    # Components register themselves globally, do not leak into other tests.
+    registry = component_registry.get()
+    for component in list(registry):
+        if isinstance(component, (ProgramCatalogService, ProgramService)):
+            registry.remove(component)
+
+
+@pytest.fixture
+def mock_catalog_orm():
+    with patch.object(
+        ProgramORM, "get_catalog_version", new=AsyncMock(return_value=VERSION)
+    ) as mock_version, patch.object(
+        ProgramORM, "get_program_catalog", new=AsyncMock(return_value=PROGRAMS)
+    ) as mock_programs:
+        yield mock_version, mock_programs
+
+
+class TestProgramCatalogService:
+    @pytest.mark.asyncio
+    async def test_refresh_only_on_change(self, catalog_service, mock_catalog_orm):
+        mock_version, mock_programs = mock_catalog_orm
+
+        assert await catalog_service.refresh(), "First refresh should load"
+        assert not await catalog_service.refresh(), "Unchanged programs are kept"
+        assert mock_programs.await_count == 1, "Programs should be loaded once"
+
+        mock_version.return_value = (datetime(2024, 1, 2), 4)
+        assert await catalog_service.refresh(), "A newer write_date should reload"
+        assert mock_programs.await_count == 2, "Programs should be reloaded"
+
+    @pytest.mark.asyncio
+    async def test_listed_programs(self, catalog_service, mock_catalog_orm):
+        await catalog_service.refresh()
+
+        assert [program.id for program in catalog_service.catalog.listed] == [
+            2,
+            1,
+        ], "Only open, non reimbursement programs are listed, latest first"
+
+    def test_programs_without_state_not_listed(self):
+        catalog = ProgramCatalogService.build_catalog(
+            [*PROGRAMS, ProgramCatalogEntry(id=5, name="Draft", state=None)], VERSION
+        )
+
+        assert 5 not in [
+            program.id for program in catalog.listed
+        ], "Programs without a state are not listed, like in SQL"
+
+    @pytest.mark.asyncio
+    async def test_search(self, catalog_service, mock_catalog_orm):
+        await catalog_service.refresh()
+
+        assert [program.id for program in catalog_service.search("Food")] == [
+            3,
+            1,
+            2,
+        ], "Case sensitive matches should rank first"
+        assert [
+            program.id for program in catalog_service.search("food", page=2, pagesize=2)
+        ] == [1], "Search should be paginated"
+        assert catalog_service.search("nothing") == [], "No program should match"
+
+    @pytest.mark.asyncio
+    async def test_catalog_disabled(self, catalog_service, mock_catalog_orm):
+        await catalog_service.refresh()
+
+        with patch.object(_config, "program_catalog_enabled", False):
+            assert catalog_service.catalog is None, "Disabled catalog is not served"
+            assert catalog_service.search("Food") is None, "Search should fall back"
+
+    @pytest.mark.asyncio
+    async def test_program_service_uses_catalog(
+        self, catalog_service, mock_catalog_orm
+    ):
+        await catalog_service.refresh()
+        membership = SimpleNamespace(
+            program_id=1,
+            membership_id=10,
+            membership_state="enrolled",
+            last_application_status="approved",
+        )
+        with patch.object(
+            ProgramMembershipORM,
+            "get_partner_memberships",
+            new=AsyncMock(return_value=[membership]),
+        ), patch.object(
+            ProgramORM, "get_all_programs_with_membership", new=AsyncMock()
+        ) as mock_get_programs, patch.object(
+            ProgramORM, "get_all_program_by_keyword", new=AsyncMock()
+        ) as mock_get_by_keyword:
+            program_service = ProgramService()
+            programs = await program_service.get_all_program_service(1)
+            discovered = await program_service.get_program_by_key_service("bank")
+
+        mock_get_programs.assert_not_awaited()
+        mock_get_by_keyword.assert_not_awaited()
+        assert [
+            (program.id, program.state, program.has_applied) for program in programs
+        ] == [
+            (2, "Not Applied", False),
+            (1, "enrolled", True),
+        ], "Programs should be listed from the catalog with the partner's membership"
+        assert [program.id for program in discovered] == [
+            2
+        ], "Discovery should be served from the catalog"
+
+    @pytest.mark.asyncio
+    async def test_start_and_stop(self, catalog_service, mock_catalog_orm):
+        await catalog_service.start()
+        assert catalog_service.catalog, "Catalog should be loaded on start"
+        assert catalog_service._refresh_task, "Refresh task should be running"
+
+        await catalog_service.stop()
+        assert catalog_service._refresh_task is None, "Refresh task should stop"
+        assert catalog_service.catalog is None, "Catalog should be dropped on stop"
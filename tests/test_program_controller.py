@@ -113,14 +113,15 @@ class TestProgramController:
             )
         ]
         program_controller.program_service.get_application_details_service.return_value = (
-            expected_details
+            expected_details,
+            None,
         )
         result = await program_controller.get_application_details(auth_credentials)
         assert (
             result == expected_details
         ), "Should return the expected application details"
         program_controller.program_service.get_application_details_service.assert_called_once_with(
-            auth_credentials.partner_id
+            auth_credentials.partner_id, limit=None, after=None
         ), "Should call get_application_details_service with correct partner_id"
 
     @pytest.mark.asyncio
@@ -137,12 +138,13 @@ class TestProgramController:
             )
         ]
         program_controller.program_service.get_benefit_details_service.return_value = (
-            expected_details
+            expected_details,
+            None,
         )
         result = await program_controller.get_benefit_details(auth_credentials)
         assert result == expected_details, "Should return the expected benefit details"
         program_controller.program_service.get_benefit_details_service.assert_called_once_with(
-            auth_credentials.partner_id
+            auth_credentials.partner_id, limit=None, after=None
         ), "Should call get_benefit_details_service with correct partner_id"
 
     @pytest.mark.asyncio
@@ -0,0 +1,91 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from openg2p_portal_api import app  # noqa: F401
+from openg2p_portal_api.config import Settings
+from openg2p_portal_api.context import request_dbsession
+from openg2p_portal_api.models.orm.program_orm import ProgramORM
+from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql
+
+KEYWORD = "Food_100%"
+
+
+def compile_sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+class TestProgramORMDiscovery:
+    @pytest.mark.parametrize("search_mode", ["like", "trigram", "fulltext"])
+    def test_select_by_keyword_skips_membership(self, search_mode):
+        sql = compile_sql(ProgramORM.select_by_keyword(KEYWORD, search_mode))
+
+        assert (
+            "g2p_program_membership" not in sql
+        ), "Discovery should not load program memberships"
+        assert sql.count("SELECT") == 1, "Discovery should run a single query"
+
+    def test_select_by_keyword_like(self):
+        stmt = ProgramORM.select_by_keyword(KEYWORD, "like")
+        sql = compile_sql(stmt)
+
+        assert "g2p_program.name ILIKE" in sql, "Should match names case insensitively"
+        assert (
+            "Food/_100/%" in stmt.compile().params.values()
+        ), "Wildcards in the keyword should be escaped"
+        assert (
+            "CASE WHEN (g2p_program.name LIKE" in sql
+        ), "Case sensitive matches should rank first"
+
+    def test_select_by_keyword_trigram(self):
+        sql = compile_sql(ProgramORM.select_by_keyword(KEYWORD, "trigram"))
+
+        assert "g2p_program.description ILIKE" in sql, "Should also match descriptions"
+        assert "similarity(g2p_program.name" in sql, "Should rank by similarity"
+
+    def test_select_by_keyword_fulltext(self):
+        sql = compile_sql(ProgramORM.select_by_keyword(KEYWORD, "fulltext"))
+
+        assert (
+            "to_tsvector('simple'::regconfig" in sql
+        ), "Text search config should be inlined to match the index expression"
+        assert "@@ plainto_tsquery" in sql, "Should use a full text match"
+        assert "ts_rank(" in sql, "Should rank by ts_rank"
+
+    @pytest.mark.parametrize("ts_config", ["simple'::regconfig) --", "english; drop"])
+    def test_fulltext_config_must_be_identifier(self, ts_config):
+        with pytest.raises(ValidationError):
+            Settings(discovery_fulltext_config=ts_config)
+
+    @pytest.mark.parametrize("ts_config", ["english", "pg_catalog.english"])
+    def test_fulltext_config_identifier(self, ts_config):
+        assert (
+            Settings(discovery_fulltext_config=ts_config).discovery_fulltext_config
+            == ts_config
+        ), "Should accept text search config names"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "page, pagesize, limit, offset",
+        [(None, None, None, None), (None, 10, 10, 0), (3, 10, 10, 20)],
+    )
+    async def test_get_all_program_by_keyword_pagination(
+        self, page, pagesize, limit, offset
+    ):
+        session = AsyncMock()
+        session.execute.return_value = MagicMock(
+            scalars=MagicMock(return_value=iter([]))
+        )
+        token = request_dbsession.set(session)
+        try:
+            await ProgramORM.get_all_program_by_keyword(
+                KEYWORD, page=page, pagesize=pagesize
+            )
+        finally:
+            request_dbsession.reset(token)
+
+        stmt = session.execute.call_args.args[0]
+        assert session.execute.await_count == 1, "Discovery should run a single query"
+        assert (
+            stmt._limit == limit and stmt._offset == offset
+        ), "LIMIT/OFFSET should follow page and pagesize"
@@ -3,10 +3,8 @@ from unittest.mock import MagicMock
 
 import pytest
 from openg2p_portal_api.models.orm.program_orm import ProgramORM
-from openg2p_portal_api.models.orm.program_registrant_info_orm import (
-    ProgramRegistrantInfoORM,
-)
-from openg2p_portal_api.services.program_service import ProgramService
+from openg2p_portal_api.services.program_service import ProgramService, _config
+from openg2p_portal_api.utils.pagination_utils import decode_cursor
 
 TEST_DATA = {
     "PROGRAM": {
@@ -66,7 +64,9 @@ def program_reg_info_mock():
 class TestProgramService:
     @pytest.mark.asyncio
     async def test_get_all_programs_empty_result(self, mocker):
-        mocker.patch.object(ProgramORM, "get_all_programs", return_value=[])
+        mocker.patch.object(
+            ProgramORM, "get_all_programs_with_membership", return_value=[]
+        )
         program_service = ProgramService()
         programs = await program_service.get_all_program_service(
             partnerid=TEST_DATA["PROGRAM"]["PARTNER_ID"]
@@ -75,7 +75,11 @@ class TestProgramService:
 
     @pytest.mark.asyncio
     async def test_get_all_programs_success(self, mocker, program_mock):
-        mocker.patch.object(ProgramORM, "get_all_programs", return_value=[program_mock])
+        mocker.patch.object(
+            ProgramORM,
+            "get_all_programs_with_membership",
+            return_value=[(program_mock, None, None, None)],
+        )
         program_service = ProgramService()
         programs = await program_service.get_all_program_service(
             partnerid=TEST_DATA["PROGRAM"]["PARTNER_ID"]
@@ -103,12 +107,17 @@ class TestProgramService:
     async def test_get_all_programs_with_membership(
         self, mocker, program_mock, program_reg_info_mock
     ):
-        program_mock.membership = [program_reg_info_mock]
-        mocker.patch.object(ProgramORM, "get_all_programs", return_value=[program_mock])
         mocker.patch.object(
-            ProgramRegistrantInfoORM,
-            "get_latest_reg_info",
-            return_value=program_reg_info_mock,
+            ProgramORM,
+            "get_all_programs_with_membership",
+            return_value=[
+                (
+                    program_mock,
+                    1,
+                    TEST_DATA["STATUS"]["ACTIVE"],
+                    program_reg_info_mock.state,
+                )
+            ],
         )
 
         program_service = ProgramService()
@@ -126,17 +135,39 @@ class TestProgramService:
         ), "Last application status should be active"
 
     @pytest.mark.asyncio
-    async def test_get_program_by_id_with_membership(
-        self, mocker, program_mock, program_reg_info_mock
+    async def test_get_all_programs_with_membership_no_application(
+        self, mocker, program_mock
     ):
-        program_mock.membership = [program_reg_info_mock]
         mocker.patch.object(
-            ProgramORM, "get_all_by_program_id", return_value=program_mock
+            ProgramORM,
+            "get_all_programs_with_membership",
+            return_value=[(program_mock, 1, "draft", None)],
+        )
+
+        program_service = ProgramService()
+        programs = await program_service.get_all_program_service(
+            partnerid=TEST_DATA["PROGRAM"]["PARTNER_ID"]
         )
+
+        assert programs[0].has_applied is True, "Program should be marked as applied"
+        assert programs[0].state == "draft", "Program state should be the membership's"
+        assert (
+            programs[0].last_application_status == TEST_DATA["STATUS"]["NO_APPLICATION"]
+        ), "Last application status should be 'Not submitted any application'"
+
+    @pytest.mark.asyncio
+    async def test_get_program_by_id_with_membership(
+        self, mocker, program_mock, program_reg_info_mock
+    ):
         mocker.patch.object(
-            ProgramRegistrantInfoORM,
-            "get_latest_reg_info",
-            return_value=program_reg_info_mock,
+            ProgramORM,
+            "get_program_with_membership",
+            return_value=(
+                program_mock,
+                1,
+                TEST_DATA["STATUS"]["ACTIVE"],
+                program_reg_info_mock.state,
+            ),
         )
 
         program_service = ProgramService()
@@ -158,9 +189,10 @@ class TestProgramService:
 
     @pytest.mark.asyncio
     async def test_get_program_by_id_no_membership(self, mocker, program_mock):
-        program_mock.membership = []
         mocker.patch.object(
-            ProgramORM, "get_all_by_program_id", return_value=program_mock
+            ProgramORM,
+            "get_program_with_membership",
+            return_value=(program_mock, None, None, None),
         )
 
         program_service = ProgramService()
@@ -182,7 +214,9 @@ class TestProgramService:
 
     @pytest.mark.asyncio
     async def test_get_program_by_id_not_found(self, mocker):
-        mocker.patch.object(ProgramORM, "get_all_by_program_id", return_value=None)
+        mocker.patch.object(
+            ProgramORM, "get_program_with_membership", return_value=None
+        )
 
         program_service = ProgramService()
         result = await program_service.get_program_by_id_service(
@@ -219,6 +253,21 @@ class TestProgramService:
             programs[0].name == TEST_DATA["PROGRAM"]["NAME"]
         ), "Program name does not match expected value"
 
+    @pytest.mark.asyncio
+    async def test_get_program_by_key_pagination(self, mocker):
+        mock_get_programs = mocker.patch.object(
+            ProgramORM, "get_all_program_by_keyword", return_value=[]
+        )
+        program_service = ProgramService()
+        await program_service.get_program_by_key_service(
+            keyword=TEST_DATA["TEST"]["KEYWORD"], page=2, pagesize=10**6
+        )
+        mock_get_programs.assert_called_once_with(
+            TEST_DATA["TEST"]["KEYWORD"],
+            page=2,
+            pagesize=_config.details_max_page_size,
+        ), "Page size should be capped at the configured maximum"
+
     @pytest.mark.asyncio
     async def test_get_program_summary(self, mocker, program_mock):
         mocker.patch.object(
@@ -239,24 +288,54 @@ class TestProgramService:
             ProgramORM, "get_application_details", return_value=[program_mock]
         )
         program_service = ProgramService()
-        details = await program_service.get_application_details_service(
+        details, next_cursor = await program_service.get_application_details_service(
             partnerid=TEST_DATA["PROGRAM"]["PARTNER_ID"]
         )
         assert len(details) == 1, "Expected exactly one application detail"
+        assert next_cursor is None, "Single page should not have a next cursor"
         assert (
             details[0].application_id == TEST_DATA["PROGRAM"]["ID"]
         ), "Application ID does not match expected value"
 
+    @pytest.mark.asyncio
+    async def test_get_application_details_next_page(self, mocker, program_mock):
+        program_mock.date_applied = TEST_DATA["PROGRAM"]["CREATE_DATE"]
+        program_mock.registrant_info_id = TEST_DATA["PROGRAM"]["ID"]
+        mock_get_details = mocker.patch.object(
+            ProgramORM, "get_application_details", return_value=[program_mock] * 3
+        )
+        program_service = ProgramService()
+        details, next_cursor = await program_service.get_application_details_service(
+            partnerid=TEST_DATA["PROGRAM"]["PARTNER_ID"], limit=2
+        )
+        assert len(details) == 2, "Page should be cut at the limit"
+        assert decode_cursor(next_cursor) == (
+            TEST_DATA["PROGRAM"]["CREATE_DATE"],
+            TEST_DATA["PROGRAM"]["ID"],
+        ), "Next cursor should point to the last row of the page"
+        mock_get_details.assert_called_once_with(
+            TEST_DATA["PROGRAM"]["PARTNER_ID"], limit=3, after=None
+        )
+
+        await program_service.get_application_details_service(
+            partnerid=TEST_DATA["PROGRAM"]["PARTNER_ID"], limit=2, after=next_cursor
+        )
+        assert mock_get_details.call_args.kwargs["after"] == (
+            TEST_DATA["PROGRAM"]["CREATE_DATE"],
+            TEST_DATA["PROGRAM"]["ID"],
+        ), "Cursor should be decoded into the keyset of the last row"
+
     @pytest.mark.asyncio
     async def test_get_benefit_details(self, mocker, program_mock):
         mocker.patch.object(
             ProgramORM, "get_benefit_details", return_value=[program_mock]
         )
         program_service = ProgramService()
-        benefits = await program_service.get_benefit_details_service(
+        benefits, next_cursor = await program_service.get_benefit_details_service(
             partnerid=TEST_DATA["PROGRAM"]["PARTNER_ID"]
         )
         assert len(benefits) == 1, "Expected exactly one benefit detail"
+        assert next_cursor is None, "Single page should not have a next cursor"
         assert (
             benefits[0].entitlement_reference_number == TEST_DATA["PROGRAM"]["ID"]
         ), "Entitlement reference number does not match expected value"
@@ -0,0 +1,368 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from hypothesis import HealthCheck, given, settings
+from hypothesis import strategies as st
+
+# Registers all the ORM models, so that mappers can be configured.
+from openg2p_portal_api import app  # noqa: F401
+from openg2p_portal_api.context import request_dbsession
+from openg2p_portal_api.models.orm.cycle_membership_orm import CycleMembershipORM
+from openg2p_portal_api.models.orm.cycle_orm import CycleORM
+from openg2p_portal_api.models.orm.entitlement_orm import EntitlementORM
+from openg2p_portal_api.models.orm.payment_orm import PaymentORM
+from openg2p_portal_api.models.orm.program_membership_orm import ProgramMembershipORM
+from openg2p_portal_api.models.orm.program_orm import ProgramORM
+from openg2p_portal_api.models.orm.program_registrant_info_orm import (
+    ProgramRegistrantInfoORM,
+)
+from openg2p_portal_api.utils.db_utils import get_async_session
+from sqlalchemy import Column, MetaData, Table, and_, event, func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+PARTNER_ID = 1
+OTHER_PARTNER_ID = 2
+PROGRAM_IDS = [1, 2, 3]
+BASE_DATE = datetime(2024, 1, 1)
+
+TABLES = [
+    ProgramORM,
+    CycleORM,
+    CycleMembershipORM,
+    EntitlementORM,
+    PaymentORM,
+    ProgramMembershipORM,
+    ProgramRegistrantInfoORM,
+]
+
+
+def build_dataset(
+    memberships, cycles, cycle_memberships, entitlements, payments, applications
+):
+    """
+    Turns the generated tuples into rows for each table, resolving the
+    indexes into cycle and entitlement ids.
+    """
+    data = {
+        ProgramORM: [
+            {"id": program_id, "name": f"Program {program_id}", "active": True}
+            for program_id in PROGRAM_IDS
+        ],
+        ProgramMembershipORM: [],
+        CycleORM: [],
+        CycleMembershipORM: [],
+        EntitlementORM: [],
+        PaymentORM: [],
+        ProgramRegistrantInfoORM: [],
+    }
+    for partner_id, program_id, state in memberships:
+        data[ProgramMembershipORM].append(
+            {
+                "id": len(data[ProgramMembershipORM]) + 1,
+                "partner_id": partner_id,
+                "program_id": program_id,
+                "state": state,
+            }
+        )
+    for program_id in cycles:
+        cycle_id = len(data[CycleORM]) + 1
+        data[CycleORM].append(
+            {"id": cycle_id, "program_id": program_id, "name": f"Cycle {cycle_id}"}
+        )
+    if not data[CycleORM]:
+        return data
+
+    cycle_ids = [cycle["id"] for cycle in data[CycleORM]]
+    for partner_id, cycle_index in cycle_memberships:
+        data[CycleMembershipORM].append(
+            {
+                "id": len(data[CycleMembershipORM]) + 1,
+                "partner_id": partner_id,
+                "cycle_id": cycle_ids[cycle_index % len(cycle_ids)],
+            }
+        )
+    for partner_id, cycle_index, state, amount in entitlements:
+        data[EntitlementORM].append(
+            {
+                "id": len(data[EntitlementORM]) + 1,
+                "partner_id": partner_id,
+                "cycle_id": cycle_ids[cycle_index % len(cycle_ids)],
+                "state": state,
+                "initial_amount": amount,
+            }
+        )
+    if data[EntitlementORM]:
+        for entitlement_index, status, amount in payments:
+            data[PaymentORM].append(
+                {
+                    "id": len(data[PaymentORM]) + 1,
+                    "entitlement_id": data[EntitlementORM][
+                        entitlement_index % len(data[EntitlementORM])
+                    ]["id"],
+                    "status": status,
+                    "amount_paid": amount,
+                }
+            )
+    for partner_id, program_id, days in applications:
+        data[ProgramRegistrantInfoORM].append(
+            {
+                "id": len(data[ProgramRegistrantInfoORM]) + 1,
+                "registrant_id": partner_id,
+                "program_id": program_id,
+                "create_date": BASE_DATE + timedelta(days=days),
+            }
+        )
+    return data
+
+
+def reference_summary(data, partner_id):
+    """
+    Naive per program computation of the summary, one loop per level.
+    """
+    programs = {program["id"]: program for program in data[ProgramORM]}
+    cycles = {cycle["id"]: cycle for cycle in data[CycleORM]}
+    cycle_members = {
+        (cm["partner_id"], cm["cycle_id"]) for cm in data[CycleMembershipORM]
+    }
+    counted_entitlements = {
+        entitlement["id"]: entitlement
+        for entitlement in data[EntitlementORM]
+        if entitlement["partner_id"] == partner_id
+        and entitlement["state"] == "approved"
+        and (partner_id, entitlement["cycle_id"]) in cycle_members
+    }
+
+    summary = []
+    for membership in data[ProgramMembershipORM]:
+        if membership["partner_id"] != partner_id:
+            continue
+        program_id = membership["program_id"]
+        entitled = 0
+        for entitlement in counted_entitlements.values():
+            if cycles[entitlement["cycle_id"]]["program_id"] == program_id:
+                entitled += entitlement["initial_amount"]
+        paid = 0
+        for payment in data[PaymentORM]:
+            entitlement = counted_entitlements.get(payment["entitlement_id"])
+            if (
+                entitlement
+                and payment["status"] == "paid"
+                and cycles[entitlement["cycle_id"]]["program_id"] == program_id
+            ):
+                paid += payment["amount_paid"]
+        summary.append(
+            (programs[program_id]["name"], membership["state"], entitled - paid, paid)
+        )
+    return sorted(summary)
+
+
+def create_tables(connection, tables=TABLES):
+    # Only the columns under test are filled, so the tables are created
+    # without constraints other than the primary key.
+    metadata = MetaData()
+    for table in tables:
+        Table(
+            table.__tablename__,
+            metadata,
+            *[
+                Column(column.name, column.type, primary_key=column.primary_key)
+                for column in table.__table__.columns
+            ],
+        )
+    metadata.create_all(connection)
+
+
+async def per_program_summary(partner_id):
+    """
+    Per program loop over the memberships of the partner, one query for the
+    memberships and two for the totals of each program.
+    """
+    async with get_async_session() as session:
+        memberships = (
+            await session.execute(
+                select(ProgramORM.id, ProgramORM.name, ProgramMembershipORM.state)
+                .join(ProgramORM, ProgramORM.id == ProgramMembershipORM.program_id)
+                .where(ProgramMembershipORM.partner_id == partner_id)
+            )
+        ).all()
+        summary = []
+        for program_id, name, state in memberships:
+            approved = (
+                select(EntitlementORM.id)
+                .join(CycleORM, CycleORM.id == EntitlementORM.cycle_id)
+                .join(
+                    CycleMembershipORM,
+                    and_(
+                        CycleMembershipORM.partner_id == EntitlementORM.partner_id,
+                        CycleMembershipORM.cycle_id == EntitlementORM.cycle_id,
+                    ),
+                )
+                .where(
+                    CycleORM.program_id == program_id,
+                    EntitlementORM.partner_id == partner_id,
+                    EntitlementORM.state == "approved",
+                )
+                .distinct()
+            )
+            entitled = await session.scalar(
+                select(func.coalesce(func.sum(EntitlementORM.initial_amount), 0)).where(
+                    EntitlementORM.id.in_(approved)
+                )
+            )
+            paid = await session.scalar(
+                select(func.coalesce(func.sum(PaymentORM.amount_paid), 0)).where(
+                    PaymentORM.entitlement_id.in_(approved),
+                    PaymentORM.status == "paid",
+                )
+            )
+            summary.append((name, state, entitled - paid, paid))
+    return summary
+
+
+async def run_summary(data, partner_id, summary=None, statements=None):
+    """
+    Loads data into an in-memory db and runs the summary on it, by default
+    ProgramORM.get_program_summary. The executed statements are appended to
+    statements if given.
+    """
+    summary = summary or ProgramORM.get_program_summary
+    engine = create_async_engine("sqlite+aiosqlite://")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(create_tables)
+        async with async_sessionmaker(engine)() as session:
+            for table, rows in data.items():
+                if rows:
+                    await session.execute(insert(table.__table__), rows)
+            await session.commit()
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            if statements is not None:
+                event.listen(engine.sync_engine, "before_cursor_execute", record)
+            token = request_dbsession.set(session)
+            try:
+                rows = await summary(partner_id)
+            finally:
+                request_dbsession.reset(token)
+    finally:
+        await engine.dispose()
+    return sorted(tuple(row) for row in rows)
+
+
+def many_cycles_dataset():
+    """
+    Synthetic beneficiary enrolled in every program, with an approved
+    entitlement in each of many cycles, each paid in several instalments.
+    """
+    rng = random.Random(42)
+    cycles = [program_id for program_id in PROGRAM_IDS for _ in range(100)]
+    return build_dataset(
+        memberships=[
+            (partner_id, program_id, "enrolled")
+            for partner_id in [PARTNER_ID, OTHER_PARTNER_ID]
+            for program_id in PROGRAM_IDS
+        ],
+        cycles=cycles,
+        cycle_memberships=[
+            (partner_id, index)
+            for partner_id in [PARTNER_ID, OTHER_PARTNER_ID]
+            for index in range(len(cycles))
+        ],
+        entitlements=[
+            (partner_id, index, "approved", rng.randint(100, 1000))
+            for partner_id in [PARTNER_ID, OTHER_PARTNER_ID]
+            for index in range(len(cycles))
+        ],
+        payments=[
+            (index, rng.choice(["paid", "failed"]), rng.randint(0, 100))
+            for index in range(2 * len(cycles))
+            for _ in range(4)
+        ],
+        applications=[
+            (PARTNER_ID, program_id, program_id) for program_id in PROGRAM_IDS
+        ],
+    )
+
+
+partner_ids = st.sampled_from([PARTNER_ID, OTHER_PARTNER_ID])
+amounts = st.integers(min_value=0, max_value=1000)
+indexes = st.integers(min_value=0, max_value=50)
+
+datasets = st.builds(
+    build_dataset,
+    memberships=st.lists(
+        st.tuples(
+            partner_ids,
+            st.sampled_from(PROGRAM_IDS),
+            st.sampled_from(["enrolled", "draft"]),
+        ),
+        max_size=6,
+        unique_by=lambda membership: membership[:2],
+    ),
+    cycles=st.lists(st.sampled_from(PROGRAM_IDS), max_size=6),
+    cycle_memberships=st.lists(st.tuples(partner_ids, indexes), max_size=10),
+    entitlements=st.lists(
+        st.tuples(
+            partner_ids, indexes, st.sampled_from(["approved", "draft"]), amounts
+        ),
+        max_size=10,
+    ),
+    payments=st.lists(
+        st.tuples(indexes, st.sampled_from(["paid", "failed"]), amounts),
+        max_size=15,
+    ),
+    applications=st.lists(
+        st.tuples(
+            partner_ids,
+            st.sampled_from(PROGRAM_IDS),
+            st.integers(min_value=0, max_value=30),
+        ),
+        max_size=5,
+    ),
+)
+
+
+class TestProgramSummary:
+    @settings(
+        max_examples=50,
+        deadline=None,
+        suppress_health_check=[HealthCheck.too_slow],
+    )
+    @given(data=datasets)
+    def test_program_summary_matches_reference(self, data):
+        summary = asyncio.run(run_summary(data, PARTNER_ID))
+
+        assert summary == reference_summary(
+            data, PARTNER_ID
+        ), "Program summary should match the per program reference totals"
+
+    @pytest.mark.asyncio
+    async def test_program_summary_many_cycles(self):
+        data = many_cycles_dataset()
+
+        summary = await run_summary(data, PARTNER_ID)
+
+        assert len(summary) == len(PROGRAM_IDS), "Expected one row per program"
+        assert summary == reference_summary(
+            data, PARTNER_ID
+        ), "Totals should not be multiplied by cycles or payments"
+
+    @pytest.mark.asyncio
+    async def test_program_summary_query_count(self):
+        data = many_cycles_dataset()
+        statements, loop_statements = [], []
+
+        summary = await run_summary(data, PARTNER_ID, statements=statements)
+        loop_summary = await run_summary(
+            data, PARTNER_ID, per_program_summary, loop_statements
+        )
+
+        assert summary == loop_summary, "Both summaries should have the same totals"
+        assert len(statements) == 1, "The summary should be a single query"
+        assert len(loop_statements) == 1 + 2 * len(
+            PROGRAM_IDS
+        ), "The per program loop needs two queries per program"
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import boto3
+import pytest
+from moto import mock_aws
+from openg2p_portal_api.exception import ServiceUnavailableError
+from openg2p_portal_api.utils.s3_utils import (
+    S3MultipartUploader,
+    _config,
+    get_s3_client,
+    invalidate_s3_clients,
+    run_in_s3_executor,
+    s3_backend_slot,
+)
+
+TEST_BUCKET = "test-bucket"
+BACKEND_CONFIG = {
+    "x_backend_type_env_default": "amazon_s3",
+    "x_aws_region_env_default": "us-east-1",
+    "x_aws_access_key_id_env_default": "testing",
+    "x_aws_secret_access_key_env_default": "testing",
+}
+
+
+async def hold_slot(backend_id: int, active: dict, seen: list, delay=0.02):
+    async with s3_backend_slot(backend_id):
+        active[backend_id] = active.get(backend_id, 0) + 1
+        seen.append((backend_id, active[backend_id]))
+        await asyncio.sleep(delay)
+        active[backend_id] -= 1
+
+
+class TestS3Utils:
+    @pytest.mark.asyncio
+    async def test_backend_slot_limits_concurrency(self):
+        active, seen = {}, []
+        with patch.object(_config, "s3_max_concurrent_transfers_per_backend", 2):
+            await asyncio.gather(
+                *[hold_slot(1, active, seen) for _ in range(5)],
+                *[hold_slot(2, active, seen) for _ in range(2)],
+            )
+
+        assert (
+            max(count for backend_id, count in seen if backend_id == 1) == 2
+        ), "At most the configured number of transfers should run per backend"
+        assert (
+            max(count for backend_id, count in seen if backend_id == 2) == 2
+        ), "A busy backend should not hold back the other backends"
+
+    @pytest.mark.asyncio
+    async def test_backend_slot_timeout(self):
+        with patch.object(
+            _config, "s3_max_concurrent_transfers_per_backend", 1
+        ), patch.object(_config, "s3_backend_wait_timeout", 0.01):
+            async with s3_backend_slot(3):
+                with pytest.raises(ServiceUnavailableError) as exc_info:
+                    async with s3_backend_slot(3):
+                        pass
+                assert exc_info.value.status_code == 503, "A busy backend is a 503"
+                assert (
+                    exc_info.value.headers["Retry-After"] == "1"
+                ), "Clients should be told when to retry"
+
+            async with s3_backend_slot(3):
+                pass
+
+    @pytest.mark.asyncio
+    async def test_run_in_s3_executor_does_not_block_loop(self):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        thread_name = await run_in_s3_executor(
+            lambda: time.sleep(0.1) or threading.current_thread().name
+        )
+        task.cancel()
+
+        assert thread_name.startswith("s3"), "Should run on the S3 executor"
+        assert ticks > 1, "Event loop should keep running during blocking S3 calls"
+
+    @pytest.mark.asyncio
+    async def test_uploader_on_executor(self):
+        with mock_aws():
+            s3_client = boto3.client("s3", region_name="us-east-1")
+            s3_client.create_bucket(Bucket=TEST_BUCKET)
+            uploader = S3MultipartUploader(s3_client, TEST_BUCKET, "key")
+
+            await run_in_s3_executor(uploader.write, b"a" * 10)
+            size, _ = await run_in_s3_executor(uploader.complete)
+            body = s3_client.get_object(Bucket=TEST_BUCKET, Key="key")["Body"].read()
+
+        assert size == 10 and body == b"a" * 10, "Upload should complete on the pool"
+
+    def test_s3_client_cached_per_backend(self):
+        invalidate_s3_clients()
+        s3_client = get_s3_client(1, dict(BACKEND_CONFIG))
+
+        assert (
+            get_s3_client(1, dict(BACKEND_CONFIG)) is s3_client
+        ), "The client of a backend should be reused"
+        assert (
+            get_s3_client(2, dict(BACKEND_CONFIG)) is not s3_client
+        ), "Each backend should have its own client"
+        assert (
+            s3_client.meta.config.max_pool_connections
+            == _config.s3_max_pool_connections
+        ), "The connection pool should be sized from the config"
+
+        changed_config = dict(BACKEND_CONFIG, x_aws_region_env_default="eu-west-1")
+        with patch.object(s3_client, "close") as close:
+            changed_client = get_s3_client(1, changed_config)
+        assert (
+            changed_client is not s3_client
+            and changed_client.meta.region_name == "eu-west-1"
+        ), "A changed backend config should create a new client"
+        close.assert_called_once_with()
+
+        with patch.object(changed_client, "close") as close:
+            invalidate_s3_clients(1)
+        close.assert_called_once_with()
+        assert (
+            get_s3_client(1, changed_config) is not changed_client
+        ), "An invalidated client should be recreated"
+        invalidate_s3_clients()
@@ -0,0 +1,214 @@
+import io
+from unittest.mock import AsyncMock
+
+import boto3
+import pytest
+from fastapi import FastAPI, Request, UploadFile
+from fastapi.testclient import TestClient
+from moto import mock_aws
+from openg2p_fastapi_common.errors.http_exceptions import (
+    BadRequestError,
+    NotFoundError,
+)
+from openg2p_portal_api.models.orm.document_store_orm import DocumentStoreORM
+from openg2p_portal_api.utils.s3_utils import S3_MIN_PART_SIZE, invalidate_s3_clients
+from openg2p_portal_api.utils.storage_utils import (
+    FilesystemStorageEngine,
+    S3StorageEngine,
+    StorageEngine,
+    get_storage_engine,
+)
+
+DATA = b"0123456789"
+TEST_BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def filesystem_engine(tmp_path):
+    return FilesystemStorageEngine(
+        DocumentStoreORM(
+            id=1,
+            server_env_defaults={
+                "x_backend_type_env_default": "filesystem",
+                "x_directory_path_env_default": str(tmp_path),
+            },
+        )
+    )
+
+
+class TestStorageUtils:
+    @pytest.mark.parametrize(
+        "backend_type, engine",
+        [
+            ("amazon_s3", S3StorageEngine),
+            ("filesystem", FilesystemStorageEngine),
+            ("invalid_backend", None),
+        ],
+    )
+    def test_get_storage_engine(self, backend_type, engine):
+        storage_engine = get_storage_engine(
+            DocumentStoreORM(
+                id=1, server_env_defaults={"x_backend_type_env_default": backend_type}
+            )
+        )
+        assert (
+            type(storage_engine) if storage_engine else None
+        ) is engine, f"{backend_type} backends should use {engine}"
+
+    def test_storage_engine_is_abstract(self):
+        with pytest.raises(TypeError):
+            StorageEngine(DocumentStoreORM(id=1, server_env_defaults={}))
+
+    @pytest.mark.asyncio
+    async def test_filesystem_write(self, filesystem_engine, tmp_path):
+        relative_path = filesystem_engine.get_relative_path("test-pdf-1")
+        size, checksum = await filesystem_engine.write(
+            UploadFile(io.BytesIO(DATA), filename="test.pdf"), relative_path
+        )
+
+        assert relative_path.count("/") == 2 and relative_path.endswith(
+            "/test-pdf-1"
+        ), "Files should be stored in sharded directories"
+        assert (tmp_path / relative_path).read_bytes() == DATA, "File should be stored"
+        assert size == len(DATA), "Size should be counted while writing"
+        assert (
+            checksum == "87acec17cd9dcd20a716cc2cf67417b71c8a7016"
+        ), "Checksum should be computed while writing"
+
+    @pytest.mark.asyncio
+    async def test_filesystem_write_is_atomic(self, filesystem_engine, tmp_path):
+        relative_path = filesystem_engine.get_relative_path("test-pdf-1")
+        upload = UploadFile(io.BytesIO(DATA), filename="test.pdf")
+        upload.read = AsyncMock(side_effect=[DATA, OSError("Connection reset")])
+
+        with pytest.raises(BadRequestError):
+            await filesystem_engine.write(upload, relative_path)
+
+        assert not [
+            path for path in tmp_path.rglob("*") if path.is_file()
+        ], "A failed write should not leave any file behind"
+
+    @pytest.mark.asyncio
+    async def test_filesystem_rejects_paths_outside_root(self, filesystem_engine):
+        with pytest.raises(BadRequestError):
+            await filesystem_engine.write(
+                UploadFile(io.BytesIO(DATA), filename="test.pdf"), "../outside"
+            )
+
+    @pytest.mark.asyncio
+    async def test_filesystem_download_not_found(self, filesystem_engine):
+        with pytest.raises(NotFoundError):
+            await filesystem_engine.download("ab/cd/missing", "missing.pdf")
+
+    @pytest.mark.parametrize(
+        "headers, status, content",
+        [({}, 200, DATA), ({"Range": "bytes=2-5"}, 206, b"2345")],
+    )
+    def test_filesystem_download(
+        self, filesystem_engine, tmp_path, headers, status, content
+    ):
+        (tmp_path / "ab").mkdir()
+        (tmp_path / "ab" / "test-pdf-1").write_bytes(DATA)
+
+        app = FastAPI()
+
+        @app.get("/download")
+        async def download(request: Request):
+            return await filesystem_engine.download(
+                "ab/test-pdf-1",
+                "test.pdf",
+                mimetype="application/pdf",
+                range_header=request.headers.get("range"),
+            )
+
+        response = TestClient(app).get("/download", headers=headers)
+
+        assert response.status_code == status, f"Status should be {status}"
+        assert response.content == content, "The requested bytes should be served"
+        assert (
+            response.headers["content-type"] == "application/pdf"
+        ), "The document mimetype should be used"
+        assert response.headers["content-disposition"].startswith(
+            "attachment"
+        ), "The file should be served as an attachment"
+
+    @pytest.mark.asyncio
+    async def test_filesystem_multipart(self, filesystem_engine, tmp_path):
+        relative_path = filesystem_engine.get_relative_path("test-pdf-1")
+        upload_id = await filesystem_engine.create_multipart(relative_path)
+        parts = {}
+        for part_number, data in [(2, b"4567"), (1, b"0123"), (3, b"89")]:
+            parts[part_number] = await filesystem_engine.write_part(
+                relative_path, upload_id, part_number, data
+            )
+        checksum = await filesystem_engine.complete_multipart(
+            relative_path, upload_id, parts
+        )
+
+        assert (
+            tmp_path / relative_path
+        ).read_bytes() == DATA, "The parts should be joined in order"
+        assert (
+            checksum == "87acec17cd9dcd20a716cc2cf67417b71c8a7016"
+        ), "Checksum should be computed while joining"
+        assert [path.name for path in tmp_path.rglob("*") if path.is_file()] == [
+            "test-pdf-1"
+        ], "The parts should be removed"
+
+    @pytest.mark.asyncio
+    async def test_filesystem_multipart_abort(self, filesystem_engine, tmp_path):
+        relative_path = filesystem_engine.get_relative_path("test-pdf-1")
+        upload_id = await filesystem_engine.create_multipart(relative_path)
+        await filesystem_engine.write_part(relative_path, upload_id, 1, DATA)
+        await filesystem_engine.abort_multipart(relative_path, upload_id)
+
+        assert not [
+            path for path in tmp_path.rglob("*") if path.is_file()
+        ], "An aborted upload should not leave any part behind"
+        with pytest.raises(BadRequestError):
+            await filesystem_engine.write_part(relative_path, "../../x", 1, DATA)
+
+    @pytest.mark.asyncio
+    async def test_s3_multipart(self):
+        with mock_aws():
+            s3_client = boto3.client("s3", region_name="us-east-1")
+            s3_client.create_bucket(Bucket=TEST_BUCKET)
+            engine = S3StorageEngine(
+                DocumentStoreORM(
+                    id=1,
+                    server_env_defaults={
+                        "x_backend_type_env_default": "amazon_s3",
+                        "x_aws_region_env_default": "us-east-1",
+                        "x_aws_access_key_id_env_default": "testing",
+                        "x_aws_secret_access_key_env_default": "testing",
+                        "x_aws_bucket_env_default": TEST_BUCKET,
+                    },
+                )
+            )
+            try:
+                upload_id = await engine.create_multipart("test-pdf-1")
+                parts = {
+                    2: await engine.write_part("test-pdf-1", upload_id, 2, DATA),
+                    1: await engine.write_part(
+                        "test-pdf-1", upload_id, 1, b"a" * S3_MIN_PART_SIZE
+                    ),
+                }
+                checksum = await engine.complete_multipart(
+                    "test-pdf-1", upload_id, parts
+                )
+                body = s3_client.get_object(Bucket=TEST_BUCKET, Key="test-pdf-1")[
+                    "Body"
+                ].read()
+
+                aborted_id = await engine.create_multipart("test-pdf-2")
+                await engine.abort_multipart("test-pdf-2", aborted_id)
+                await engine.abort_multipart("test-pdf-2", aborted_id)
+                uploads = s3_client.list_multipart_uploads(Bucket=TEST_BUCKET)
+            finally:
+                invalidate_s3_clients()
+
+        assert (
+            body == b"a" * S3_MIN_PART_SIZE + DATA
+        ), "The parts should be joined in order"
+        assert checksum is None, "The checksum of the object is not known"
+        assert not uploads.get("Uploads"), "The aborted upload should be dropped"